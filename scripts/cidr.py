@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+CIDR aggregation for the geoip text inputs.
+
+Each list is parsed into integer intervals per address family, sorted and
+merged, so that duplicates, prefixes contained in others and adjacent
+prefixes (two /25s, a run of /32s) collapse into the fewest CIDRs covering
+exactly the same addresses. Fewer prefixes give a smaller geoip.dat / .mmdb,
+a faster `geoip convert` and fewer entries for the client matcher to walk.
+
+Accepted lines: a CIDR (host bits are ignored), a single address, or
+"first - last" ranges; "#" starts a comment. Anything else is counted and
+dropped.
+
+Usage:
+  python3 scripts/cidr.py FILE... [-o OUT]       aggregate into OUT (or stdout)
+  python3 scripts/cidr.py -i FILE...             aggregate each file in place
+  python3 scripts/cidr.py config config.json     every local text input of a
+                                                 geoip config, in place
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+Interval = Tuple[int, int]          # first and last address, inclusive
+
+
+def parse(lines: Iterable[str], stats: Dict[str, int]) -> Tuple[List[Interval], List[Interval]]:
+    v4: List[Interval] = []
+    v6: List[Interval] = []
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        stats["in"] = stats.get("in", 0) + 1
+        try:
+            if "-" in line:
+                a, b = (ipaddress.ip_address(x.strip()) for x in line.split("-", 1))
+                if a.version != b.version or a > b:
+                    raise ValueError(line)
+                first, last, version = int(a), int(b), a.version
+            else:
+                net = ipaddress.ip_network(line, strict=False)
+                first, last, version = int(net.network_address), int(net.broadcast_address), net.version
+        except ValueError:
+            stats["invalid"] = stats.get("invalid", 0) + 1
+            continue
+        (v4 if version == 4 else v6).append((first, last))
+    return v4, v6
+
+
+def merge(intervals: List[Interval]) -> List[Interval]:
+    """Sorted, non-overlapping, non-adjacent intervals covering the same addresses."""
+    out: List[Interval] = []
+    for first, last in sorted(intervals):
+        if out and first <= out[-1][1] + 1:
+            if last > out[-1][1]:
+                out[-1] = (out[-1][0], last)
+        else:
+            out.append((first, last))
+    return out
+
+
+def to_cidrs(first: int, last: int, bits: int) -> Iterator[Tuple[int, int]]:
+    """Fewest (network, prefix length) pairs covering first..last."""
+    while first <= last:
+        # largest block aligned at `first` that does not run past `last`
+        align = (first & -first).bit_length() - 1 if first else bits
+        size = min(align, (last - first + 1).bit_length() - 1)
+        yield first, bits - size
+        first += 1 << size
+
+
+def aggregate(lines: Iterable[str], stats: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """CIDRs of the merged input: IPv4 first, then IPv6, each in address order."""
+    stats = {} if stats is None else stats
+    v4, v6 = parse(lines, stats)
+    stats["out"] = 0
+    for intervals, bits, cls in ((v4, 32, ipaddress.IPv4Address), (v6, 128, ipaddress.IPv6Address)):
+        for first, last in merge(intervals):
+            for net, plen in to_cidrs(first, last, bits):
+                stats["out"] += 1
+                yield f"{cls(net)}/{plen}"
+
+
+def rewrite(path: Path) -> Dict[str, int]:
+    stats: Dict[str, int] = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        cidrs = list(aggregate(f, stats))
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.writelines(c + "\n" for c in cidrs)
+    os.replace(tmp, path)
+    return stats
+
+
+def config_files(config: Path) -> Iterator[Path]:
+    """Local files read by the "text" inputs of a geoip config."""
+    base = config.parent
+    for entry in json.loads(config.read_text(encoding="utf-8"))["input"]:
+        if entry.get("type") != "text" or entry.get("action") != "add":
+            continue
+        args = entry.get("args", {})
+        uri = args.get("uri")
+        if uri and not uri.startswith(("http://", "https://")):
+            yield base / uri
+        if args.get("inputDir"):
+            d = base / args["inputDir"]
+            if d.is_dir():
+                yield from sorted(p for p in d.iterdir() if p.is_file() and not p.name.startswith("."))
+
+
+def report(path, stats: Dict[str, int]):
+    dropped = f", {stats['invalid']} invalid dropped" if stats.get("invalid") else ""
+    print(f"✓ {path}: {stats.get('in', 0)} -> {stats.get('out', 0)} prefixes{dropped}", file=sys.stderr)
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv[:1] == ["config"]:
+        ap = argparse.ArgumentParser(description="Aggregate every local text input of a geoip config.")
+        ap.add_argument("config", type=Path)
+        args = ap.parse_args(argv[1:])
+        total_in = total_out = 0
+        for path in config_files(args.config):
+            if not path.exists():
+                print(f"⚠️ {path}: not found, skipped", file=sys.stderr)
+                continue
+            stats = rewrite(path)
+            total_in += stats.get("in", 0)
+            total_out += stats.get("out", 0)
+            report(path, stats)
+        print(f"✅ {total_in} -> {total_out} prefixes", file=sys.stderr)
+        return
+
+    ap = argparse.ArgumentParser(description="Merge overlapping and adjacent CIDRs.")
+    ap.add_argument("files", nargs="*", metavar="FILE")
+    ap.add_argument("-o", "--output", type=Path)
+    ap.add_argument("-i", "--in-place", action="store_true")
+    args = ap.parse_args(argv)
+    if args.in_place:
+        for f in args.files:
+            report(f, rewrite(Path(f)))
+        return
+
+    stats: Dict[str, int] = {}
+
+    def lines():
+        if not args.files:
+            yield from sys.stdin
+        for f in args.files:
+            with open(f, encoding="utf-8", errors="replace") as fh:
+                yield from fh
+
+    out = open(args.output, "w", encoding="utf-8", newline="\n") if args.output else sys.stdout
+    try:
+        for cidr in aggregate(lines(), stats):
+            out.write(cidr + "\n")
+    finally:
+        if args.output:
+            out.close()
+    report(args.output or "stdout", stats)
+
+
+if __name__ == "__main__":
+    main()
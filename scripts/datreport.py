@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Per-list size and lookup-cost report for the released .dat / .mmdb files.
+
+Parses every geosite .dat, geoip .dat and .mmdb file in a directory and
+reports, per category (list, country code or mmdb record):
+
+  entries   rules (geosite) or prefixes (geoip, mmdb)
+  bytes     size of the category's encoded message (.dat files; an .mmdb
+            shares one search tree, so only its total is reported)
+  memory    estimated matcher memory on a client (see COST)
+  dist      rule types and label counts (geosite), prefix lengths per
+            address family (geoip, mmdb)
+
+With --previous (a directory holding the last release's files, or a JSON
+report saved with --json) every figure is diffed against it: changed
+categories are listed, categories whose bytes grow by more than --warn
+percent are flagged, and --fail-above exits non-zero when any file grows
+by more than that percentage, so a size regression stops the release
+before upload.
+
+Usage:
+  python3 scripts/datreport.py DIR [--previous DIR|FILE.json] [--json OUT]
+                               [--all] [--warn PCT] [--fail-above PCT]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+import mmdb
+from geosite import fields, read_dat, read_rules
+
+# Rough per-entry cost of the Xray/v2ray matchers, in bytes (value bytes are
+# added for domain rules): strings in the domain matchers' tables, sorted
+# range arrays for CIDRs, compiled programs for regexps.
+COST = {"domain": 16, "full": 16, "keyword": 32, "regexp": 2048, "v4": 8, "v6": 24}
+
+
+def _hist_add(hist: Dict[str, int], key):
+    key = str(key)
+    hist[key] = hist.get(key, 0) + 1
+
+
+def _is_geoip(buf) -> bool:
+    """GeoIP.cidr (field 2) starts with `bytes ip`; GeoSite.domain with type or value.
+
+    Entries without a non-empty field 2 (an empty category) say nothing, so
+    the first entry that has one decides.
+    """
+    for _, _, span in fields(buf):
+        for f, w, v in fields(buf, *span):
+            if f == 2 and w == 2:
+                for sf, sw, sv in fields(buf, *v):
+                    return sf == 1 and sw == 2
+    return False
+
+
+def analyze_geosite(buf) -> Dict[str, dict]:
+    out = {}
+    for code, span in read_dat(buf):
+        types: Dict[str, int] = {}
+        labels: Dict[str, int] = {}
+        memory = 0
+        entries = 0
+        for kind, value, _ in read_rules(buf, span):
+            entries += 1
+            _hist_add(types, kind)
+            if kind in ("domain", "full"):
+                _hist_add(labels, value.count(".") + 1)
+            memory += COST.get(kind, 16) + len(value)
+        out[code] = {"entries": entries, "bytes": span[1] - span[0], "memory": memory,
+                     "dist": {"types": types, "labels": labels}}
+    return out
+
+
+def analyze_geoip(buf) -> Dict[str, dict]:
+    out = {}
+    for _, _, (s, e) in fields(buf):
+        code = ""
+        v4: Dict[str, int] = {}
+        v6: Dict[str, int] = {}
+        for f, w, v in fields(buf, s, e):
+            if f == 1:
+                code = bytes(buf[v[0]:v[1]]).decode("utf-8")
+            elif f == 2:
+                ip_len, prefix = 0, 0
+                for cf, cw, cv in fields(buf, *v):
+                    if cf == 1:
+                        ip_len = cv[1] - cv[0]
+                    elif cf == 2:
+                        prefix = cv
+                _hist_add(v4 if ip_len == 4 else v6, prefix)
+        n4, n6 = sum(v4.values()), sum(v6.values())
+        out[code] = {"entries": n4 + n6, "bytes": e - s,
+                     "memory": n4 * COST["v4"] + n6 * COST["v6"],
+                     "dist": {"v4": v4, "v6": v6}}
+    return out
+
+
+def analyze_mmdb(path: Path) -> Dict[str, dict]:
+    reader, mm = mmdb.open_mmdb(path)
+    try:
+        out: Dict[str, dict] = {}
+        labels: Dict[int, str] = {}
+        for version, _, plen, offset in reader.networks():
+            if offset not in labels:
+                labels[offset] = mmdb.label(reader.record(offset))
+            c = out.setdefault(labels[offset], {"entries": 0, "bytes": None, "memory": 0,
+                                                "dist": {"v4": {}, "v6": {}}})
+            c["entries"] += 1
+            c["memory"] += COST[f"v{version}"]
+            _hist_add(c["dist"][f"v{version}"], plen)
+        return out
+    finally:
+        mm.close()
+
+
+def analyze(directory: Path) -> Dict[str, dict]:
+    report = {}
+    for path in sorted(directory.iterdir()):
+        if path.suffix == ".mmdb":
+            report[path.name] = {"kind": "mmdb", "size": path.stat().st_size,
+                                 "categories": analyze_mmdb(path)}
+        elif path.suffix == ".dat":
+            buf = path.read_bytes()
+            kind = "geoip" if _is_geoip(buf) else "geosite"
+            cats = analyze_geoip(buf) if kind == "geoip" else analyze_geosite(buf)
+            report[path.name] = {"kind": kind, "size": len(buf), "categories": cats}
+    return report
+
+
+def load(previous: Optional[Path]) -> Dict[str, dict]:
+    if previous is None or not previous.exists():
+        return {}
+    if previous.is_dir():
+        return analyze(previous)
+    return json.loads(previous.read_text(encoding="utf-8"))["artifacts"]
+
+
+def _delta(new: Optional[int], old: Optional[int]) -> str:
+    if new is None:
+        return ""
+    if old is None:
+        return f"{new:>12}  (new)"
+    d = new - old
+    pct = f" {d / old * 100:+.1f}%" if old else ""
+    return f"{new:>12}  ({d:+d}{pct})" if d else f"{new:>12}"
+
+
+def _human(n: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024 or unit == "MiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def print_report(report: Dict[str, dict], previous: Dict[str, dict], show_all: bool,
+                 warn: float) -> Dict[str, float]:
+    """Prints the report; returns file -> size growth in percent."""
+    growth = {}
+    delta = _delta if previous else (lambda new, old: "" if new is None else f"{new:>12}")
+    for name, art in report.items():
+        old = previous.get(name)
+        old_size = old["size"] if old else None
+        if old_size:
+            growth[name] = (art["size"] - old_size) / old_size * 100
+        print(f"\n{name}  [{art['kind']}]  {delta(art['size'], old_size).strip()} bytes, "
+              f"{len(art['categories'])} categories")
+        old_cats = old["categories"] if old else {}
+        for code in sorted(set(art["categories"]) | set(old_cats)):
+            c, o = art["categories"].get(code), old_cats.get(code)
+            if c is None:
+                print(f"  {code:<28} removed (was {o['entries']} entries)")
+                continue
+            changed = o is None or c["entries"] != o["entries"] or c["bytes"] != o["bytes"]
+            if not (show_all or changed):
+                continue
+            flag = ""
+            if o and o.get("bytes") and c["bytes"] is not None:
+                pct = (c["bytes"] - o["bytes"]) / o["bytes"] * 100
+                if pct > warn:
+                    flag = "  ⚠️"
+            print(f"  {code:<28} entries {delta(c['entries'], o and o['entries'])}"
+                  f"{'  bytes ' + delta(c['bytes'], o and o['bytes']) if c['bytes'] is not None else ''}"
+                  f"  memory ~{_human(c['memory'])}{flag}")
+        total_mem = sum(c["memory"] for c in art["categories"].values())
+        print(f"  {'(total)':<28} matcher memory ~{_human(total_mem)}")
+    return growth
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Report per-list size and matcher cost of .dat/.mmdb files.")
+    ap.add_argument("directory", type=Path)
+    ap.add_argument("--previous", type=Path, help="last release: a directory of files or a --json report")
+    ap.add_argument("--json", type=Path, help="write the full report here")
+    ap.add_argument("--all", action="store_true", help="list every category, not only changed ones")
+    ap.add_argument("--warn", type=float, default=10.0, help="flag categories growing more than PCT")
+    ap.add_argument("--fail-above", type=float, default=None, metavar="PCT",
+                    help="exit 1 if any file grows more than PCT")
+    args = ap.parse_args()
+
+    try:
+        report = analyze(args.directory)
+        previous = load(args.previous)
+    except (mmdb.MMDBError, OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    if args.json:
+        args.json.write_text(json.dumps({"artifacts": report}, indent=1), encoding="utf-8")
+    growth = print_report(report, previous, args.all or not previous, args.warn)
+
+    if args.fail_above is not None:
+        over = {n: g for n, g in growth.items() if g > args.fail_above}
+        if over:
+            print("\n❌ size regression: " + ", ".join(f"{n} {g:+.1f}%" for n, g in over.items()))
+            sys.exit(1)
+    print("\n✅ Done.")
+
+
+if __name__ == "__main__":
+    main()
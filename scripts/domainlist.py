@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Streaming domain-list normalizer.
+
+Replaces the per-script `sed | awk | dos2unix | idn2 | sort -u` chain. Every
+input line is parsed once:
+
+  hosts      0.0.0.0 a.com b.com     (sinkhole address, then names)
+  adblock    ||a.com^$third-party    @@||a.com^ (exception, opt-in)
+  wildcard   *.a.com                 .a.com
+  plain      a.com                   a.com:443  (port dropped)
+
+then lower-cased, IDNA-encoded (non-ASCII labels become xn--) and validated
+as a hostname; anything else is dropped. The output is sorted in byte order
+and deduplicated, like `LC_ALL=C sort -u`, with memory bounded by --chunk:
+larger inputs are sorted in runs spilled to temporary files and merged.
+
+domainlists.json names each category's sources and options, so
+
+  python3 scripts/domainlist.py build [CATEGORY...]
+
+fetches every category's sources concurrently through listfetch.py (ETag /
+Last-Modified revalidation and a local content-addressed cache), then
+normalizes each category (ads, malware, phishing, cryptominers, social,
+nsfw, the ads allowlist and the IP lists config.json reads), writing the
+`<name>-temp.txt` files the generate-*.sh scripts continue from.
+
+  python3 scripts/domainlist.py normalize [--strip-www] [--exceptions] [FILE...]
+
+is the same normalizer as a filter (stdin to stdout when no FILE is given).
+
+  python3 scripts/domainlist.py allow IN --allowlist FILE... -o OUT [--removed FILE]
+
+drops every name an allowlist covers. Allowlist categories ("allowlist" in
+domainlists.json) are built as rules rather than names:
+
+  full:a.com           exactly a.com          |a.com^
+  domain:a.com         a.com and subdomains   @@||a.com^  *.a.com  a.com
+  regexp:^ad[0-9]+[.]  any name it finds      /^ad[0-9]+[.]/
+
+(right: the source syntax that produces each; bare names take the category's
+"allowlist" kind). Exact and suffix rules sit in hash sets, so a name costs
+one lookup per label; regexps are only tried after those miss. The blocklist
+is streamed, never sorted or held, so memory follows the allowlist size.
+
+  python3 scripts/domainlist.py prune IN -o OUT [--removed FILE]
+
+drops every name whose parent domain is also listed (a domain: rule already
+matches it) with one sort by reversed labels and a linear sweep, instead of
+a `grep -f` over one regex per domain; --removed keeps the dropped names for
+auditing.
+"""
+
+import argparse
+import heapq
+import ipaddress
+import json
+import os
+import re
+import sys
+import tempfile
+from encodings import idna
+from pathlib import Path
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import listfetch
+
+HERE = Path(__file__).resolve().parent
+CONFIG = HERE / "domainlists.json"
+CHUNK = 1_000_000
+
+SINKHOLES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+_LABEL = re.compile(r"[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\Z")
+_PORT = re.compile(r":\d+\Z")
+
+
+class Options:
+    def __init__(self, strip_www: bool = False, exceptions: bool = False,
+                 drop: Iterable[str] = ()):
+        self.strip_www = strip_www      # www.a.com -> a.com (hosts lists)
+        self.exceptions = exceptions    # keep @@ rules (allowlists)
+        self.drop = tuple(drop)         # drop lines containing any of these
+
+    @classmethod
+    def from_config(cls, spec: dict) -> "Options":
+        return cls(spec.get("strip_www", False), spec.get("exceptions", False),
+                   spec.get("drop", ()))
+
+
+def to_ascii(name: str) -> Optional[str]:
+    """Lower-cased, IDNA-encoded hostname, or None if it isn't a valid one."""
+    name = name.lower()
+    labels = name.split(".")
+    if len(labels) < 2 or len(name) > 253:
+        return None
+    if not name.isascii():
+        try:
+            labels = [idna.ToASCII(label).decode("ascii").lower() for label in labels]
+        except UnicodeError:
+            return None
+    if labels[-1].isdigit():
+        return None                                 # an IPv4 address
+    for label in labels:
+        if len(label) > 63 or not _LABEL.match(label):
+            return None
+    return ".".join(labels)
+
+
+def parse_line(line: str, opts: Options) -> List[str]:
+    """Candidate names on one raw line, before validation."""
+    line = line.strip()
+    if not line or line[0] in "!#[":
+        return []
+    if any(d in line for d in opts.drop):
+        return []
+    if "#" in line:
+        line = line.split("#", 1)[0].strip()
+    if line.startswith("@@"):
+        if not opts.exceptions:
+            return []
+        line = line[2:]
+    fields = line.split()
+    if len(fields) > 1:
+        # hosts format: only sinkhole entries describe blocked names
+        if fields[0] not in SINKHOLES:
+            return []
+        names = fields[1:]
+    else:
+        name = fields[0]
+        if name in SINKHOLES:
+            return []
+        try:
+            ipaddress.ip_address(name)
+            return []
+        except ValueError:
+            pass
+        names = [name]
+    out = []
+    for name in names:
+        name = name.split("^", 1)[0].split("$", 1)[0]
+        name = name.lstrip("|*.-")
+        name = _PORT.sub("", name)
+        if opts.strip_www:
+            while name.startswith("www."):
+                name = name[4:]
+        out.append(name)
+    return out
+
+
+def normalize(lines: Iterable[str], opts: Options) -> Iterator[str]:
+    """Valid hostnames from raw lines, in input order (duplicates kept)."""
+    for line in lines:
+        for name in parse_line(line, opts):
+            name = to_ascii(name)
+            if name is not None:
+                yield name
+
+
+def sorted_unique(items: Iterable[str], chunk: int = CHUNK) -> Iterator[str]:
+    """
+    Byte-order sorted, deduplicated items. At most `chunk` distinct items are
+    held at once; beyond that sorted runs go to temporary files and are merged.
+    """
+    runs: List[IO[str]] = []
+    seen = set()
+    try:
+        for item in items:
+            seen.add(item)
+            if len(seen) >= chunk:
+                runs.append(_spill(seen))
+                seen = set()
+        if not runs:
+            yield from sorted(seen)
+            return
+        if seen:
+            runs.append(_spill(seen))
+        last = None
+        for item in heapq.merge(*((line.rstrip("\n") for line in f) for f in runs)):
+            if item != last:
+                yield item
+                last = item
+    finally:
+        for f in runs:
+            f.close()
+
+
+def _spill(items: set) -> IO[str]:
+    f = tempfile.TemporaryFile("w+", encoding="utf-8")
+    f.writelines(f"{item}\n" for item in sorted(items))
+    f.seek(0)
+    return f
+
+
+def reversed_key(name: str) -> str:
+    """
+    "b.a.com" -> "com a b". Sorting by this puts every domain directly before
+    its subdomains: the space sorts below any hostname character, so no
+    sibling such as "a-x.com" can fall between "a.com" and "b.a.com".
+    """
+    return " ".join(reversed(name.split(".")))
+
+
+def remove_covered(names: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Split names into (kept, removed): a name is removed when a parent domain
+    of it is also listed, since a domain: rule already covers subdomains.
+    One sort by reversed labels, then a linear sweep comparing each name
+    with the last kept one; both lists come back in byte order.
+    """
+    kept: List[str] = []
+    removed: List[str] = []
+    last = None
+    for key in sorted({reversed_key(n) for n in names}):
+        if last is not None and key.startswith(last + " "):
+            removed.append(key)
+        else:
+            kept.append(key)
+            last = key
+
+    def restore(keys: List[str]) -> List[str]:
+        return sorted(".".join(reversed(k.split(" "))) for k in keys)
+    return restore(kept), restore(removed)
+
+
+# ----------------------------------------------------------------------
+# allowlists
+# ----------------------------------------------------------------------
+KINDS = ("full", "domain", "regexp")
+
+
+def parse_rule(line: str, default: str = "domain") -> List[Tuple[str, str]]:
+    """(kind, value) allowlist rules on one raw line; bare names get `default`."""
+    line = line.strip()
+    if line.startswith("@@"):
+        line = line[2:]
+    if not line or line[0] in "!#[":
+        return []
+    kind, sep, value = line.partition(":")
+    if sep and kind in KINDS:
+        line = value
+    elif line.startswith("/") and line.rfind("/") > 0:
+        kind, line = "regexp", line[1:line.rfind("/")]
+    elif line.startswith("||") or line.startswith(("*.", ".")):
+        kind = "domain"
+    elif line.startswith("|"):
+        kind = "full"
+    else:
+        kind = default
+    if kind == "regexp":
+        try:
+            re.compile(line)
+        except re.error:
+            print(f"⚠️ skipping invalid regexp: {line}", file=sys.stderr)
+            return []
+        return [("regexp", line)] if line else []
+    rules = []
+    for name in parse_line(line.lstrip("|"), Options(exceptions=True)):
+        name = to_ascii(name)
+        if name is not None:
+            rules.append((kind, name))
+    return rules
+
+
+class Allowlist:
+    """
+    full:/domain:/regexp: rules. Exact names and suffixes are hash sets, so
+    `covers` is one set lookup per label of the name; regexps, usually a
+    handful, are only tried when those miss.
+    """
+
+    def __init__(self):
+        self.full = set()
+        self.domain = set()
+        self.regexps: List[re.Pattern] = []
+
+    def add(self, kind: str, value: str):
+        if kind == "full":
+            self.full.add(value)
+        elif kind == "domain":
+            self.domain.add(value)
+        else:
+            self.regexps.append(re.compile(value))
+
+    @classmethod
+    def load(cls, lines: Iterable[str], default: str = "domain") -> "Allowlist":
+        allow = cls()
+        for line in lines:
+            for kind, value in parse_rule(line, default):
+                allow.add(kind, value)
+        return allow
+
+    def __len__(self) -> int:
+        return len(self.full) + len(self.domain) + len(self.regexps)
+
+    def covers(self, name: str) -> bool:
+        if name in self.full or name in self.domain:
+            return True
+        i = name.find(".")
+        while i >= 0:
+            if name[i + 1:] in self.domain:
+                return True
+            i = name.find(".", i + 1)
+        return any(r.search(name) for r in self.regexps)
+
+    def split(self, names: Iterable[str],
+              removed: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+        """Names not covered, in input order; covered ones are passed to `removed`."""
+        for name in names:
+            if not self.covers(name):
+                yield name
+            elif removed is not None:
+                removed(name)
+
+
+def write_lines(path: Path, items: Iterable[str]) -> int:
+    n = 0
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        for item in items:
+            f.write(item + "\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+# ----------------------------------------------------------------------
+# sources
+# ----------------------------------------------------------------------
+def read_lines(paths: List[str]) -> Iterator[str]:
+    if not paths:
+        yield from sys.stdin
+        return
+    for p in paths:
+        with open(p, encoding="utf-8", errors="replace") as f:
+            yield from f
+
+
+def load_config(path: Path = CONFIG) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))["categories"]
+
+
+def build_category(spec: dict, blobs: dict, urls: List[str], out: Path, chunk: int = CHUNK) -> int:
+    def lines():
+        for url in urls:
+            yield from listfetch.blob_lines(blobs[url])
+
+    if spec.get("raw"):
+        drop = tuple(spec.get("drop", ()))
+        return write_lines(out, (line for line in (raw.rstrip("\r\n") for raw in lines())
+                                 if line.strip() and not any(d in line for d in drop)))
+    if spec.get("allowlist"):
+        rules = (f"{kind}:{value}" for line in lines()
+                 for kind, value in parse_rule(line, spec["allowlist"]))
+        return write_lines(out, sorted_unique(rules, chunk))
+    return write_lines(out, sorted_unique(normalize(lines(), Options.from_config(spec)), chunk))
+
+
+def build(categories: dict, names: Iterable[str], outdir: Path, chunk: int = CHUNK,
+          jobs: int = listfetch.JOBS):
+    """
+    Fetch the sources of every category at once, then normalize each one.
+    A category whose sources failed or came out empty is rebuilt from its
+    "fallback" URLs; one that failed without a fallback is an error once
+    the other categories are written.
+    """
+    names = list(names)
+    cache = listfetch.Cache.default()
+    blobs, failed = listfetch.fetch_some((u for n in names for u in categories[n]["sources"]), cache, jobs)
+    errors = []
+    for name in names:
+        spec = categories[name]
+        out = outdir / spec["output"]
+        missing = [u for u in spec["sources"] if u in failed]
+        if missing and not spec.get("fallback"):
+            errors.extend(str(failed[u]) for u in missing)
+            continue
+        n = 0 if missing else build_category(spec, blobs, spec["sources"], out, chunk)
+        if n == 0 and spec.get("fallback"):
+            why = "; ".join(str(failed[u]) for u in missing) if missing else "sources are empty"
+            print(f"⚠️ {name}: {why}; using fallback", file=sys.stderr)
+            blobs.update(listfetch.fetch_many(spec["fallback"], cache, jobs))
+            n = build_category(spec, blobs, spec["fallback"], out, chunk)
+        print(f"✓ {name}: {n} lines -> {out}")
+    if errors:
+        raise listfetch.FetchError("; ".join(errors))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Normalize domain blocklists.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("build", help="fetch and normalize categories from the config")
+    b.add_argument("categories", nargs="*", metavar="CATEGORY")
+    b.add_argument("--config", type=Path, default=CONFIG)
+    b.add_argument("--outdir", type=Path, default=Path("."))
+    b.add_argument("--chunk", type=int, default=CHUNK)
+    b.add_argument("-j", "--jobs", type=int, default=listfetch.JOBS, help="concurrent downloads")
+
+    a = sub.add_parser("allow", help="drop names covered by allowlist rules")
+    a.add_argument("input", type=Path)
+    a.add_argument("--allowlist", type=Path, action="append", required=True, metavar="FILE")
+    a.add_argument("--default", choices=KINDS[:2], default="domain",
+                   help="kind of bare names in the allowlist (default: domain)")
+    a.add_argument("-o", "--output", type=Path, required=True)
+    a.add_argument("--removed", type=Path, help="write the allowed names here")
+
+    p = sub.add_parser("prune", help="drop subdomains of listed domains")
+    p.add_argument("input", type=Path)
+    p.add_argument("-o", "--output", type=Path, required=True)
+    p.add_argument("--removed", type=Path, help="write the dropped names here")
+
+    n = sub.add_parser("normalize", help="normalize FILEs (or stdin) to stdout")
+    n.add_argument("files", nargs="*", metavar="FILE")
+    n.add_argument("--strip-www", action="store_true")
+    n.add_argument("--exceptions", action="store_true", help="keep @@ exception rules")
+    n.add_argument("--drop", action="append", default=[], metavar="SUBSTR")
+    n.add_argument("--chunk", type=int, default=CHUNK)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        categories = load_config(args.config)
+        unknown = [c for c in args.categories if c not in categories]
+        if unknown:
+            sys.exit(f"unknown categories: {', '.join(unknown)}")
+        try:
+            build(categories, args.categories or list(categories), args.outdir, args.chunk, args.jobs)
+        except listfetch.FetchError as e:
+            sys.exit(f"❌ {e}")
+    elif args.command == "allow":
+        allow = Allowlist.load(read_lines([str(p) for p in args.allowlist]), args.default)
+        allowed = 0
+        audit = open(args.removed, "w", encoding="utf-8", newline="\n") if args.removed else None
+
+        def removed(name: str):
+            nonlocal allowed
+            allowed += 1
+            if audit:
+                audit.write(name + "\n")
+
+        try:
+            names = (line.strip() for line in read_lines([str(args.input)]))
+            n = write_lines(args.output, allow.split((name for name in names if name), removed))
+        finally:
+            if audit:
+                audit.close()
+        print(f"✓ {args.input}: kept {n}, allowed {allowed} ({len(allow)} allowlist rules)")
+    elif args.command == "prune":
+        names = (line.strip() for line in read_lines([str(args.input)]))
+        kept, removed = remove_covered(n for n in names if n)
+        write_lines(args.output, kept)
+        if args.removed:
+            write_lines(args.removed, removed)
+        print(f"✓ {args.input}: kept {len(kept)}, removed {len(removed)} covered subdomains")
+    else:
+        opts = Options(args.strip_www, args.exceptions, args.drop)
+        out = sys.stdout
+        for name in sorted_unique(normalize(read_lines(args.files), opts), args.chunk):
+            out.write(name + "\n")
+
+
+if __name__ == "__main__":
+    main()
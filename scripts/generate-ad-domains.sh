@@ -1,28 +1,10 @@
 #!/bin/bash
 
-gh api https://api.github.com/repos/hagezi/dns-blocklists/contents/wildcard/pro.plus.mini-onlydomains.txt -H "Accept: application/vnd.github.raw" > category-ads-all-raw.txt
-gh api https://api.github.com/repos/m0zgen/dns-hole/contents/dns-blacklist.txt -H "Accept: application/vnd.github.raw" >> category-ads-all-raw.txt
-gh api https://api.github.com/repos/m0zgen/dns-hole/contents/malisious.txt -H "Accept: application/vnd.github.raw" >> category-ads-all-raw.txt
-gh api https://api.github.com/repos/hagezi/dns-blocklists/contents/wildcard/tif.medium-onlydomains.txt -H "Accept: application/vnd.github.raw" > tifmedium.txt
-gh api https://api.github.com/repos/phishdestroy/destroylist/contents/list.txt -H "Accept: application/vnd.github.raw" >> category-ads-all-raw.txt
-gh api https://api.github.com/repos/DNSBunker/CTI/contents/domains.txt >> category-ads-all-raw.txt
+# category-ads-all-temp.txt, whitelist-temp.txt and tifmedium.txt are written by
+# "python3 scripts/domainlist.py build" (see domainlists.json)
 
-cat category-ads-all-raw.txt | sed -e 's/^\(|\|\*\|\.\|\-\|0\.0\.0\.0\|127\.0\.0\.1\)*//g' -e 's/\^.*$//g' -e '/!\|?\|@\|#\|\*\|_\|\\\|\/\|\[\|]\|\[\|\([0-9]\{1,3\}\.\)\{3\}[0-9]\{1,3\}/d' -e '/\.$/d' -e '/^\s*$/d' | awk '{$1=$1};1' | dos2unix | idn2 --no-alabelroundtrip --no-tr46 | LC_ALL=C sort -u > category-ads-all-temp.txt
-
-gh api https://api.github.com/repos/AdguardTeam/AdGuardSDNSFilter/contents/Filters/exclusions.txt -H "Accept: application/vnd.github.raw" > whitelist-raw.txt
-gh api https://api.github.com/repos/AdguardTeam/AdGuardSDNSFilter/contents/Filters/exceptions.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-gh api https://api.github.com/repos/dnswarden/blocklist-staging/contents/whitelist/tinylist.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-gh api https://api.github.com/repos/dnswarden/blocklist-staging/contents/whitelist/whitelistcommon.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-gh api https://api.github.com/repos/iam-py-test/allowlist/contents/allowlist.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-gh api https://api.github.com/repos/hagezi/dns-blocklists/contents/wildcard/whitelist-referral-onlydomains.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-gh api https://api.github.com/repos/m0zgen/dns-hole/contents/whitelist.txt -H "Accept: application/vnd.github.raw" >> whitelist-raw.txt
-
-cat whitelist-raw.txt | sed -e 's/^\(|\|@\|\*\|\.\|\-\|0\.0\.0\.0\|127\.0\.0\.1\)*//g' -e 's/\^.*$//g' -e '/!\|?\|@\|#\|\*\|_\|\\\|\/\|\[\|]\|\[\|\([0-9]\{1,3\}\.\)\{3\}[0-9]\{1,3\}/d' -e '/\.$/d' -e '/^\s*$/d' | awk '{$1=$1};1' | dos2unix | idn2 --no-alabelroundtrip --no-tr46 | LC_ALL=C sort -u > whitelist-temp.txt
-
-comm -23 category-ads-all-temp.txt whitelist-temp.txt > category-ads-all-temp-temp.txt
-sed -e 's/^/\./' -e 's/\./\\./g' -e 's/\-/\\-/g' -e 's/$/\$/' category-ads-all-temp-temp.txt > category-ads-all-sub.txt
-cat category-ads-all-temp-temp.txt | LC_ALL=C grep -f category-ads-all-sub.txt | LC_ALL=C sort -u > category-ads-all-redundant-sub.txt
-comm -23 category-ads-all-temp-temp.txt category-ads-all-redundant-sub.txt > category-ads-all.txt
-rm -f category-ads-all-raw.txt whitelist-raw.txt category-ads-all-temp.txt whitelist-temp.txt
+python3 scripts/domainlist.py allow category-ads-all-temp.txt --allowlist whitelist-temp.txt -o category-ads-all-temp-temp.txt
+python3 scripts/domainlist.py prune category-ads-all-temp-temp.txt -o category-ads-all.txt --removed category-ads-all-redundant-sub.txt
+rm -f category-ads-all-temp.txt whitelist-temp.txt
 mv category-ads-all.txt domains
 mv tifmedium.txt domains
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Incremental build graph for the category lists and the geosite .dat files.
+
+geobuild.json lists the steps in dependency order. Each step has a command
+(`run`), the files it reads (`inputs`, plus whole directories under
+`input_dirs` such as the upstream v2ray-geosite/data) and the files it
+produces (`outputs`). A step's key is the sha256 of
+
+  its spec, the content of every input file and of every file in its
+  input directories (hidden ones such as .git skipped), and of its `tool`
+  binary if it names one
+
+and the outputs of the last run are kept per step as content-addressed
+blobs. When the key matches, the outputs are restored from the cache
+instead of running the command. So that a restored step leaves the same
+tree as a run, a step also lists the intermediates its command leaves
+behind (`temporaries`, cached and restored like outputs) and the inputs it
+deletes or moves away (`removes`, deleted after a restore). A cron tick where only tifmedium.txt
+changed therefore reruns the ads step and the geosite step, and restores
+everything else.
+
+Run from the release checkout root, after "domainlist.py build".
+
+Location: $GEOBUILD_CACHE, default ~/.cache/geobuild. GEOBUILD_CACHE=off
+runs every step.
+
+Usage:
+  python3 scripts/geobuild.py [--plan] [--force] [STEP...]
+    STEP     run only these steps (default: all, in file order)
+    --plan   print which steps are up to date and which would run, then exit
+    --force  run the steps even when their key matches
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+CONFIG = HERE / "geobuild.json"
+CACHE_ENV = "GEOBUILD_CACHE"
+DEFAULT_DIR = Path.home() / ".cache" / "geobuild"
+FORMAT = 1
+
+
+class BuildError(Exception):
+    pass
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Cache:
+    def __init__(self, root: Optional[Path]):
+        self.root = root
+        self.index: Dict[str, dict] = {}
+        if root and (root / "index.json").exists():
+            try:
+                data = json.loads((root / "index.json").read_text(encoding="utf-8"))
+                if data.get("format") == FORMAT:
+                    self.index = data["steps"]
+            except (ValueError, KeyError):
+                self.index = {}
+
+    @classmethod
+    def default(cls) -> "Cache":
+        loc = os.environ.get(CACHE_ENV)
+        if loc == "off":
+            return cls(None)
+        return cls(Path(loc) if loc else DEFAULT_DIR)
+
+    def blob(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def lookup(self, step: str, key: str) -> Optional[Dict[str, str]]:
+        """output path -> blob digest, if the step last ran with this key."""
+        if self.root is None:
+            return None
+        e = self.index.get(step)
+        if not e or e["key"] != key:
+            return None
+        if not all(self.blob(d).exists() for d in e["outputs"].values()):
+            return None
+        return e["outputs"]
+
+    def store(self, step: str, key: str, base: Path, outputs: List[str]):
+        if self.root is None:
+            return
+        recorded = {}
+        for out in outputs:
+            path = base / out
+            digest = file_hash(path)
+            blob = self.blob(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_name(f".{digest}.tmp")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, blob)
+            recorded[out] = digest
+        self.index[step] = {"key": key, "outputs": recorded, "built": int(time.time())}
+
+    def save(self):
+        if self.root is None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / ".index.json.tmp"
+        tmp.write_text(json.dumps({"format": FORMAT, "steps": self.index}, indent=1), encoding="utf-8")
+        os.replace(tmp, self.root / "index.json")
+
+
+def step_key(name: str, spec: dict, base: Path) -> str:
+    h = hashlib.sha256(json.dumps({name: spec}, sort_keys=True).encode("utf-8"))
+    for inp in spec.get("inputs", []):
+        path = base / inp
+        if not path.exists():
+            raise BuildError(f"{name}: missing input {inp}")
+        h.update(f"\0input {inp} {file_hash(path)}".encode("utf-8"))
+    for d in spec.get("input_dirs", []):
+        data_dir = base / d
+        if not data_dir.is_dir():
+            raise BuildError(f"{name}: missing input directory {d}")
+        for path in sorted(p for p in data_dir.rglob("*")
+                           if p.is_file() and not any(part.startswith(".") for part in p.relative_to(data_dir).parts)):
+            h.update(f"\0data {path.relative_to(base)} {file_hash(path)}".encode("utf-8"))
+    tool = spec.get("tool")
+    if tool and (base / tool).exists():
+        h.update(f"\0tool {file_hash(base / tool)}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def restore(outputs: Dict[str, str], cache: Cache, base: Path):
+    for path, digest in outputs.items():
+        dest = base / path
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cache.blob(digest), dest)
+
+
+def build(steps: Dict[str, dict], wanted: List[str], base: Path = Path("."),
+          cache: Optional[Cache] = None, force: bool = False, plan: bool = False) -> Dict[str, str]:
+    """Run or restore each wanted step; returns step -> "built" | "cached" | "stale"."""
+    cache = cache or Cache.default()
+    status: Dict[str, str] = {}
+    for name in wanted:
+        spec = steps[name]
+        key = step_key(name, spec, base)
+        hit = None if force else cache.lookup(name, key)
+        if plan:
+            status[name] = "cached" if hit else "stale"
+            print(f"  {name:<18} {'up to date' if hit else 'would run'}")
+            continue
+        if hit:
+            restore(hit, cache, base)
+            for gone in spec.get("removes", []):
+                (base / gone).unlink(missing_ok=True)
+            status[name] = "cached"
+            print(f"• {name}: up to date, restored {len(hit)} file(s) from cache")
+            continue
+        cmd = spec["run"]
+        start = time.perf_counter()
+        if subprocess.run(cmd, shell=True, cwd=base).returncode != 0:
+            raise BuildError(f"{name}: command failed: {cmd}")
+        outputs = [base / o for o in spec["outputs"]]
+        missing = [str(o) for o in outputs if not o.exists()]
+        if missing:
+            raise BuildError(f"{name}: outputs not produced: {', '.join(missing)}")
+        temporaries = [t for t in spec.get("temporaries", []) if (base / t).exists()]
+        cache.store(name, key, base, spec["outputs"] + temporaries)
+        cache.save()
+        status[name] = "built"
+        print(f"✓ {name}: built in {time.perf_counter() - start:.1f}s")
+    return status
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rebuild category lists and .dat files incrementally.")
+    ap.add_argument("steps", nargs="*", metavar="STEP")
+    ap.add_argument("--config", type=Path, default=CONFIG)
+    ap.add_argument("--plan", action="store_true", help="show what would run and exit")
+    ap.add_argument("--force", action="store_true", help="ignore the cache")
+    args = ap.parse_args()
+
+    steps = json.loads(args.config.read_text(encoding="utf-8"))["steps"]
+    unknown = [s for s in args.steps if s not in steps]
+    if unknown:
+        sys.exit(f"unknown steps: {', '.join(unknown)}")
+    try:
+        status = build(steps, args.steps or list(steps), force=args.force, plan=args.plan)
+    except BuildError as e:
+        sys.exit(f"❌ {e}")
+    if not args.plan:
+        built = sum(1 for s in status.values() if s == "built")
+        print(f"✅ Done: {built} built, {len(status) - built} restored from cache.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Native writer for v2ray geosite.dat files (GeoSiteList protobuf).
+
+Reads category lists in the domain-list-community format
+
+  domain:a.com  a.com  full:a.com  keyword:ad  regexp:^ad[0-9]+\\.   @attr
+  include:other [@attr] [@-attr]
+
+and writes every .dat file listed in geosite.json in one run, replacing
+the external `geosite` binary and the copies into v2ray-geosite/data,
+datalite/ and security/. Each output names its categories and the file
+each one is read from, optionally on top of a base data directory
+(geosite.dat uses the upstream v2ray-geosite/data).
+
+Every source file is parsed once, and every category is flattened (includes
+resolved) and encoded once: its encoded GeoSite message is kept under a key
+made of its source files and include resolution, so category-ads-all,
+malware, phishing and cryptominers are serialized once and the same bytes
+are written to all three files. Entries are sorted by country code like
+domain-list-community does, so identical input gives an identical file.
+
+`export` names lists to also write as plaintext (type:value[:@attr,...])
+into the output directory, like the --exportlists flag of the old tool.
+
+An output's "optimize" opts categories into regexopt.py: true for all of
+them, or a list of category names. Their regexp: rules that are plain names
+or keywords in disguise are rewritten, and rules covered by other rules are
+dropped. Categories not named keep their rules exactly as written.
+
+Usage:
+  python3 scripts/geosite.py [--config FILE] [--outdir DIR] [OUTPUT...]
+  python3 scripts/geosite.py dump FILE.dat        categories and rule counts
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+CONFIG = HERE / "geosite.json"
+
+# routercommon.Domain.Type
+TYPES = {"keyword": 0, "regexp": 1, "domain": 2, "full": 3}
+TYPE_NAMES = {v: k for k, v in TYPES.items()}
+
+Rule = Tuple[str, str, Tuple[str, ...]]             # (type, value, attrs)
+
+
+class GeoSiteError(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------
+# parsing
+# ----------------------------------------------------------------------
+class SourceFile:
+    def __init__(self, rules: List[Rule], includes: List[Tuple[str, Tuple[str, ...]]]):
+        self.rules = rules
+        self.includes = includes        # (name, attr filters such as "ads" / "-ads")
+
+
+def parse_file(path: Path) -> SourceFile:
+    rules: List[Rule] = []
+    includes = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            attrs = tuple(p[1:].lower() for p in parts[1:] if p.startswith("@"))
+            kind, sep, value = parts[0].partition(":")
+            if not sep:
+                kind, value = "domain", parts[0]
+            if kind == "include":
+                includes.append((value.lower(), attrs))
+                continue
+            if kind not in TYPES:
+                raise GeoSiteError(f"{path}:{n}: unknown rule type: {kind}")
+            if kind != "regexp":
+                value = value.lower()
+            rules.append((kind, value, attrs))
+    return SourceFile(rules, includes)
+
+
+def _wanted(rule: Rule, filters: Tuple[str, ...]) -> bool:
+    for f in filters:
+        if f.startswith("-"):
+            if f[1:] in rule[2]:
+                return False
+        elif f not in rule[2]:
+            return False
+    return True
+
+
+# ----------------------------------------------------------------------
+# encoding
+# ----------------------------------------------------------------------
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _field(tag: int, payload: bytes) -> bytes:
+    return bytes((tag,)) + _varint(len(payload)) + payload
+
+
+def encode_domain(rule: Rule) -> bytes:
+    kind, value, attrs = rule
+    t = TYPES[kind]
+    body = (b"\x08" + _varint(t) if t else b"") + _field(0x12, value.encode("utf-8"))
+    for a in attrs:
+        body += _field(0x1A, _field(0x0A, a.encode("utf-8")) + b"\x10\x01")   # bool_value = true
+    return _field(0x12, body)
+
+
+def encode_geosite(code: str, rules: List[Rule]) -> bytes:
+    return _field(0x0A, code.encode("utf-8")) + b"".join(encode_domain(r) for r in rules)
+
+
+# ----------------------------------------------------------------------
+# building
+# ----------------------------------------------------------------------
+class Builder:
+    """Parses, flattens and encodes each category once across all outputs."""
+
+    def __init__(self):
+        self.parsed: Dict[Path, SourceFile] = {}
+        self.flat: Dict[tuple, List[Rule]] = {}
+        self.blobs: Dict[tuple, bytes] = {}
+        self.encoded = 0
+        self.report = None
+
+    def source(self, path: Path) -> SourceFile:
+        path = path.resolve()
+        if path not in self.parsed:
+            self.parsed[path] = parse_file(path)
+        return self.parsed[path]
+
+    def signature(self, name: str, lists: Dict[str, Path], stack: Tuple[str, ...] = ()) -> tuple:
+        """What a flattened category depends on: its file and, recursively, its includes."""
+        if name not in lists:
+            raise GeoSiteError(f"{' -> '.join(stack + (name,))}: list not found")
+        if name in stack:
+            raise GeoSiteError(f"include cycle: {' -> '.join(stack + (name,))}")
+        src = self.source(lists[name])
+        return (str(lists[name].resolve()),
+                tuple((inc, filters, self.signature(inc, lists, stack + (name,)))
+                      for inc, filters in src.includes))
+
+    def flatten(self, name: str, lists: Dict[str, Path], optimize: bool = False) -> Tuple[tuple, List[Rule]]:
+        sig = (self.signature(name, lists), optimize)
+        if sig not in self.flat:
+            if optimize:
+                _, rules = self.flatten(name, lists)
+                rules = self._optimize(rules)
+            else:
+                src = self.source(lists[name])
+                rules = list(src.rules)
+                for inc, filters in src.includes:
+                    _, inc_rules = self.flatten(inc, lists)
+                    rules.extend(r for r in inc_rules if _wanted(r, filters))
+                rules = list(dict.fromkeys(rules))
+            self.flat[sig] = rules
+        return sig, self.flat[sig]
+
+    def _optimize(self, rules: List[Rule]) -> List[Rule]:
+        import regexopt             # imports this module, so only when asked for
+        if self.report is None:
+            self.report = regexopt.Report()
+        return regexopt.optimize(rules, self.report)
+
+    def blob(self, name: str, lists: Dict[str, Path], optimize: bool = False) -> bytes:
+        sig, rules = self.flatten(name, lists, optimize)
+        key = (name, sig)
+        if key not in self.blobs:
+            self.blobs[key] = encode_geosite(name.upper(), rules)
+            self.encoded += 1
+        return self.blobs[key]
+
+
+def data_lists(spec: dict, base: Path) -> Dict[str, Path]:
+    lists: Dict[str, Path] = {}
+    if spec.get("base"):
+        d = base / spec["base"]
+        if not d.is_dir():
+            raise GeoSiteError(f"base data directory not found: {d}")
+        lists.update((p.name.lower(), p) for p in d.iterdir() if p.is_file())
+    for name, src in spec.get("lists", {}).items():
+        path = base / src
+        if not path.exists():
+            raise GeoSiteError(f"missing category source: {path}")
+        lists[name.lower()] = path
+    return lists
+
+
+def optimized(spec: dict, name: str) -> bool:
+    """Whether the output's "optimize" (true or a list of names) covers category name."""
+    opt = spec.get("optimize", False)
+    return opt is True or (isinstance(opt, list) and name in (n.lower() for n in opt))
+
+
+def write_dat(path: Path, blobs: Iterator[bytes]) -> int:
+    """Stream GeoSiteList.entry fields to path (atomically); returns its size."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    size = 0
+    with open(tmp, "wb") as f:
+        for blob in blobs:
+            size += f.write(_field(0x0A, blob))
+    os.replace(tmp, path)
+    return size
+
+
+def export_text(path: Path, rules: List[Rule]):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for kind, value, attrs in rules:
+            suffix = ":" + ",".join(f"@{a}" for a in attrs) if attrs else ""
+            f.write(f"{kind}:{value}{suffix}\n")
+
+
+def build(outputs: Dict[str, dict], names: List[str], outdir: Path, base: Path = Path("."),
+          builder: Optional[Builder] = None) -> Builder:
+    builder = builder or Builder()
+    outdir.mkdir(parents=True, exist_ok=True)
+    for out in names:
+        spec = outputs[out]
+        lists = data_lists(spec, base)
+        size = write_dat(outdir / out, (builder.blob(name, lists, optimized(spec, name))
+                                        for name in sorted(lists, key=str.upper)))
+        print(f"✓ {out}: {len(lists)} categories, {size} bytes")
+        for name in spec.get("export", []):
+            export_text(outdir / f"{name}.txt", builder.flatten(name, lists, optimized(spec, name))[1])
+    print(f"  {builder.encoded} categories encoded, {len(builder.parsed)} files parsed")
+    if builder.report is not None:
+        r = builder.report
+        print(f"  {len(r.rewritten)} regexps rewritten, {len(r.kept)} kept, "
+              f"{r.shadowed} covered rules dropped")
+        for pattern, why in sorted(r.kept.items()):
+            print(f"  • regexp:{pattern} stays ({why})")
+    return builder
+
+
+# ----------------------------------------------------------------------
+# reading back
+# ----------------------------------------------------------------------
+def read_varint(buf, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+
+def fields(buf, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, object]]:
+    """(field number, wire type, value) of a message; length-delimited values are (start, end)."""
+    i, end = start, len(buf) if end is None else end
+    while i < end:
+        key, i = read_varint(buf, i)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = read_varint(buf, i)
+        elif wire == 2:
+            n, i = read_varint(buf, i)
+            value, i = (i, i + n), i + n
+        else:
+            raise GeoSiteError(f"unexpected wire type {wire} at byte {i}")
+        yield field, wire, value
+
+
+def read_dat(buf) -> Iterator[Tuple[str, Tuple[int, int]]]:
+    """(country code, (start, end) of the GeoSite message) for every entry."""
+    for field, wire, (s, e) in fields(buf):
+        if field != 1:
+            continue
+        code = ""
+        for f, w, v in fields(buf, s, e):
+            if f == 1:
+                code = bytes(buf[v[0]:v[1]]).decode("utf-8")
+                break
+        yield code, (s, e)
+
+
+def read_rules(buf, span: Tuple[int, int]) -> Iterator[Rule]:
+    for f, w, v in fields(buf, *span):
+        if f != 2:
+            continue
+        t, value, attrs = 0, "", []
+        for df, dw, dv in fields(buf, *v):
+            if df == 1:
+                t = dv
+            elif df == 2:
+                value = bytes(buf[dv[0]:dv[1]]).decode("utf-8")
+            elif df == 3:
+                for af, aw, av in fields(buf, *dv):
+                    if af == 1:
+                        attrs.append(bytes(buf[av[0]:av[1]]).decode("utf-8"))
+        yield TYPE_NAMES.get(t, str(t)), value, tuple(attrs)
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv[:1] == ["dump"]:
+        ap = argparse.ArgumentParser(description="List the categories of a geosite .dat file.")
+        ap.add_argument("file", type=Path)
+        args = ap.parse_args(argv[1:])
+        buf = args.file.read_bytes()
+        for code, span in read_dat(buf):
+            counts: Dict[str, int] = {}
+            for kind, _, _ in read_rules(buf, span):
+                counts[kind] = counts.get(kind, 0) + 1
+            detail = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+            print(f"{code:<32} {span[1] - span[0]:>10} bytes  {detail}")
+        return
+
+    ap = argparse.ArgumentParser(description="Write geosite .dat files from category lists.")
+    ap.add_argument("outputs", nargs="*", metavar="OUTPUT")
+    ap.add_argument("--config", type=Path, default=CONFIG)
+    ap.add_argument("--outdir", type=Path, default=Path("release"))
+    args = ap.parse_args(argv)
+    config = json.loads(args.config.read_text(encoding="utf-8"))
+    outputs = config["outputs"]
+    unknown = [o for o in args.outputs if o not in outputs]
+    if unknown:
+        sys.exit(f"unknown outputs: {', '.join(unknown)}")
+    try:
+        build(outputs, args.outputs or list(outputs), args.outdir)
+    except (GeoSiteError, OSError) as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Concurrent list fetcher with conditional requests and a local cache.
+
+Every upstream list is fetched at once (asyncio; each request runs on a
+pool of --jobs worker threads, so --jobs requests are in flight), so a build waits on the slowest
+source instead of the sum of all of them. Responses are kept as
+content-addressed blobs (named by their sha256) next to an index mapping
+each URL to its blob and the ETag / Last-Modified the server sent. The next
+fetch sends those back as If-None-Match / If-Modified-Since; a 304 reuses the
+blob without a download, and for api.github.com does not count against the
+rate limit either. If a source fails and a cached copy exists, the cached
+copy is used with a warning.
+
+GitHub API URLs are requested raw and with $GITHUB_TOKEN (or $GH_TOKEN);
+any other http(s) URL works as-is, so a local stand-in such as
+`python3 -m http.server` can serve a test tree.
+
+Location: $DOMAINLIST_CACHE, default ~/.cache/domainlists.
+DOMAINLIST_CACHE=off keeps blobs in a temporary directory for this run only.
+
+Usage:
+  python3 scripts/listfetch.py [-j N] URL...     fetch, print blob paths
+  python3 scripts/listfetch.py stats
+  python3 scripts/listfetch.py clear
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+CACHE_ENV = "DOMAINLIST_CACHE"
+DEFAULT_DIR = Path.home() / ".cache" / "domainlists"
+FORMAT = 1
+JOBS = 16
+TIMEOUT = 120
+
+
+class FetchError(Exception):
+    pass
+
+
+class Cache:
+    def __init__(self, root: Path):
+        self.root = root
+        self.index_path = root / "index.json"
+        self.index: Dict[str, dict] = {}
+        if self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                if data.get("format") == FORMAT:
+                    self.index = data["urls"]
+            except (ValueError, KeyError):
+                self.index = {}
+
+    @classmethod
+    def default(cls) -> "Cache":
+        loc = os.environ.get(CACHE_ENV)
+        if loc == "off":
+            return cls(Path(tempfile.mkdtemp(prefix="domainlists-")))
+        return cls(Path(loc) if loc else DEFAULT_DIR)
+
+    def blob(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def entry(self, url: str) -> Optional[dict]:
+        """Index entry for url, if its blob is still there."""
+        e = self.index.get(url)
+        if e and self.blob(e["sha256"]).exists():
+            return e
+        return None
+
+    def put(self, url: str, data: bytes, etag: Optional[str], modified: Optional[str]) -> Path:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{digest}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        self.index[url] = {"sha256": digest, "etag": etag, "last_modified": modified,
+                           "size": len(data), "fetched": int(time.time())}
+        return path
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(".index.json.tmp")
+        tmp.write_text(json.dumps({"format": FORMAT, "urls": self.index}, indent=1), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.index = {}
+
+
+def _request(url: str, cached: Optional[dict]) -> urllib.request.Request:
+    req = urllib.request.Request(url, headers={"Accept": "application/vnd.github.raw"})
+    token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
+    if token and url.startswith("https://api.github.com/"):
+        req.add_header("Authorization", f"Bearer {token}")
+    if cached:
+        if cached.get("etag"):
+            req.add_header("If-None-Match", cached["etag"])
+        if cached.get("last_modified"):
+            req.add_header("If-Modified-Since", cached["last_modified"])
+    return req
+
+
+def _get(url: str, cached: Optional[dict]):
+    """Blocking conditional GET: (status, body, etag, last-modified)."""
+    try:
+        with urllib.request.urlopen(_request(url, cached), timeout=TIMEOUT) as resp:
+            return resp.status, resp.read(), resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 304, b"", None, None
+        raise
+
+
+async def fetch(url: str, cache: Cache, sem: asyncio.Semaphore, pool: ThreadPoolExecutor,
+                log=sys.stderr) -> Path:
+    cached = cache.entry(url)
+    async with sem:
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            status, body, etag, modified = await loop.run_in_executor(pool, _get, url, cached)
+        except (urllib.error.URLError, OSError) as e:
+            if cached:
+                print(f"⚠️ {url}: {e}; using cached copy", file=log)
+                return cache.blob(cached["sha256"])
+            raise FetchError(f"{url}: {e}") from e
+    ms = (time.perf_counter() - start) * 1000
+    if status == 304 and cached:
+        print(f"• {url}: not modified ({ms:.0f} ms)", file=log)
+        return cache.blob(cached["sha256"])
+    path = cache.put(url, body, etag, modified)
+    print(f"↓ {url}: {len(body)} bytes ({ms:.0f} ms)", file=log)
+    return path
+
+
+async def fetch_all(urls: Iterable[str], cache: Cache, jobs: int = JOBS,
+                    log=sys.stderr) -> Tuple[Dict[str, Path], Dict[str, FetchError]]:
+    """
+    Fetch every url concurrently. Returns (url -> local blob, url -> error)
+    so a caller can fall back for the urls that failed.
+    """
+    urls = list(dict.fromkeys(urls))
+    sem = asyncio.Semaphore(jobs)
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="listfetch") as pool:
+        results = await asyncio.gather(*(fetch(u, cache, sem, pool, log) for u in urls),
+                                       return_exceptions=True)
+    cache.save()
+    paths, failed = {}, {}
+    for url, r in zip(urls, results):
+        if isinstance(r, FetchError):
+            failed[url] = r
+        elif isinstance(r, BaseException):
+            raise r
+        else:
+            paths[url] = r
+    return paths, failed
+
+
+def fetch_some(urls: Iterable[str], cache: Optional[Cache] = None,
+               jobs: int = JOBS) -> Tuple[Dict[str, Path], Dict[str, FetchError]]:
+    return asyncio.run(fetch_all(urls, cache or Cache.default(), jobs))
+
+
+def fetch_many(urls: Iterable[str], cache: Optional[Cache] = None, jobs: int = JOBS) -> Dict[str, Path]:
+    """url -> local blob for every url; raises FetchError if any of them failed."""
+    paths, failed = fetch_some(urls, cache, jobs)
+    if failed:
+        raise FetchError("; ".join(str(e) for e in failed.values()))
+    return paths
+
+
+def blob_lines(path: Path) -> Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fetch lists concurrently through the local cache.")
+    ap.add_argument("urls", nargs="+", metavar="URL", help="URLs, or 'stats' / 'clear'")
+    ap.add_argument("-j", "--jobs", type=int, default=JOBS)
+    args = ap.parse_args()
+    cache = Cache.default()
+
+    if args.urls == ["stats"]:
+        size = sum(e["size"] for e in cache.index.values())
+        print(f"cache: {cache.root}")
+        print(f"  {len(cache.index)} urls, {size / 1e6:.1f} MB")
+        return
+    if args.urls == ["clear"]:
+        cache.clear()
+        print(f"✓ cleared {cache.root}")
+        return
+    try:
+        paths = fetch_many(args.urls, cache, args.jobs)
+    except FetchError as e:
+        sys.exit(f"❌ {e}")
+    for url, path in paths.items():
+        print(f"{path}\t{url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+"""
+Domain liveness checker over DNS-over-HTTPS and plain UDP DNS.
+
+Every domain is asked to every resolver at the same time (an A query), with
+at most --concurrency domains in flight, each resolver held to its own
+--rate of queries per second, and timeouts, SERVFAIL and HTTP 429/5xx
+retried with exponential backoff. A domain is DEAD for a resolver when the
+answer is NXDOMAIN: nothing exists at or below the name, so a domain: rule
+for it can never match. NOERROR without addresses is EMPTY (subdomains may
+still exist), and a resolver that never answered gives ERROR. Only domains
+that every resolver reports DEAD are written out; as soon as one resolver
+says otherwise the other queries for that domain are dropped.
+
+Resolvers are given as names (cloudflare, google, quad9), as DoH URLs
+(https://host/dns-query; http:// works for a local stand-in) or as
+udp://host[:port], so a stub DNS server on 127.0.0.1 can stand in for the
+real resolvers.
+
+Results are kept in a SQLite store: the current verdict of every domain
+(DEAD only when every resolver said so), how long it has held and how many
+checks in a row confirmed it, plus an append-only history of every check.
+A run only re-checks domains whose verdict is older than its TTL, so
+domains confirmed alive yesterday or dead for months are not queried again
+every night. The TTL starts at TTL[status] and doubles with every check that
+confirms the same verdict, up to MAX_TTL[status], with a per-domain jitter
+that spreads re-checks over several days; new domains and changed verdicts
+are checked on the next run. The output is built from the store, so it
+covers every input domain, checked tonight or not.
+
+Location: $LIVENESS_CACHE, default ~/.cache/liveness. LIVENESS_CACHE=off
+keeps the store in memory and checks everything.
+
+`export` writes the DEAD verdicts with their age and number of confirming
+checks; the nightly job publishes that file on the redundant branch. `prune`
+applies it to category lists at release time: a name is dropped once it has
+been dead for --grace days and at least --confidence checks in a row agreed,
+so one bad night at a resolver never removes anything. It reports, per
+list, the entries dropped and the bytes they took in geosite.dat.
+
+Usage:
+  python3 scripts/liveness.py DOMAINS.txt [-r RESOLVER...] [-o DEAD.txt]
+                              [--results FILE.csv] [-c N] [--rate QPS]
+                              [--retries N] [--timeout SEC]
+                              [--full] [--budget N]
+  python3 scripts/liveness.py stats [DOMAINS.txt]
+  python3 scripts/liveness.py export [-o liveness.tsv]
+  python3 scripts/liveness.py prune --dead liveness.tsv [--confidence N]
+                              [--grace DAYS] [--removed-dir DIR] FILE...
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import http.client
+import os
+import random
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from geosite import encode_domain
+
+RESOLVERS = {
+    "cloudflare": "https://cloudflare-dns.com/dns-query",
+    "google": "https://dns.google/dns-query",
+    "quad9": "https://dns.quad9.net/dns-query",
+}
+CONCURRENCY = 100
+RATE = 200.0                # queries per second, per resolver
+RETRIES = 3
+TIMEOUT = 5.0
+BACKOFF = 0.5               # first retry delay in seconds, doubled each time
+
+CACHE_ENV = "LIVENESS_CACHE"
+DEFAULT_DIR = Path.home() / ".cache" / "liveness"
+DAY = 86400.0
+# re-check interval after the first check with a verdict, and its ceiling
+TTL = {"ALIVE": 7 * DAY, "EMPTY": 3 * DAY, "DEAD": 1 * DAY, "ERROR": DAY / 4}
+MAX_TTL = {"ALIVE": 60 * DAY, "EMPTY": 21 * DAY, "DEAD": 14 * DAY, "ERROR": 1 * DAY}
+HISTORY_DAYS = 180
+CONFIDENCE = 3              # checks in a row that must agree before a name is pruned
+GRACE_DAYS = 14             # and for how long it must have been dead
+
+ALIVE, EMPTY, DEAD, ERROR = "ALIVE", "EMPTY", "DEAD", "ERROR"
+
+NOERROR, SERVFAIL, NXDOMAIN = 0, 2, 3
+
+
+class ResolverError(Exception):
+    """A failed attempt that is worth retrying."""
+
+
+# ----------------------------------------------------------------------
+# DNS messages
+# ----------------------------------------------------------------------
+def query_message(name: str, qid: int = 0) -> bytes:
+    """A recursive A query for name."""
+    labels = b"".join(bytes((len(p),)) + p for p in name.rstrip(".").encode("idna").split(b".") if p)
+    return struct.pack(">HHHHHH", qid, 0x0100, 1, 0, 0, 0) + labels + b"\x00" + struct.pack(">HH", 1, 1)
+
+
+def classify(response: bytes) -> str:
+    """Status of a DNS response; raises ResolverError when it should be retried."""
+    if len(response) < 12:
+        raise ResolverError("short DNS response")
+    _, flags, _, ancount = struct.unpack(">HHHH", response[:8])
+    rcode = flags & 0xF
+    if rcode == NXDOMAIN:
+        return DEAD
+    if rcode != NOERROR:
+        raise ResolverError(f"rcode {rcode}")
+    if ancount or flags & 0x0200:       # answers, or truncated because there are many
+        return ALIVE
+    return EMPTY
+
+
+# ----------------------------------------------------------------------
+# resolvers
+# ----------------------------------------------------------------------
+class RateLimit:
+    """Spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next)
+        self.next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Resolver:
+    """Base class: `exchange` sends one query; `resolve` adds rate limit and retries."""
+
+    def __init__(self, name: str, rate: float = RATE, retries: int = RETRIES, timeout: float = TIMEOUT):
+        self.name = name
+        self.limit = RateLimit(rate)
+        self.retries = retries
+        self.timeout = timeout
+        self.queries = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def exchange(self, name: str) -> bytes:
+        raise NotImplementedError
+
+    async def resolve(self, name: str) -> str:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(BACKOFF * 2 ** (attempt - 1) * (0.5 + random.random()))
+            await self.limit.wait()
+            self.queries += 1
+            try:
+                return classify(await asyncio.wait_for(self.exchange(name), self.timeout))
+            except (ResolverError, asyncio.TimeoutError, OSError):
+                continue
+        return ERROR
+
+
+class DoHResolver(Resolver):
+    """RFC 8484 GET requests over kept-alive HTTP/1.1 connections, one per worker thread."""
+
+    def __init__(self, name: str, url: str, workers: int = CONCURRENCY, **kw):
+        super().__init__(name, **kw)
+        u = urllib.parse.urlsplit(url)
+        self.https = u.scheme == "https"
+        self.host = u.hostname
+        self.port = u.port
+        self.path = u.path or "/dns-query"
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix=f"doh-{name}")
+        self.local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _get(self, name: str) -> bytes:
+        dns = base64.urlsafe_b64encode(query_message(name)).rstrip(b"=").decode("ascii")
+        conn = self._conn()
+        try:
+            conn.request("GET", f"{self.path}?dns={dns}", headers={"Accept": "application/dns-message"})
+            resp = conn.getresponse()
+            body = resp.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            self.local.conn = None
+            raise ResolverError(str(e)) from None
+        if resp.status != 200:
+            raise ResolverError(f"HTTP {resp.status}")
+        return body
+
+    async def exchange(self, name: str) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._get, name)
+
+    async def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 2:
+            fut = self.pending.pop(struct.unpack(">H", data[:2])[0], None)
+            if fut and not fut.done():
+                fut.set_result(data)
+
+    def error_received(self, exc):
+        for fut in self.pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        self.pending.clear()
+
+
+class UDPResolver(Resolver):
+    """Plain DNS over one UDP socket, answers matched to queries by message id."""
+
+    def __init__(self, name: str, host: str, port: int = 53, **kw):
+        super().__init__(name, **kw)
+        self.addr = (host, port)
+        self.transport = None
+        self.protocol: Optional[_UDPProtocol] = None
+
+    async def start(self):
+        self.transport, self.protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+            _UDPProtocol, remote_addr=self.addr)
+
+    async def exchange(self, name: str) -> bytes:
+        pending = self.protocol.pending
+        qid = random.getrandbits(16)
+        while qid in pending:
+            qid = random.getrandbits(16)
+        fut = pending[qid] = asyncio.get_running_loop().create_future()
+        try:
+            self.transport.sendto(query_message(name, qid))
+            return await fut
+        finally:
+            pending.pop(qid, None)
+
+    async def close(self):
+        if self.transport:
+            self.transport.close()
+
+
+def make_resolver(spec: str, **kw) -> Resolver:
+    """Resolver from a name in RESOLVERS, a DoH URL or udp://host[:port]."""
+    url = RESOLVERS.get(spec.lower(), spec)
+    u = urllib.parse.urlsplit(url)
+    name = spec.lower() if spec.lower() in RESOLVERS else u.netloc
+    if u.scheme in ("http", "https"):
+        return DoHResolver(name, url, **kw)
+    if u.scheme == "udp":
+        kw.pop("workers", None)
+        return UDPResolver(name, u.hostname, u.port or 53, **kw)
+    raise ValueError(f"unknown resolver: {spec}")
+
+
+# ----------------------------------------------------------------------
+# checking
+# ----------------------------------------------------------------------
+async def check_domain(name: str, resolvers: List[Resolver]) -> Dict[str, str]:
+    """resolver name -> status; stops asking once one resolver reports not DEAD."""
+    tasks = {asyncio.ensure_future(r.resolve(name)): r.name for r in resolvers}
+    results: Dict[str, str] = {}
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            results[tasks[t]] = t.result()
+        if any(s != DEAD for s in results.values()):
+            for t in pending:
+                t.cancel()
+            break
+    return results
+
+
+async def check_all(domains: Iterable[str], resolvers: List[Resolver],
+                    concurrency: int = CONCURRENCY, log=sys.stderr) -> Dict[str, Dict[str, str]]:
+    """domain -> {resolver: status} for every domain, checked concurrently."""
+    sem = asyncio.Semaphore(concurrency)
+    done = 0
+    domains = list(domains)
+
+    async def one(name: str):
+        nonlocal done
+        async with sem:
+            result = await check_domain(name, resolvers)
+        done += 1
+        if log and done % 5000 == 0:
+            print(f"  {done}/{len(domains)} checked", file=log)
+        return result
+
+    for r in resolvers:
+        await r.start()
+    try:
+        results = await asyncio.gather(*(one(d) for d in domains))
+    finally:
+        for r in resolvers:
+            await r.close()
+    return dict(zip(domains, results))
+
+
+def verdict(statuses: Dict[str, str], resolvers: List[str]) -> str:
+    """DEAD when every resolver said so; otherwise the best answer any of them gave."""
+    if all(statuses.get(n) == DEAD for n in resolvers):
+        return DEAD
+    for status in (ALIVE, EMPTY):
+        if status in statuses.values():
+            return status
+    return ERROR
+
+
+# ----------------------------------------------------------------------
+# store
+# ----------------------------------------------------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    name TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    since REAL NOT NULL,        -- first check that gave this status
+    checked REAL NOT NULL,      -- last check
+    streak INTEGER NOT NULL,    -- checks in a row that gave this status
+    due REAL NOT NULL           -- when to check again
+);
+CREATE INDEX IF NOT EXISTS domains_due ON domains (due);
+CREATE TABLE IF NOT EXISTS history (
+    name TEXT NOT NULL,
+    checked REAL NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT NOT NULL        -- resolver=status,...
+);
+"""
+
+
+def interval(name: str, status: str, streak: int) -> float:
+    """Seconds until the next check of a verdict confirmed `streak` times."""
+    base = min(TTL[status] * 2 ** min(streak - 1, 16), MAX_TTL[status])
+    jitter = int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:2], "big") / 0xFFFF
+    return base * (0.75 + 0.5 * jitter)
+
+
+class Store:
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    @classmethod
+    def default(cls) -> "Store":
+        loc = os.environ.get(CACHE_ENV)
+        if loc == "off":
+            return cls(":memory:")
+        return cls(str((Path(loc) if loc else DEFAULT_DIR) / "liveness.db"))
+
+    def get(self, names: Iterable[str]) -> Dict[str, tuple]:
+        """name -> (status, since, checked, streak, due) for the names in the store."""
+        out = {}
+        names = list(names)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT name, status, since, checked, streak, due FROM domains "
+                f"WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+            out.update((r[0], r[1:]) for r in rows)
+        return out
+
+    def due(self, names: List[str], now: float, budget: Optional[int] = None) -> List[str]:
+        """Names to check now: unknown ones first, then the most overdue."""
+        known = self.get(names)
+        new = [n for n in names if n not in known]
+        overdue = sorted((known[n][4], n) for n in names if n in known and known[n][4] <= now)
+        picked = new + [n for _, n in overdue]
+        return picked if budget is None else picked[:budget]
+
+    def record(self, results: Dict[str, Dict[str, str]], resolvers: List[str], now: float):
+        known = self.get(results)
+        rows, history = [], []
+        for name, statuses in results.items():
+            status = verdict(statuses, resolvers)
+            old = known.get(name)
+            if old and old[0] == status:
+                since, streak = old[1], old[3] + 1
+            else:
+                since, streak = now, 1
+            rows.append((name, status, since, now, streak, now + interval(name, status, streak)))
+            history.append((name, now, status, ",".join(f"{k}={v}" for k, v in sorted(statuses.items()))))
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO domains VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT INTO history VALUES (?, ?, ?, ?)", history)
+            self.db.execute("DELETE FROM history WHERE checked < ?", (now - HISTORY_DAYS * DAY,))
+
+    def dead(self, names: List[str]) -> List[str]:
+        """The names whose current verdict is DEAD."""
+        return sorted(n for n, row in self.get(names).items() if row[0] == DEAD)
+
+    def close(self):
+        self.db.close()
+
+
+def read_domains(path: Path) -> List[str]:
+    out = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip().lower().rstrip(".")
+            if not line:
+                continue
+            try:
+                line.encode("idna")
+            except UnicodeError:
+                print(f"⚠️ {line}: not a valid domain name, skipped", file=sys.stderr)
+                continue
+            out.append(line)
+    return list(dict.fromkeys(out))
+
+
+def write_results(path: Path, results: Dict[str, Dict[str, str]], names: List[str]):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(",".join(["domain"] + names) + "\n")
+        for d in sorted(results):
+            f.write(",".join([d] + [results[d].get(n, "") for n in names]) + "\n")
+
+
+# ----------------------------------------------------------------------
+# pruning
+# ----------------------------------------------------------------------
+def export(store: Store, path: Path) -> int:
+    rows = store.db.execute("SELECT name, since, streak FROM domains WHERE status = ? ORDER BY name", (DEAD,))
+    n = 0
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write("# domain\tdead since (unix time)\tchecks in a row\n")
+        for name, since, streak in rows:
+            f.write(f"{name}\t{int(since)}\t{streak}\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def load_dead(path: Path) -> Dict[str, Tuple[float, int]]:
+    """name -> (dead since, confirming checks) from an `export` file."""
+    out = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            name, since, streak = line.rstrip("\n").split("\t")
+            out[name] = (float(since), int(streak))
+    return out
+
+
+def prune_file(path: Path, dead: Dict[str, Tuple[float, int]], confidence: int, grace: float,
+               now: float, removed: Optional[Path] = None) -> Tuple[int, int, int]:
+    """Drops confirmed-dead names from a category list in place: (kept, dropped, geosite bytes)."""
+    kept: List[str] = []
+    dropped: List[str] = []
+    size = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = line.strip()
+            kind, sep, value = entry.partition(":")
+            if not sep:
+                kind, value = "domain", entry
+            info = dead.get(value) if kind in ("domain", "full") else None
+            if info and info[1] >= confidence and now - info[0] >= grace:
+                dropped.append(entry)
+                size += len(encode_domain((kind, value, ())))
+            elif entry:
+                kept.append(entry)
+    if dropped:
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(e + "\n" for e in kept)
+        os.replace(tmp, path)
+    if removed:
+        with open(removed, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(e + "\n" for e in dropped)
+    return len(kept), len(dropped), size
+
+
+def stats(store: Store, names: Optional[List[str]], now: float):
+    where = ""
+    if names is not None:
+        store.db.execute("CREATE TEMP TABLE wanted (name TEXT PRIMARY KEY)")
+        store.db.executemany("INSERT OR IGNORE INTO temp.wanted VALUES (?)", ((n,) for n in names))
+        where = "WHERE name IN (SELECT name FROM temp.wanted)"
+    print(f"store: {store.path}")
+    rows = store.db.execute(f"SELECT status, COUNT(*), SUM(due <= ?), AVG(? - since) FROM domains {where} "
+                            f"GROUP BY status ORDER BY status", (now, now))
+    for status, count, due, age in rows:
+        print(f"  {status:<6} {count:>8} domains, {due:>7} due now, held {age / DAY:.0f} days on average")
+    if names is not None:
+        unknown = len(names) - store.db.execute(f"SELECT COUNT(*) FROM domains {where}").fetchone()[0]
+        print(f"  {'new':<6} {unknown:>8} domains")
+    day = store.db.execute(f"SELECT COUNT(*) FROM domains {where} {'AND' if where else 'WHERE'} due <= ?",
+                           (now + DAY,)).fetchone()[0]
+    print(f"  {day} checks due within a day")
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv[:1] == ["stats"]:
+        ap = argparse.ArgumentParser(description="Show the liveness store.")
+        ap.add_argument("domains", type=Path, nargs="?", help="only count these domains")
+        args = ap.parse_args(argv[1:])
+        store = Store.default()
+        stats(store, read_domains(args.domains) if args.domains else None, time.time())
+        store.close()
+        return
+
+    if argv[:1] == ["export"]:
+        ap = argparse.ArgumentParser(description="Write the DEAD verdicts of the liveness store.")
+        ap.add_argument("-o", "--output", type=Path, default=Path("liveness.tsv"))
+        args = ap.parse_args(argv[1:])
+        store = Store.default()
+        n = export(store, args.output)
+        store.close()
+        print(f"✓ {args.output}: {n} dead domains")
+        return
+    if argv[:1] == ["prune"]:
+        ap = argparse.ArgumentParser(description="Drop confirmed-dead names from category lists.")
+        ap.add_argument("files", nargs="+", type=Path, metavar="FILE")
+        ap.add_argument("--dead", type=Path, required=True, help="file written by `export`")
+        ap.add_argument("--confidence", type=int, default=CONFIDENCE,
+                        help=f"checks in a row that must agree (default: {CONFIDENCE})")
+        ap.add_argument("--grace", type=float, default=GRACE_DAYS,
+                        help=f"days a name must have been dead (default: {GRACE_DAYS})")
+        ap.add_argument("--removed-dir", type=Path, help="write the dropped names of FILE to DIR/FILE")
+        args = ap.parse_args(argv[1:])
+        if not args.dead.exists():
+            # a silent no-op would hide that pruning never ran
+            sys.exit(f"❌ {args.dead} not found; nothing to prune with")
+        try:
+            dead = load_dead(args.dead)
+        except (OSError, ValueError) as e:
+            sys.exit(f"❌ {args.dead}: {e}")
+        if args.removed_dir:
+            args.removed_dir.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        total_n = total_bytes = 0
+        for path in args.files:
+            removed = args.removed_dir / path.name if args.removed_dir else None
+            kept, n, size = prune_file(path, dead, args.confidence, args.grace * DAY, now, removed)
+            pct = n / (kept + n) * 100 if kept + n else 0
+            print(f"✓ {path}: -{n} entries ({pct:.1f}%), -{size} bytes in geosite.dat")
+            total_n += n
+            total_bytes += size
+        print(f"✅ {total_n} dead entries pruned, {total_bytes} bytes less in geosite.dat")
+        return
+
+    ap = argparse.ArgumentParser(description="Find domains that no resolver can resolve.")
+    ap.add_argument("domains", type=Path)
+    ap.add_argument("-r", "--resolver", action="append", dest="resolvers", metavar="RESOLVER",
+                    help=f"{', '.join(RESOLVERS)}, a DoH URL or udp://host[:port] (default: cloudflare, google)")
+    ap.add_argument("-o", "--output", type=Path, help="domains DEAD for every resolver (default: stdout)")
+    ap.add_argument("--results", type=Path, help="write the statuses of this run as CSV")
+    ap.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY)
+    ap.add_argument("--rate", type=float, default=RATE, help="queries per second per resolver (0: unlimited)")
+    ap.add_argument("--retries", type=int, default=RETRIES)
+    ap.add_argument("--timeout", type=float, default=TIMEOUT)
+    ap.add_argument("--full", action="store_true", help="check every domain, not only those due")
+    ap.add_argument("--budget", type=int, default=None, help="check at most N domains, most overdue first")
+    args = ap.parse_args(argv)
+
+    try:
+        domains = read_domains(args.domains)
+        resolvers = [make_resolver(s, rate=args.rate, retries=args.retries, timeout=args.timeout,
+                                   workers=args.concurrency)
+                     for s in args.resolvers or ["cloudflare", "google"]]
+        store = Store.default()
+    except (OSError, ValueError, sqlite3.Error) as e:
+        sys.exit(f"❌ {e}")
+    names = [r.name for r in resolvers]
+
+    now = time.time()
+    todo = domains[:args.budget] if args.full else store.due(domains, now, args.budget)
+    print(f"• {len(todo)} of {len(domains)} domains due for a check", file=sys.stderr)
+    start = time.perf_counter()
+    results = asyncio.run(check_all(todo, resolvers, args.concurrency)) if todo else {}
+    elapsed = time.perf_counter() - start
+    for r in resolvers if results else []:
+        counts: Dict[str, int] = {}
+        for statuses in results.values():
+            s = statuses.get(r.name)
+            if s:
+                counts[s] = counts.get(s, 0) + 1
+        detail = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+        print(f"• {r.name}: {r.queries} queries; {detail}", file=sys.stderr)
+
+    store.record(results, names, now)
+    found = store.dead(domains)
+    store.close()
+    if args.results:
+        write_results(args.results, results, names)
+    out = open(args.output, "w", encoding="utf-8", newline="\n") if args.output else sys.stdout
+    try:
+        out.writelines(d + "\n" for d in found)
+    finally:
+        if args.output:
+            out.close()
+    print(f"✅ {len(found)} of {len(domains)} domains dead on every resolver "
+          f"({len(results)} checked in {elapsed:.1f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
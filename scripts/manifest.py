@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Release manifest: checksums of every artifact and a jsDelivr purge of the
+files that changed.
+
+`hash` memory-maps every file of the release directory and hashes them in
+a thread pool (hashlib releases the GIL while it digests a buffer, so the
+files are hashed in parallel and never copied into Python). It writes the
+<file>.sha256sum sidecars in the format of `sha256sum FILE` for the
+published binaries, then manifest.json with the size and sha256 of every
+file, sidecars included.
+
+`purge` compares manifest.json with the previous release's and asks jsDelivr
+to drop its cached copy of each file that is new, changed or gone, at most
+--jobs requests at a time. Unchanged files keep their CDN cache. Without a
+previous manifest everything is purged. Failed purges are reported but do
+not fail the release.
+
+Usage:
+  python3 scripts/manifest.py hash DIR [--sums PATTERN...] [-j N]
+  python3 scripts/manifest.py purge DIR --repo OWNER/REPO@BRANCH
+                                [--previous FILE] [-j N] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+FORMAT = 1
+MANIFEST = "manifest.json"
+SUMS = ("*.dat", "*.mmdb")
+PURGE_URL = "https://purge.jsdelivr.net/gh/{repo}/{path}"
+JOBS = 8
+TIMEOUT = 60
+
+
+class ManifestError(Exception):
+    pass
+
+
+def sha256_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+
+def release_files(directory: Path) -> List[str]:
+    """Every file below directory (relative, '/'-separated), the manifest excluded."""
+    out = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in files:
+            rel = (Path(root) / name).relative_to(directory).as_posix()
+            if rel != MANIFEST and not name.startswith("."):
+                out.append(rel)
+    return sorted(out)
+
+
+def hash_files(directory: Path, names: List[str], jobs: Optional[int] = None) -> Dict[str, dict]:
+    with ThreadPoolExecutor(jobs or os.cpu_count() or 1) as pool:
+        digests = pool.map(lambda n: sha256_file(directory / n), names)
+        return {n: {"size": (directory / n).stat().st_size, "sha256": d} for n, d in zip(names, digests)}
+
+
+def write_sums(directory: Path, patterns, jobs: Optional[int] = None) -> Dict[str, dict]:
+    """Writes <file>.sha256sum for the files matching patterns; returns their entries."""
+    names = sorted({p.name for pattern in patterns for p in directory.glob(pattern) if p.is_file()})
+    entries = hash_files(directory, names, jobs)
+    for name, e in entries.items():
+        # the path as `sha256sum DIR/FILE` would print it
+        line = f"{e['sha256']}  {os.path.join(str(directory), name)}\n"
+        (directory / f"{name}.sha256sum").write_text(line, encoding="utf-8", newline="\n")
+    return entries
+
+
+def build(directory: Path, patterns=SUMS, jobs: Optional[int] = None) -> dict:
+    sums = write_sums(directory, patterns, jobs)
+    names = release_files(directory)
+    files = hash_files(directory, [n for n in names if n not in sums], jobs)
+    files.update(sums)
+    manifest = {"format": FORMAT, "files": {n: files[n] for n in sorted(files)}}
+    path = directory / MANIFEST
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=1) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return manifest
+
+
+def load(path: Optional[Path]) -> Dict[str, dict]:
+    """The files of a manifest; empty when there is none."""
+    if path is None or not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as e:
+        raise ManifestError(f"{path}: {e}") from None
+    if data.get("format") != FORMAT:
+        raise ManifestError(f"{path}: unsupported manifest format {data.get('format')}")
+    return data["files"]
+
+
+def changed(current: Dict[str, dict], previous: Dict[str, dict]) -> List[str]:
+    """Files new, changed or removed since previous (everything without one)."""
+    if not previous:
+        return sorted(current)
+    out = [n for n, e in current.items() if previous.get(n, {}).get("sha256") != e["sha256"]]
+    return sorted(out + [n for n in previous if n not in current])
+
+
+def _purge(url: str) -> int:
+    with urllib.request.urlopen(urllib.request.Request(url), timeout=TIMEOUT) as resp:
+        resp.read()
+        return resp.status
+
+
+async def purge_one(url: str, sem: asyncio.Semaphore, pool: ThreadPoolExecutor,
+                    log=sys.stderr) -> bool:
+    async with sem:
+        try:
+            status = await asyncio.get_running_loop().run_in_executor(pool, _purge, url)
+        except (urllib.error.URLError, OSError) as e:
+            print(f"⚠️ {url}: {e}", file=log)
+            return False
+    print(f"✓ {url}: {status}", file=log)
+    return True
+
+
+async def purge_all(urls: List[str], jobs: int = JOBS, log=sys.stderr) -> int:
+    """Purges urls concurrently; returns the number that failed."""
+    sem = asyncio.Semaphore(jobs)
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="purge") as pool:
+        results = await asyncio.gather(*(purge_one(u, sem, pool, log) for u in urls))
+    return results.count(False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Checksums, release manifest and CDN purge.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    h = sub.add_parser("hash", help="write .sha256sum files and manifest.json")
+    h.add_argument("directory", type=Path)
+    h.add_argument("--sums", nargs="+", default=list(SUMS), metavar="PATTERN",
+                   help="files that get a .sha256sum sidecar")
+    h.add_argument("-j", "--jobs", type=int, default=None)
+    p = sub.add_parser("purge", help="purge changed files from the jsDelivr cache")
+    p.add_argument("directory", type=Path)
+    p.add_argument("--repo", required=True, help="OWNER/REPO@BRANCH as served by jsDelivr")
+    p.add_argument("--previous", type=Path, help="manifest.json of the previous release")
+    p.add_argument("-j", "--jobs", type=int, default=JOBS)
+    p.add_argument("--dry-run", action="store_true", help="only list what would be purged")
+    args = ap.parse_args()
+
+    try:
+        if args.command == "hash":
+            manifest = build(args.directory, args.sums, args.jobs)
+            files = manifest["files"]
+            size = sum(e["size"] for e in files.values())
+            print(f"✓ {args.directory / MANIFEST}: {len(files)} files, {size / 1e6:.1f} MB")
+            return
+
+        current = load(args.directory / MANIFEST)
+        if not current:
+            raise ManifestError(f"{args.directory / MANIFEST} not found; run `hash` first")
+        previous = load(args.previous)
+        names = changed(current, previous) + [MANIFEST]
+        print(f"• {len(names)} to purge, {len(current) + 1 - len(names)} unchanged")
+        urls = [PURGE_URL.format(repo=args.repo, path=urllib.parse.quote(n)) for n in names]
+        if args.dry_run:
+            print("\n".join(urls))
+            return
+        failed = asyncio.run(purge_all(urls, args.jobs))
+        if failed:
+            print(f"⚠️ {failed} of {len(urls)} purges failed")
+        else:
+            print(f"✅ purged {len(urls)} files")
+    except (ManifestError, OSError) as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
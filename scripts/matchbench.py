@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Benchmark of matcher structures for geosite categories.
+
+Loads the rules of one or more categories (from a geosite .dat or from list
+files in the domain-list-community format), builds every structure below
+for the rule types it serves, replays a stream of hostnames through each and
+reports build time, memory and time per lookup:
+
+  domain / full rules
+    suffix-set    hash sets of domain and full values; a lookup probes the
+                  host and each of its parent suffixes (what the Xray/v2ray
+                  "domain" matcher group amounts to)
+    label-trie    nested dicts keyed by reversed labels (com -> example -> www)
+    dafsa         minimal acyclic automaton over the reversed names, stored as
+                  three flat arrays (succinct: shared suffixes *and* prefixes)
+  keyword rules
+    keyword-scan  `keyword in host` for every keyword
+    aho-corasick  one pass over the host through an Aho-Corasick automaton
+  regexp rules
+    regexp-scan   every regexp in turn, as the router does
+    regexp-union  one alternation of all regexps
+
+Every structure of a group must give the same answer for every query; a
+mismatch is reported as an error. Times are for this Python implementation:
+compare the rows with each other (and the `baseline` row, the cost of the
+loop itself), not with the Go matchers on a phone.
+
+The query stream is synthetic unless --queries names a file of hostnames (one
+per line, e.g. from a DNS log): a Zipf-distributed mix of names covered by
+the rules (with subdomain prefixes added to domain rules) and near misses
+and random names, with --hit-ratio of the population being hits.
+
+Usage:
+  python3 scripts/matchbench.py --dat release/geosite.dat [--category NAME...]
+  python3 scripts/matchbench.py --list FILE [--list FILE...]
+      [--queries FILE] [-n N] [--hit-ratio R] [--seed S] [--json OUT]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from geosite import GeoSiteError, Rule, parse_file, read_dat, read_rules
+
+QUERIES = 200_000
+HIT_RATIO = 0.2
+ZIPF = 1.1
+PREFIXES = ("www", "m", "cdn", "api", "static", "img", "s1", "edge-42", "a.b")
+TLDS = ("com", "net", "org", "io", "pk", "ir", "de", "co.uk", "xyz", "app")
+
+
+# ----------------------------------------------------------------------
+# domain / full matchers
+# ----------------------------------------------------------------------
+class SuffixSet:
+    def __init__(self, rules: List[Rule]):
+        self.domains = {v for k, v, _ in rules if k == "domain"}
+        self.full = {v for k, v, _ in rules if k == "full"}
+
+    def match(self, host: str) -> bool:
+        if host in self.domains or host in self.full:
+            return True
+        domains = self.domains
+        i = host.find(".")
+        while i >= 0:
+            if host[i + 1:] in domains:
+                return True
+            i = host.find(".", i + 1)
+        return False
+
+
+class LabelTrie:
+    DOMAIN, FULL = "\x00", "\x01"       # end-of-rule markers, never a label
+
+    def __init__(self, rules: List[Rule]):
+        self.root: dict = {}
+        for kind, value, _ in rules:
+            if kind not in ("domain", "full"):
+                continue
+            node = self.root
+            for label in reversed(value.split(".")):
+                node = node.setdefault(label, {})
+            node[self.DOMAIN if kind == "domain" else self.FULL] = True
+
+    def match(self, host: str) -> bool:
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self.DOMAIN in node:
+                return True
+        return self.FULL in node
+
+
+class _State:
+    __slots__ = ("edges", "final")
+
+    def __init__(self):
+        self.edges: Dict[int, "_State"] = {}
+        self.final = False
+
+    def key(self):
+        # edges are added in byte order (the words are sorted), so no sort is needed
+        return self.final, tuple((c, id(s)) for c, s in self.edges.items())
+
+
+class DAFSA:
+    """
+    Minimal automaton over the reversed rule values, each ending in a marker
+    byte (0 for domain:, 1 for full:), built incrementally from sorted input
+    (Daciuk et al.) and flattened into `first` (edge offset per state),
+    `labels` (edge bytes, sorted per state) and `targets`.
+    """
+
+    DOMAIN, FULL, DOT = 0, 1, ord(".")
+
+    def __init__(self, rules: List[Rule]):
+        words = sorted({value.encode("utf-8")[::-1] + bytes((self.DOMAIN if kind == "domain" else self.FULL,))
+                        for kind, value, _ in rules if kind in ("domain", "full")})
+        root = _State()
+        register: Dict[tuple, _State] = {}
+        unchecked: List[Tuple[_State, int, _State]] = []
+        prev = b""
+
+        def minimize(down_to: int):
+            while len(unchecked) > down_to:
+                parent, c, child = unchecked.pop()
+                k = child.key()
+                if k in register:
+                    parent.edges[c] = register[k]
+                else:
+                    register[k] = child
+
+        for word in words:
+            common = len(os.path.commonprefix((word, prev)))
+            minimize(common)
+            node = unchecked[-1][2] if unchecked else root
+            for c in word[common:]:
+                nxt = _State()
+                node.edges[c] = nxt
+                unchecked.append((node, c, nxt))
+                node = nxt
+            node.final = True
+            prev = word
+        minimize(0)
+
+        number = {id(root): 0}
+        order = [root]
+        for s in order:
+            for t in s.edges.values():
+                if id(t) not in number:
+                    number[id(t)] = len(order)
+                    order.append(t)
+        self.first = array("I", [0])
+        labels = bytearray()
+        self.targets = array("I")
+        for s in order:
+            for c, t in s.edges.items():
+                labels.append(c)
+                self.targets.append(number[id(t)])
+            self.first.append(len(labels))
+        self.labels = bytes(labels)
+        self.states = len(order)
+
+    def _next(self, s: int, c: int) -> int:
+        i = self.labels.find(c, self.first[s], self.first[s + 1])
+        return -1 if i < 0 else self.targets[i]
+
+    def match(self, host: str) -> bool:
+        s = 0
+        for c in host.encode("utf-8")[::-1]:
+            if c == self.DOT and self._next(s, self.DOMAIN) >= 0:
+                return True
+            s = self._next(s, c)
+            if s < 0:
+                return False
+        return self._next(s, self.DOMAIN) >= 0 or self._next(s, self.FULL) >= 0
+
+
+# ----------------------------------------------------------------------
+# keyword matchers
+# ----------------------------------------------------------------------
+class KeywordScan:
+    def __init__(self, rules: List[Rule]):
+        self.keywords = sorted({v for k, v, _ in rules if k == "keyword"})
+
+    def match(self, host: str) -> bool:
+        return any(k in host for k in self.keywords)
+
+
+class AhoCorasick:
+    def __init__(self, rules: List[Rule]):
+        goto: List[Dict[str, int]] = [{}]
+        out = [False]
+        for kw in {v for k, v, _ in rules if k == "keyword"}:
+            s = 0
+            for ch in kw:
+                if ch not in goto[s]:
+                    goto.append({})
+                    out.append(False)
+                    goto[s][ch] = len(goto) - 1
+                s = goto[s][ch]
+            out[s] = True
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != t else 0
+                out[t] = out[t] or out[fail[t]]
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def match(self, host: str) -> bool:
+        goto, fail, out = self.goto, self.fail, self.out
+        s = 0
+        for ch in host:
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                return True
+        return False
+
+
+# ----------------------------------------------------------------------
+# regexp matchers
+# ----------------------------------------------------------------------
+def _compile_all(rules: List[Rule]) -> List[re.Pattern]:
+    out = []
+    for k, v, _ in rules:
+        if k == "regexp":
+            try:
+                out.append(re.compile(v))
+            except re.error as e:
+                print(f"⚠️ regexp:{v}: {e}; skipped", file=sys.stderr)
+    return out
+
+
+class RegexpScan:
+    def __init__(self, rules: List[Rule]):
+        self.patterns = _compile_all(rules)
+
+    def match(self, host: str) -> bool:
+        return any(p.search(host) for p in self.patterns)
+
+
+class RegexpUnion:
+    def __init__(self, rules: List[Rule]):
+        patterns = _compile_all(rules)
+        self.union = re.compile("|".join(f"(?:{p.pattern})" for p in patterns)) if patterns else None
+
+    def match(self, host: str) -> bool:
+        return self.union is not None and self.union.search(host) is not None
+
+
+class Baseline:
+    def __init__(self, rules: List[Rule]):
+        pass
+
+    def match(self, host: str) -> bool:
+        return False
+
+
+GROUPS = {
+    "domain/full": (("domain", "full"), (("suffix-set", SuffixSet), ("label-trie", LabelTrie), ("dafsa", DAFSA))),
+    "keyword": (("keyword",), (("keyword-scan", KeywordScan), ("aho-corasick", AhoCorasick))),
+    "regexp": (("regexp",), (("regexp-scan", RegexpScan), ("regexp-union", RegexpUnion))),
+}
+
+
+# ----------------------------------------------------------------------
+# inputs
+# ----------------------------------------------------------------------
+def load_rules(dat: Optional[Path], categories: List[str], lists: List[Path]) -> List[Rule]:
+    rules: List[Rule] = []
+    if dat:
+        buf = dat.read_bytes()
+        wanted = {c.upper() for c in categories}
+        for code, span in read_dat(buf):
+            if not wanted or code.upper() in wanted:
+                rules.extend(read_rules(buf, span))
+    for path in lists:
+        src = parse_file(path)
+        if src.includes:
+            print(f"⚠️ {path}: include: lines are not followed", file=sys.stderr)
+        rules.extend(src.rules)
+    return list(dict.fromkeys((k, v, ()) for k, v, _ in rules))
+
+
+def synth_queries(rules: List[Rule], n: int, hit_ratio: float, seed: int) -> List[str]:
+    """A Zipf-weighted stream over a population of hits, near misses and random names."""
+    rng = random.Random(seed)
+    names = [(k, v) for k, v, _ in rules if k in ("domain", "full")]
+    keywords = [v for k, v, _ in rules if k == "keyword"]
+    population = []
+    size = max(1000, min(n // 4, 50_000))
+    for _ in range(size):
+        r = rng.random()
+        if names and r < hit_ratio:
+            kind, value = rng.choice(names)
+            if kind == "domain" and rng.random() < 0.6:
+                value = f"{rng.choice(PREFIXES)}.{value}"
+            population.append(value)
+        elif names and r < hit_ratio + (1 - hit_ratio) / 2:
+            _, value = rng.choice(names)             # a sibling that no rule covers
+            head, _, tail = value.partition(".")
+            population.append(f"{head}x{rng.randrange(100)}.{tail}" if tail else f"{head}.{rng.choice(TLDS)}")
+        else:
+            label = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789-") for _ in range(rng.randint(3, 14)))
+            if keywords and rng.random() < 0.05:
+                label += rng.choice(keywords)
+            population.append(f"{rng.choice(PREFIXES)}.{label.strip('-') or 'x'}.{rng.choice(TLDS)}")
+    rng.shuffle(population)
+    weights = [1 / (rank + 1) ** ZIPF for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=n)
+
+
+# ----------------------------------------------------------------------
+# measuring
+# ----------------------------------------------------------------------
+def footprint(obj) -> int:
+    """Bytes held by obj and everything it references (shared objects once)."""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__") and not isinstance(o, type):
+            stack.append(vars(o))
+    return total
+
+
+def measure(cls: Callable, rules: List[Rule], queries: List[str]) -> Tuple[dict, List[bool]]:
+    start = time.perf_counter()
+    matcher = cls(rules)
+    build = time.perf_counter() - start
+    memory = footprint(matcher)
+    match = matcher.match
+    start = time.perf_counter_ns()
+    results = [match(q) for q in queries]
+    elapsed = time.perf_counter_ns() - start
+    return {"build_ms": build * 1000, "memory": memory, "ns_per_lookup": elapsed / len(queries),
+            "matches": sum(results)}, results
+
+
+def run(rules: List[Rule], queries: List[str], log=sys.stdout) -> Dict[str, dict]:
+    report: Dict[str, dict] = {}
+    base, _ = measure(Baseline, rules, queries)
+    report["baseline"] = dict(base, group="-", rules=0)
+    print(f"{'matcher':<14} {'group':<12} {'rules':>8} {'build ms':>10} {'memory':>10} "
+          f"{'ns/lookup':>10} {'matches':>8}", file=log)
+    print(f"{'baseline':<14} {'-':<12} {0:>8} {base['build_ms']:>10.1f} {'-':>10} "
+          f"{base['ns_per_lookup']:>10.0f} {'-':>8}", file=log)
+    errors = []
+    for group, (kinds, matchers) in GROUPS.items():
+        subset = [r for r in rules if r[0] in kinds]
+        if not subset:
+            continue
+        reference = None
+        for name, cls in matchers:
+            stats, results = measure(cls, subset, queries)
+            if reference is None:
+                reference = (name, results)
+            elif results != reference[1]:
+                bad = next(q for q, a, b in zip(queries, reference[1], results) if a != b)
+                errors.append(f"{name} disagrees with {reference[0]} on {bad}")
+                stats["errors"] = 1
+            report[name] = dict(stats, group=group, rules=len(subset))
+            print(f"{name:<14} {group:<12} {len(subset):>8} {stats['build_ms']:>10.1f} "
+                  f"{stats['memory'] / 1048576:>8.1f}Mi {stats['ns_per_lookup']:>10.0f} {stats['matches']:>8}",
+                  file=log)
+    for e in errors:
+        print(f"❌ {e}", file=log)
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark matcher structures on geosite categories.")
+    ap.add_argument("--dat", type=Path, help="geosite .dat file")
+    ap.add_argument("--category", action="append", default=[], metavar="NAME",
+                    help="categories of --dat to load (default: all)")
+    ap.add_argument("--list", action="append", default=[], type=Path, metavar="FILE",
+                    help="category list in the domain-list-community format")
+    ap.add_argument("--queries", type=Path, help="hostnames to replay, one per line")
+    ap.add_argument("-n", type=int, default=QUERIES, help="synthetic queries (default: %(default)s)")
+    ap.add_argument("--hit-ratio", type=float, default=HIT_RATIO)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", type=Path, help="write the results here")
+    args = ap.parse_args()
+    if not args.dat and not args.list:
+        ap.error("give --dat or --list")
+
+    try:
+        rules = load_rules(args.dat, args.category, args.list)
+    except (GeoSiteError, OSError) as e:
+        sys.exit(f"❌ {e}")
+    if not rules:
+        sys.exit("❌ no rules loaded")
+    if args.queries:
+        with open(args.queries, encoding="utf-8", errors="replace") as f:
+            queries = [q.strip().lower().rstrip(".") for q in f if q.strip()]
+    else:
+        queries = synth_queries(rules, args.n, args.hit_ratio, args.seed)
+    counts: Dict[str, int] = {}
+    for k, _, _ in rules:
+        counts[k] = counts.get(k, 0) + 1
+    print(f"• {len(rules)} rules ({', '.join(f'{k} {v}' for k, v in sorted(counts.items()))}), "
+          f"{len(queries)} queries, {len(set(queries))} distinct")
+    report = run(rules, queries)
+    if args.json:
+        args.json.write_text(json.dumps({"rules": counts, "queries": len(queries), "matchers": report},
+                                        indent=1), encoding="utf-8")
+    if any(m.get("errors") for m in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+MaxMind DB (.mmdb) reader, writer and verifier.
+
+Reader: decodes the metadata, the data section and the search tree of an
+.mmdb file held in any buffer; `open_mmdb` memory-maps the file, so only the
+pages actually visited are read. `networks()` walks the tree and yields
+every network with the offset of its record; the IPv4 subtree of an IPv6
+database is visited once, at ::/96, not again under its ::ffff:0:0/96 and
+2002::/16 aliases.
+
+Writer: builds the country-style databases listed in mmdb.json (what the
+geoip tool's maxmindMMDB outputs produced) from the per-list CIDR files of
+its text output. The lists are parsed once in the parent; the search trees
+of all outputs are then built in parallel worker processes, which inherit
+the parsed prefixes on fork. Insertion follows the geoip tool: lists in
+name order, then overwriteList in its order (or wantedList in its order),
+each later network replacing whatever it covers. Each record is
+{"country": {"iso_code": LIST}}; IPv4 lives at ::/96 with the usual aliases.
+
+Verifier: checks a finished file through mmap (metadata fields, the
+16-byte separator, every tree record in range, tree depth, every data
+record decodable), replacing mmdbverify.
+
+Usage:
+  python3 scripts/mmdb.py show FILE.mmdb [--list]   metadata and networks per record
+  python3 scripts/mmdb.py build [--config mmdb.json] [--input output/text]
+                                [--outdir release] [-j N] [OUTPUT...]
+  python3 scripts/mmdb.py verify [-j N] FILE.mmdb...
+"""
+
+import argparse
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cidr
+
+HERE = Path(__file__).resolve().parent
+CONFIG = HERE / "mmdb.json"
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+DATA_SEPARATOR = 16
+
+
+class MMDBError(Exception):
+    pass
+
+
+class Reader:
+    def __init__(self, buf):
+        self.buf = buf
+        pos = buf.rfind(METADATA_MARKER, max(0, len(buf) - 128 * 1024))
+        if pos < 0:
+            raise MMDBError("metadata marker not found")
+        self.metadata_start = pos + len(METADATA_MARKER)
+        self.metadata, _ = self._decode(self.metadata_start, self.metadata_start)
+        if not isinstance(self.metadata, dict):
+            raise MMDBError("metadata is not a map")
+        m = self.metadata
+        try:
+            self.node_count = m["node_count"]
+            self.record_size = m["record_size"]
+            self.ip_version = m["ip_version"]
+        except KeyError as e:
+            raise MMDBError(f"metadata lacks {e}") from None
+        if self.record_size not in (24, 28, 32):
+            raise MMDBError(f"unsupported record size {self.record_size}")
+        self.node_size = self.record_size // 4
+        self.tree_size = self.node_count * self.node_size
+        self.data_start = self.tree_size + DATA_SEPARATOR
+        if self.data_start > pos:
+            raise MMDBError("search tree runs past the metadata")
+
+    # ------------------------------------------------------------------
+    # data section
+    # ------------------------------------------------------------------
+    def record(self, offset: int):
+        """The data record at a data-section offset."""
+        return self._decode(self.data_start + offset, self.data_start)[0]
+
+    def _decode(self, i: int, base: int):
+        buf = self.buf
+        ctrl = buf[i]
+        i += 1
+        kind = ctrl >> 5
+        if kind == 1:                                   # pointer
+            ss = (ctrl >> 3) & 3
+            v = ctrl & 7
+            if ss == 0:
+                p, i = (v << 8) | buf[i], i + 1
+            elif ss == 1:
+                p, i = ((v << 16) | int.from_bytes(buf[i:i + 2], "big")) + 2048, i + 2
+            elif ss == 2:
+                p, i = ((v << 24) | int.from_bytes(buf[i:i + 3], "big")) + 526336, i + 3
+            else:
+                p, i = int.from_bytes(buf[i:i + 4], "big"), i + 4
+            return self._decode(base + p, base)[0], i
+        if kind == 0:
+            kind = 7 + buf[i]
+            i += 1
+        size = ctrl & 0x1F
+        if size >= 29:
+            extra = size - 28
+            n = int.from_bytes(buf[i:i + extra], "big")
+            i += extra
+            size = (29, 285, 65821)[extra - 1] + n
+        if kind == 2:                                   # utf8 string
+            return bytes(buf[i:i + size]).decode("utf-8"), i + size
+        if kind == 3:                                   # double
+            return struct.unpack(">d", buf[i:i + 8])[0], i + 8
+        if kind == 4:                                   # bytes
+            return bytes(buf[i:i + size]), i + size
+        if kind in (5, 6, 9, 10):                       # uint16/32/64/128
+            return int.from_bytes(buf[i:i + size], "big"), i + size
+        if kind == 8:                                   # int32
+            return int.from_bytes(buf[i:i + size], "big", signed=size == 4), i + size
+        if kind == 7:                                   # map
+            out = {}
+            for _ in range(size):
+                k, i = self._decode(i, base)
+                out[k], i = self._decode(i, base)
+            return out, i
+        if kind == 11:                                  # array
+            arr = []
+            for _ in range(size):
+                v, i = self._decode(i, base)
+                arr.append(v)
+            return arr, i
+        if kind == 14:                                  # boolean
+            return bool(size), i
+        if kind == 15:                                  # float
+            return struct.unpack(">f", buf[i:i + 4])[0], i + 4
+        raise MMDBError(f"unsupported data type {kind} at byte {i - 1}")
+
+    # ------------------------------------------------------------------
+    # search tree
+    # ------------------------------------------------------------------
+    def node(self, n: int) -> Tuple[int, int]:
+        b = self.buf
+        i = n * self.node_size
+        if self.record_size == 24:
+            return int.from_bytes(b[i:i + 3], "big"), int.from_bytes(b[i + 3:i + 6], "big")
+        if self.record_size == 28:
+            mid = b[i + 3]
+            return (((mid & 0xF0) << 20) | int.from_bytes(b[i:i + 3], "big"),
+                    ((mid & 0x0F) << 24) | int.from_bytes(b[i + 4:i + 7], "big"))
+        return int.from_bytes(b[i:i + 4], "big"), int.from_bytes(b[i + 4:i + 8], "big")
+
+    def ipv4_start(self) -> int:
+        """Node reached by following ::/96, where IPv4 addresses live in an IPv6 tree."""
+        n = 0
+        for _ in range(96):
+            if n >= self.node_count:
+                break
+            n = self.node(n)[0]
+        return n
+
+    def networks(self) -> Iterator[Tuple[int, int, int, int]]:
+        """(version, network as int, prefix length, data offset) for every network."""
+        bits = 128 if self.ip_version == 6 else 32
+        ipv4_start = self.ipv4_start() if bits == 128 else None
+        stack = [(0, 0, 0)]                             # (node, network, depth)
+        while stack:
+            n, net, depth = stack.pop()
+            if n == ipv4_start and (depth != 96 or net):
+                continue                                # an alias of the IPv4 subtree
+            for bit in (1, 0):
+                rec = self.node(n)[bit]
+                child = net | (bit << (bits - depth - 1))
+                if rec < self.node_count:
+                    stack.append((rec, child, depth + 1))
+                elif rec > self.node_count:
+                    offset = rec - self.node_count - DATA_SEPARATOR
+                    if offset < 0 or self.data_start + offset >= self.metadata_start:
+                        raise MMDBError(f"node {n}: record points outside the data section")
+                    if bits == 128 and depth + 1 >= 96 and child >> 32 == 0:
+                        yield 4, child, depth + 1 - 96, offset
+                    else:
+                        yield (6 if bits == 128 else 4), child, depth + 1, offset
+
+
+def open_mmdb(path) -> Tuple[Reader, mmap.mmap]:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Reader(mm), mm
+
+
+def label(record) -> str:
+    """Short name of a record: its country ISO code when it has one."""
+    if isinstance(record, dict):
+        for key in ("country", "registered_country"):
+            v = record.get(key)
+            if isinstance(v, dict) and "iso_code" in v:
+                return str(v["iso_code"])
+        if "iso_code" in record:
+            return str(record["iso_code"])
+    return repr(record)[:40]
+
+
+# ----------------------------------------------------------------------
+# writer
+# ----------------------------------------------------------------------
+def encode(value) -> bytes:
+    """MMDB data-section encoding of str / int / bool / float / bytes / list / dict."""
+    if isinstance(value, bool):
+        return _ctrl(14, int(value))
+    if isinstance(value, str):
+        b = value.encode("utf-8")
+        return _ctrl(2, len(b)) + b
+    if isinstance(value, int):
+        if value < 0:
+            return _ctrl(8, 4) + value.to_bytes(4, "big", signed=True)
+        b = value.to_bytes((value.bit_length() + 7) // 8, "big")
+        kind = 6 if len(b) <= 4 else 9 if len(b) <= 8 else 10
+        return _ctrl(kind, len(b)) + b
+    if isinstance(value, float):
+        return _ctrl(3, 8) + struct.pack(">d", value)
+    if isinstance(value, bytes):
+        return _ctrl(4, len(value)) + value
+    if isinstance(value, list):
+        return _ctrl(11, len(value)) + b"".join(encode(v) for v in value)
+    if isinstance(value, dict):
+        return _ctrl(7, len(value)) + b"".join(encode(str(k)) + encode(v) for k, v in value.items())
+    raise MMDBError(f"cannot encode {type(value).__name__}")
+
+
+# readers such as libmaxminddb insist on these integer types in the metadata
+METADATA_TYPES = {"binary_format_major_version": 5, "binary_format_minor_version": 5,
+                  "build_epoch": 9, "ip_version": 5, "node_count": 6, "record_size": 5}
+
+
+def encode_metadata(meta: dict) -> bytes:
+    out = _ctrl(7, len(meta))
+    for key, value in meta.items():
+        out += encode(key)
+        if key in METADATA_TYPES:
+            b = value.to_bytes((value.bit_length() + 7) // 8, "big")
+            out += _ctrl(METADATA_TYPES[key], len(b)) + b
+        else:
+            out += encode(value)
+    return out
+
+
+def _ctrl(kind: int, size: int) -> bytes:
+    if size < 29:
+        first, extra = size, b""
+    elif size < 285:
+        first, extra = 29, (size - 29).to_bytes(1, "big")
+    elif size < 65821:
+        first, extra = 30, (size - 285).to_bytes(2, "big")
+    else:
+        first, extra = 31, (size - 65821).to_bytes(3, "big")
+    if kind <= 7:
+        return bytes((kind << 5 | first,)) + extra
+    return bytes((first, kind - 7)) + extra
+
+
+class Tree:
+    """
+    Binary trie over 128-bit addresses. Node n has children left[n] and
+    right[n]: 0 is empty, > 0 a node, < 0 the data id -(child) - 1.
+    """
+
+    def __init__(self):
+        self.left = array("q", [0])
+        self.right = array("q", [0])
+        self._v4 = None                                 # node at ::/96
+
+    def _new(self, child: int) -> int:
+        self.left.append(child)
+        self.right.append(child)
+        return len(self.left) - 1
+
+    def _descend(self, n: int, net: int, depth: int, bits: int) -> int:
+        """Node `depth` levels below n on net's path, created as needed."""
+        left, right = self.left, self.right
+        for d in range(depth):
+            side = right if net >> (bits - 1 - d) & 1 else left
+            c = side[n]
+            if c <= 0:                                  # empty or a leaf: push it down
+                c = self._new(c)
+                side[n] = c
+            n = c
+        return n
+
+    def insert(self, version: int, net: int, plen: int, data: int):
+        """Set net/plen to data id, replacing everything it covers."""
+        if version == 4:
+            if self._v4 is None:
+                self._v4 = self._descend(0, 0, 96, 128)
+            n, bits = self._v4, 32
+        else:
+            n, bits = 0, 128
+            if plen <= 96 and net == 0:
+                self._v4 = None                         # the ::/96 node may be replaced
+        if plen == 0:
+            self.left[n] = self.right[n] = -data - 1
+            return
+        n = self._descend(n, net, plen - 1, bits)
+        side = self.right if net >> (bits - plen) & 1 else self.left
+        side[n] = -data - 1
+
+    def compact(self):
+        """Collapse nodes whose children are the same leaf (or both empty)."""
+        left, right = self.left, self.right
+        stack = [(0, False)]
+        while stack:
+            n, done = stack.pop()
+            if not done:
+                stack.append((n, True))
+                for c in (left[n], right[n]):
+                    if c > 0:
+                        stack.append((c, False))
+                continue
+            for side in (left, right):
+                c = side[n]
+                if c > 0 and left[c] == right[c] and left[c] <= 0:
+                    side[n] = left[c]
+
+    def alias_ipv4(self):
+        """Point ::ffff:0:0/96 and 2002::/16 at the IPv4 subtree, as mmdbwriter does."""
+        n = 0
+        for _ in range(96):
+            v4 = self.left[n]
+            if v4 <= 0:
+                return                                  # no IPv4 data below ::/96
+            n = v4
+        for net, plen in ((0xFFFF << 32, 96), (0x2002 << 112, 16)):
+            parent = self._descend(0, net, plen - 1, 128)
+            side = self.right if net >> (128 - plen) & 1 else self.left
+            side[parent] = v4
+
+    def serialize(self, records: List[bytes], metadata: dict) -> bytes:
+        # number the reachable nodes breadth-first; aliases share numbers
+        left, right = self.left, self.right
+        number = {0: 0}
+        order = [0]
+        for n in order:
+            for c in (left[n], right[n]):
+                if c > 0 and c not in number:
+                    number[c] = len(order)
+                    order.append(c)
+        node_count = len(order)
+        data = bytearray()
+        offsets = []
+        for rec in records:
+            offsets.append(len(data))
+            data += rec
+        top = node_count + DATA_SEPARATOR + len(data)
+        record_size = 24 if top < 1 << 24 else 28 if top < 1 << 28 else 32
+        if top >= 1 << 32:
+            raise MMDBError("database too large for 32-bit records")
+
+        def value(c: int) -> int:
+            if c > 0:
+                return number[c]
+            if c == 0:
+                return node_count
+            return node_count + DATA_SEPARATOR + offsets[-c - 1]
+
+        tree = bytearray()
+        for n in order:
+            a, b = value(left[n]), value(right[n])
+            if record_size == 24:
+                tree += a.to_bytes(3, "big") + b.to_bytes(3, "big")
+            elif record_size == 28:
+                tree += ((a & 0xFFFFFF) << 32 | (a >> 24) << 28 | b).to_bytes(7, "big")
+            else:
+                tree += a.to_bytes(4, "big") + b.to_bytes(4, "big")
+        meta = dict(metadata, node_count=node_count, record_size=record_size, ip_version=6)
+        return bytes(tree) + bytes(DATA_SEPARATOR) + bytes(data) + METADATA_MARKER + encode_metadata(meta)
+
+
+def read_list(path: Path) -> List[Tuple[int, int, int]]:
+    """[(version, network, prefix length)] of a CIDR file, merged."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        v4, v6 = cidr.parse(f, {})
+    return ([(4, net, plen) for first, last in cidr.merge(v4) for net, plen in cidr.to_cidrs(first, last, 32)] +
+            [(6, net, plen) for first, last in cidr.merge(v6) for net, plen in cidr.to_cidrs(first, last, 128)])
+
+
+def load_lists(directory: Path, names: Optional[List[str]] = None,
+               jobs: Optional[int] = None) -> Dict[str, list]:
+    """list name -> prefixes, from the <name>.txt files of directory, parsed in parallel."""
+    paths = [p for p in sorted(directory.glob("*.txt")) if names is None or p.stem.lower() in names]
+    if not paths:
+        return {}
+    with ProcessPoolExecutor(min(jobs or os.cpu_count() or 1, len(paths))) as pool:
+        return {p.stem.lower(): prefixes for p, prefixes in zip(paths, pool.map(read_list, paths, chunksize=4))}
+
+
+def insert_order(spec: dict, lists: Dict[str, list]) -> List[str]:
+    wanted = [n.lower() for n in spec.get("wantedList", [])]
+    if wanted:
+        return [n for n in wanted if n in lists]
+    overwrite = [n.lower() for n in spec.get("overwriteList", [])]
+    return sorted(n for n in lists if n not in overwrite) + [n for n in overwrite if n in lists]
+
+
+def build_one(spec: dict, lists: Dict[str, list], outdir: Path) -> dict:
+    start = time.perf_counter()
+    tree = Tree()
+    names = insert_order(spec, lists)
+    for i, name in enumerate(names):
+        for version, net, plen in lists[name]:
+            tree.insert(version, net, plen, i)
+    tree.compact()
+    tree.alias_ipv4()
+    records = [encode({"country": {"iso_code": name.upper()}}) for name in names]
+    blob = tree.serialize(records, {
+        "binary_format_major_version": 2, "binary_format_minor_version": 0,
+        "build_epoch": int(time.time()), "database_type": spec.get("databaseType", "GeoLite2-Country"),
+        "description": {"en": spec.get("description", "Customized GeoLite2 Country database")},
+        "languages": [],
+    })
+    path = outdir / spec["outputName"]
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    return {"output": str(path), "lists": len(names), "size": len(blob),
+            "seconds": time.perf_counter() - start}
+
+
+_LISTS: Dict[str, list] = {}                            # set before forking workers
+
+
+def _build_worker(args):
+    spec, outdir = args
+    return build_one(spec, _LISTS, outdir)
+
+
+def build(specs: List[dict], input_dir: Path, outdir: Path, jobs: Optional[int] = None) -> List[dict]:
+    global _LISTS
+    needed = set()
+    for spec in specs:
+        if not spec.get("wantedList"):
+            needed = None
+            break
+        needed.update(n.lower() for n in spec["wantedList"])
+    _LISTS = load_lists(input_dir, None if needed is None else sorted(needed), jobs)
+    if not _LISTS:
+        raise MMDBError(f"no lists found in {input_dir}")
+    outdir.mkdir(parents=True, exist_ok=True)
+    jobs = min(jobs or os.cpu_count() or 1, len(specs))
+    if jobs <= 1:
+        return [build_one(spec, _LISTS, outdir) for spec in specs]
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(_build_worker, [(spec, outdir) for spec in specs]))
+
+
+# ----------------------------------------------------------------------
+# verifier
+# ----------------------------------------------------------------------
+def verify(path) -> dict:
+    """Check a file through mmap; raises MMDBError on the first problem."""
+    reader, mm = open_mmdb(path)
+    try:
+        meta = reader.metadata
+        for key, kind in (("binary_format_major_version", int), ("binary_format_minor_version", int),
+                          ("build_epoch", int), ("database_type", str), ("description", dict),
+                          ("languages", list)):
+            if not isinstance(meta.get(key), kind):
+                raise MMDBError(f"metadata {key} missing or not a {kind.__name__}")
+        if meta["binary_format_major_version"] != 2:
+            raise MMDBError(f"unsupported format version {meta['binary_format_major_version']}")
+        if reader.ip_version not in (4, 6):
+            raise MMDBError(f"bad ip_version {reader.ip_version}")
+        if any(mm[reader.tree_size:reader.data_start]):
+            raise MMDBError("data section separator is not 16 zero bytes")
+        data_size = reader.metadata_start - len(METADATA_MARKER) - reader.data_start
+        bits = 128 if reader.ip_version == 6 else 32
+        ipv4_start = reader.ipv4_start() if bits == 128 else None
+        stack = [(0, 0)]
+        nodes = networks = 0
+        records = set()
+        ipv4_seen = False
+        while stack:
+            n, depth = stack.pop()
+            nodes += 1
+            for rec in reader.node(n):
+                if rec < reader.node_count:
+                    if depth + 1 >= bits:
+                        raise MMDBError(f"node {n}: tree deeper than {bits} bits")
+                    if rec == ipv4_start:
+                        if ipv4_seen:
+                            continue                    # an alias of the IPv4 subtree
+                        ipv4_seen = True
+                    stack.append((rec, depth + 1))
+                elif rec > reader.node_count:
+                    offset = rec - reader.node_count - DATA_SEPARATOR
+                    if not 0 <= offset < data_size:
+                        raise MMDBError(f"node {n}: record {rec} points outside the data section")
+                    networks += 1
+                    if offset not in records:
+                        reader.record(offset)
+                        records.add(offset)
+        return {"nodes": nodes, "networks": networks, "records": len(records)}
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise MMDBError(f"corrupt data: {e}") from None
+    finally:
+        mm.close()
+
+
+def _verify_worker(path):
+    try:
+        return path, verify(path), None
+    except (MMDBError, OSError) as e:
+        return path, None, str(e)
+
+
+def show(args):
+    reader, mm = open_mmdb(args.file)
+    meta = reader.metadata
+    print(f"{meta.get('database_type')}  ip_version={reader.ip_version}  "
+          f"record_size={reader.record_size}  nodes={reader.node_count}")
+    counts: Dict[str, int] = {}
+    labels: Dict[int, str] = {}
+    for version, net, plen, offset in reader.networks():
+        if offset not in labels:
+            labels[offset] = label(reader.record(offset))
+        counts[labels[offset]] = counts.get(labels[offset], 0) + 1
+        if args.list:
+            addr = ipaddress.IPv4Address(net) if version == 4 else ipaddress.IPv6Address(net)
+            print(f"{addr}/{plen}\t{labels[offset]}")
+    for name, n in sorted(counts.items()):
+        print(f"  {name:<24} {n:>8} networks")
+    mm.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Read, build and verify MaxMind DB files.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("show", help="metadata and networks per record")
+    s.add_argument("file")
+    s.add_argument("--list", action="store_true", help="print every network")
+    b = sub.add_parser("build", help="build the databases listed in mmdb.json")
+    b.add_argument("outputs", nargs="*", metavar="OUTPUT")
+    b.add_argument("--config", type=Path, default=CONFIG)
+    b.add_argument("--input", type=Path, default=Path("output/text"), help="directory of <list>.txt files")
+    b.add_argument("--outdir", type=Path, default=Path("release"))
+    b.add_argument("-j", "--jobs", type=int, default=None)
+    v = sub.add_parser("verify", help="verify finished files")
+    v.add_argument("files", nargs="+", metavar="FILE")
+    v.add_argument("-j", "--jobs", type=int, default=None)
+    args = ap.parse_args()
+
+    try:
+        if args.command == "show":
+            show(args)
+        elif args.command == "build":
+            specs = json.loads(args.config.read_text(encoding="utf-8"))["output"]
+            if args.outputs:
+                specs = [s for s in specs if s["outputName"] in args.outputs]
+            for r in build(specs, args.input, args.outdir, args.jobs):
+                print(f"✓ {r['output']}: {r['lists']} lists, {r['size']} bytes ({r['seconds']:.1f}s)")
+        else:
+            jobs = min(args.jobs or os.cpu_count() or 1, len(args.files))
+            with ProcessPoolExecutor(jobs) as pool:
+                results = list(pool.map(_verify_worker, args.files))
+            failed = False
+            for path, stats, err in results:
+                if err:
+                    failed = True
+                    print(f"❌ {path}: {err}")
+                else:
+                    print(f"✓ {path}: {stats['nodes']} nodes, {stats['networks']} networks, "
+                          f"{stats['records']} records")
+            if failed:
+                sys.exit(1)
+    except (MMDBError, OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Rule optimizer for geosite categories: regexp rewriting and shadow removal.
+
+regexp: rules are the most expensive rules to match: the router tries them
+one after the other on every lookup, while domain, full and keyword rules
+go into indexed matchers. Many regexps in the lists are only spelled as
+regexps, e.g. `\\.pk$`, `^ads\\.example\\.com$` or `(^|\\.)example\\.(com|net)$`.
+Each regexp is parsed and expanded into its alternatives (groups, `a|b`,
+small character classes and optional parts); if every alternative is one
+of
+
+  ^NAME$                      -> full:NAME
+  (^|\\.)NAME$, ^(.*\\.)?NAME$   -> domain:NAME
+  \\.LABEL$, .*\\.LABEL$         -> domain:LABEL
+  TEXT, .*TEXT.*               -> keyword:TEXT
+
+the regexp is replaced by those rules. Anything else stays a regexp and is
+reported with the reason. domain: also matches the bare name, which
+`\\.NAME$` does not; that only makes no difference for a single label such
+as `pk` (a TLD is never a host), so `\\.example\\.com$` stays a regexp.
+
+Then rules covered by another rule with the same attributes are dropped: a
+full: or domain: rule under a domain: rule (domain:com.pk under domain:pk),
+any rule whose value contains a keyword: value, and keywords containing
+another keyword. Order and attributes of the remaining rules are kept.
+
+geosite.py runs this on the categories an output of geosite.json names in
+its "optimize".
+
+Usage:
+  python3 scripts/regexopt.py FILE...            report per list file
+  python3 scripts/regexopt.py --write OUT FILE   write the optimized list
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse         # Python 3.11+
+except ImportError:                             # pragma: no cover
+    import sre_parse
+
+from geosite import GeoSiteError, Rule, parse_file
+
+LIMIT = 64                                      # alternatives a regexp may expand to
+NAME_CHARS = re.compile(r"^[a-z0-9_.-]+$")
+LABELS = re.compile(r"^[a-z0-9_-]+(\.[a-z0-9_-]+)*$")
+
+ANY_STAR, ANY_PLUS, BEGIN, END = "*", "+", "^", "$"
+
+Token = str     # one literal character, or one of the four markers above
+
+
+class _Unsupported(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------
+# regexp analysis
+# ----------------------------------------------------------------------
+def _product(left: List[List[Token]], right: List[List[Token]]) -> List[List[Token]]:
+    if len(left) * len(right) > LIMIT:
+        raise _Unsupported("too many alternatives")
+    return [a + b for a in left for b in right]
+
+
+def _expand(items) -> List[List[Token]]:
+    alts: List[List[Token]] = [[]]
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            part = [[chr(av)]]
+        elif op is sre_parse.AT:
+            if av in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING):
+                part = [[BEGIN]]
+            elif av in (sre_parse.AT_END, sre_parse.AT_END_STRING):
+                part = [[END]]
+            else:
+                raise _Unsupported("word boundary")
+        elif op is sre_parse.IN:
+            if not all(o is sre_parse.LITERAL for o, _ in av):
+                raise _Unsupported("character class")
+            part = [[chr(c)] for _, c in av]
+        elif op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, p = av
+            if add_flags or del_flags:
+                raise _Unsupported("inline flags")
+            part = _expand(p)
+        elif op is sre_parse.BRANCH:
+            part = [alt for p in av[1] for alt in _expand(p)]
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            lo, hi, p = av
+            if list(p) == [(sre_parse.ANY, None)] and hi == sre_parse.MAXREPEAT and lo in (0, 1):
+                part = [[ANY_STAR if lo == 0 else ANY_PLUS]]
+            elif lo == 0 and hi == 1:
+                part = [[]] + _expand(p)
+            elif lo == hi and lo <= 4:
+                inner = _expand(p)
+                part = [[]]
+                for _ in range(lo):
+                    part = _product(part, inner)
+            else:
+                raise _Unsupported("repetition")
+        else:
+            raise _Unsupported(str(op).lower())
+        alts = _product(alts, part)
+        if len(alts) > LIMIT:
+            raise _Unsupported("too many alternatives")
+    return alts
+
+
+def _classify(tokens: List[Token]) -> Tuple[str, str]:
+    """(kind, value) of one alternative; raises _Unsupported."""
+    t = tokens
+    # a search is unanchored and hosts never start with ".", so these are no-ops
+    if t[:2] == [BEGIN, ANY_STAR] or (t[:2] == [BEGIN, ANY_PLUS] and t[2:3] == ["."]):
+        t = t[2:]
+    if t[:1] == [ANY_STAR] or (t[:1] == [ANY_PLUS] and t[1:2] == ["."]):
+        t = t[1:]
+    if t[-2:] == [ANY_STAR, END]:
+        t = t[:-2]
+    if t[-1:] == [ANY_STAR]:
+        t = t[:-1]
+    begin = t[:1] == [BEGIN]
+    end = t[-1:] == [END]
+    text = "".join(t[begin:len(t) - end])
+    if any(m in text for m in (BEGIN, END, ANY_STAR, ANY_PLUS)) or not text:
+        raise _Unsupported("not a literal name")
+    if not NAME_CHARS.match(text):
+        raise _Unsupported("characters that never occur in a host")
+    if begin and end:
+        if LABELS.match(text):
+            return "full", text
+        raise _Unsupported("not a host name")
+    if end:
+        if text.startswith(".") and LABELS.match(text[1:]):
+            return "suffix", text[1:]       # subdomains only; see rewrite()
+        raise _Unsupported("suffix without a label boundary")
+    if begin:
+        raise _Unsupported("prefix match")
+    return "keyword", text
+
+
+def rewrite(pattern: str) -> Tuple[Optional[List[Tuple[str, str]]], str]:
+    """Non-regexp rules equivalent to pattern, or (None, why it must stay)."""
+    try:
+        re.compile(pattern)
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & ~re.UNICODE:
+            raise _Unsupported("flags")
+        alts = _expand(parsed)
+        rules = [_classify(a) for a in alts]
+        # .NAME$ is domain:NAME only together with ^NAME$, or for a single label
+        fulls = {v for k, v in rules if k == "full"}
+        if any(k == "suffix" and "." in v and v not in fulls for k, v in rules):
+            raise _Unsupported("domain: would also match the bare name")
+        rules = [("domain" if k == "suffix" else k, v) for k, v in rules]
+    except re.error as e:
+        return None, f"invalid: {e}"
+    except _Unsupported as e:
+        return None, str(e)
+    # full:X next to the domain:X from the same regexp is covered by it
+    domains = {v for k, v in rules if k == "domain"}
+    rules = [(k, v) for k, v in rules if not (k == "full" and v in domains)]
+    return list(dict.fromkeys(rules)), ""
+
+
+# ----------------------------------------------------------------------
+# optimizing a list
+# ----------------------------------------------------------------------
+class Report:
+    def __init__(self):
+        self.rewritten: Dict[str, List[Tuple[str, str]]] = {}     # regexp -> rules
+        self.kept: Dict[str, str] = {}                            # regexp -> reason
+        self.shadowed = 0
+
+
+def _covered(rules: List[Rule]) -> List[bool]:
+    """Which rules another rule with the same attributes already matches."""
+    domains: Dict[tuple, set] = {}
+    keywords: Dict[tuple, List[str]] = {}
+    for kind, value, attrs in rules:
+        if kind == "domain":
+            domains.setdefault(attrs, set()).add(value)
+        elif kind == "keyword":
+            keywords.setdefault(attrs, []).append(value)
+    finders = {a: re.compile("|".join(re.escape(k) for k in sorted(set(ks), key=len)))
+               for a, ks in keywords.items()}
+    out = []
+    seen = set()
+    for rule in rules:
+        kind, value, attrs = rule
+        covered = rule in seen
+        seen.add(rule)
+        if not covered and kind in ("domain", "full"):
+            ds = domains.get(attrs, ())
+            covered = kind == "full" and value in ds
+            i = value.find(".")
+            while not covered and i >= 0:
+                covered = value[i + 1:] in ds
+                i = value.find(".", i + 1)
+            if not covered and attrs in finders:
+                covered = finders[attrs].search(value) is not None
+        elif not covered and kind == "keyword":
+            covered = any(k != value and k in value for k in keywords.get(attrs, ()))
+        out.append(covered)
+    return out
+
+
+def optimize(rules: List[Rule], report: Optional[Report] = None) -> List[Rule]:
+    """Rules with regexps rewritten where possible and covered rules dropped."""
+    report = report if report is not None else Report()
+    out: List[Rule] = []
+    for kind, value, attrs in rules:
+        if kind != "regexp":
+            out.append((kind, value, attrs))
+            continue
+        new, why = rewrite(value)
+        if new is None:
+            report.kept[value] = why
+            out.append((kind, value, attrs))
+        else:
+            report.rewritten[value] = new
+            out.extend((k, v, attrs) for k, v in new)
+    covered = _covered(out)
+    report.shadowed += sum(covered)
+    return [r for r, c in zip(out, covered) if not c]
+
+
+def write_list(path: Path, rules: List[Rule]):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for kind, value, attrs in rules:
+            f.write(f"{kind}:{value}{''.join(f' @{a}' for a in attrs)}\n")
+
+
+def print_report(name: str, before: int, after: int, report: Report):
+    print(f"{name}: {before} -> {after} rules, {len(report.rewritten)} regexps rewritten, "
+          f"{report.shadowed} covered rules dropped, {len(report.kept)} regexps kept")
+    for pattern, new in report.rewritten.items():
+        print(f"  ✓ regexp:{pattern} -> {', '.join(f'{k}:{v}' for k, v in new)}")
+    for pattern, why in report.kept.items():
+        print(f"  • regexp:{pattern} stays ({why})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rewrite regexp rules and drop covered rules.")
+    ap.add_argument("files", nargs="+", type=Path, metavar="FILE")
+    ap.add_argument("--write", type=Path, metavar="OUT", help="write the optimized list (one FILE)")
+    args = ap.parse_args()
+    if args.write and len(args.files) != 1:
+        ap.error("--write takes exactly one FILE")
+
+    for path in args.files:
+        try:
+            src = parse_file(path)
+        except (GeoSiteError, OSError) as e:
+            sys.exit(f"❌ {e}")
+        report = Report()
+        rules = optimize(src.rules, report)
+        print_report(str(path), len(src.rules), len(rules), report)
+        if args.write:
+            write_list(args.write, rules)
+            for inc, filters in src.includes:
+                print(f"⚠️ include:{inc} not written to {args.write}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
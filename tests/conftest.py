@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the scripts import their siblings by name, as when run as scripts/<name>.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
@@ -0,0 +1,48 @@
+import ipaddress
+
+from cidr import aggregate, merge, parse, rewrite, to_cidrs
+
+
+def test_merge_overlapping_and_adjacent():
+    assert merge([(10, 20), (0, 4), (5, 9), (15, 30), (40, 40)]) == [(0, 30), (40, 40)]
+    assert merge([]) == []
+
+
+def test_to_cidrs_is_minimal():
+    first = int(ipaddress.ip_address("10.0.0.1"))
+    last = int(ipaddress.ip_address("10.0.0.6"))
+    got = [f"{ipaddress.IPv4Address(n)}/{p}" for n, p in to_cidrs(first, last, 32)]
+    assert got == ["10.0.0.1/32", "10.0.0.2/31", "10.0.0.4/31", "10.0.0.6/32"]
+    assert list(to_cidrs(0, 2 ** 32 - 1, 32)) == [(0, 0)]
+
+
+def test_aggregate():
+    stats = {}
+    lines = [
+        "# comment",
+        "192.168.0.0/25",
+        "192.168.0.128/25",
+        "192.168.0.7",                  # inside the /24
+        "10.0.0.5/8",                   # host bits ignored
+        "1.1.1.0 - 1.1.1.255",
+        "2001:db8::/33",
+        "2001:db8:8000::/33",
+        "not an address",
+    ]
+    assert list(aggregate(lines, stats)) == [
+        "1.1.1.0/24", "10.0.0.0/8", "192.168.0.0/24", "2001:db8::/32",
+    ]
+    assert stats == {"in": 8, "invalid": 1, "out": 4}
+
+
+def test_parse_rejects_reversed_ranges():
+    stats = {}
+    assert parse(["1.1.1.9 - 1.1.1.1", "::1 - 1.1.1.1"], stats) == ([], [])
+    assert stats["invalid"] == 2
+
+
+def test_rewrite_in_place(tmp_path):
+    path = tmp_path / "list.txt"
+    path.write_text("8.8.8.8\n8.8.8.9\n8.8.8.8/32\n", encoding="utf-8")
+    assert rewrite(path) == {"in": 3, "out": 1}
+    assert path.read_text(encoding="utf-8") == "8.8.8.8/31\n"
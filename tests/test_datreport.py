@@ -0,0 +1,29 @@
+import ipaddress
+
+from datreport import _is_geoip, analyze_geoip, analyze_geosite
+from geosite import _field, encode_geosite
+
+
+def _geoip(code: str, cidrs) -> bytes:
+    body = _field(0x0A, code.encode("utf-8"))
+    for c in cidrs:
+        net = ipaddress.ip_network(c)
+        body += _field(0x12, _field(0x0A, net.network_address.packed) + b"\x10" + bytes((net.prefixlen,)))
+    return _field(0x0A, body)
+
+
+def test_kind_is_taken_from_the_first_non_empty_entry():
+    geoip = _geoip("EMPTY", []) + _geoip("IR", ["1.2.3.0/24", "2001:db8::/32"])
+    geosite = _field(0x0A, encode_geosite("EMPTY", [])) + \
+        _field(0x0A, encode_geosite("ADS", [("keyword", "ad", ()), ("full", "b.com", ())]))
+    assert _is_geoip(geoip)
+    assert not _is_geoip(geosite)
+    assert not _is_geoip(b"")
+
+
+def test_analyze():
+    geoip = analyze_geoip(_geoip("IR", ["1.2.3.0/24", "2001:db8::/32"]))
+    assert geoip["IR"]["entries"] == 2
+    geosite = analyze_geosite(_field(0x0A, encode_geosite("ADS", [("domain", "a.b.com", ())])))
+    assert geosite["ADS"]["entries"] == 1
+    assert geosite["ADS"]["dist"] == {"types": {"domain": 1}, "labels": {"3": 1}}
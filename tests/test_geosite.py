@@ -0,0 +1,34 @@
+from geosite import Builder, encode_geosite, read_dat, read_rules, write_dat
+
+RULES = [
+    ("domain", "example.com", ()),
+    ("full", "www.example.org", ("ads",)),
+    ("keyword", "tracker", ()),
+    ("regexp", r"^ad[0-9]+\.Example\.net$", ("ads", "cn")),
+]
+
+
+def test_write_dat_read_dat_round_trip(tmp_path):
+    path = tmp_path / "geosite.dat"
+    size = write_dat(path, iter([encode_geosite("ADS", RULES), encode_geosite("EMPTY", [])]))
+    buf = path.read_bytes()
+    assert size == len(buf)
+    entries = list(read_dat(buf))
+    assert [code for code, _ in entries] == ["ADS", "EMPTY"]
+    assert list(read_rules(buf, entries[0][1])) == RULES
+    assert list(read_rules(buf, entries[1][1])) == []
+
+
+def test_includes_are_flattened_with_attribute_filters(tmp_path):
+    (tmp_path / "ads").write_text("a.com\nfull:b.com @ads\nregexp:^X$\n", encoding="utf-8")
+    (tmp_path / "top").write_text("include:ads @ads\nc.com\n", encoding="utf-8")
+    lists = {"ads": tmp_path / "ads", "top": tmp_path / "top"}
+    builder = Builder()
+    blob = builder.blob("top", lists)
+    write_dat(tmp_path / "out.dat", iter([blob]))
+    buf = (tmp_path / "out.dat").read_bytes()
+    (code, span), = read_dat(buf)
+    assert code == "TOP"
+    assert list(read_rules(buf, span)) == [("domain", "c.com", ()), ("full", "b.com", ("ads",))]
+    # encoded once, however often it is asked for
+    assert builder.blob("top", lists) is blob and builder.encoded == 1
@@ -0,0 +1,109 @@
+import asyncio
+import http.server
+import io
+import threading
+
+import pytest
+
+import listfetch
+from listfetch import Cache, FetchError, fetch_many, fetch_some
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # path -> (status, body, etag); filled in by each test
+    routes = {}
+    seen = []
+
+    def do_GET(self):
+        self.seen.append((self.path, self.headers.get("If-None-Match")))
+        status, body, etag = self.routes.get(self.path, (404, b"missing\n", None))
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.routes = {}
+    Handler.seen = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return Cache(tmp_path / "cache")
+
+
+def run(urls, cache):
+    return asyncio.run(listfetch.fetch_all(urls, cache, jobs=4, log=io.StringIO()))
+
+
+def test_fetch_200(server, cache):
+    Handler.routes["/a.txt"] = (200, b"a.com\n", '"v1"')
+    paths, failed = run([server + "/a.txt"], cache)
+    assert failed == {}
+    assert paths[server + "/a.txt"].read_bytes() == b"a.com\n"
+    entry = Cache(cache.root).index[server + "/a.txt"]
+    assert entry["etag"] == '"v1"' and entry["size"] == 6
+
+
+def test_304_reuses_the_cached_blob(server, cache):
+    url = server + "/a.txt"
+    Handler.routes["/a.txt"] = (200, b"a.com\n", '"v1"')
+    first, _ = run([url], cache)
+    again, failed = run([url], Cache(cache.root))
+    assert failed == {}
+    assert again[url] == first[url]
+    assert Handler.seen == [("/a.txt", None), ("/a.txt", '"v1"')]
+
+
+def test_changed_content_replaces_the_blob(server, cache):
+    url = server + "/a.txt"
+    Handler.routes["/a.txt"] = (200, b"a.com\n", '"v1"')
+    run([url], cache)
+    Handler.routes["/a.txt"] = (200, b"b.com\n", '"v2"')
+    paths, _ = run([url], Cache(cache.root))
+    assert paths[url].read_bytes() == b"b.com\n"
+
+
+def test_failure_without_cached_copy(server, cache):
+    Handler.routes["/a.txt"] = (200, b"a.com\n", None)
+    paths, failed = run([server + "/a.txt", server + "/gone.txt"], cache)
+    assert list(paths) == [server + "/a.txt"]
+    assert list(failed) == [server + "/gone.txt"]
+    assert isinstance(failed[server + "/gone.txt"], FetchError)
+    with pytest.raises(FetchError, match="gone.txt"):
+        fetch_many([server + "/gone.txt"], cache, jobs=2)
+
+
+def test_failure_with_cached_copy(server, cache):
+    url = server + "/a.txt"
+    Handler.routes["/a.txt"] = (200, b"a.com\n", '"v1"')
+    run([url], cache)
+    Handler.routes["/a.txt"] = (500, b"oops\n", None)
+    log = io.StringIO()
+    paths, failed = asyncio.run(listfetch.fetch_all([url], Cache(cache.root), 4, log))
+    assert failed == {}
+    assert paths[url].read_bytes() == b"a.com\n"
+    assert "using cached copy" in log.getvalue()
+
+
+def test_duplicate_urls_are_fetched_once(server, cache):
+    Handler.routes["/a.txt"] = (200, b"a.com\n", None)
+    paths, failed = fetch_some([server + "/a.txt"] * 3, cache, jobs=2)
+    assert len(paths) == 1 and not failed
+    assert len(Handler.seen) == 1
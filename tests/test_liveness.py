@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import http.server
+import socket
+import struct
+import threading
+import urllib.parse
+
+import pytest
+
+import liveness
+from liveness import ALIVE, DEAD, EMPTY, ERROR, NXDOMAIN, check_all, make_resolver, verdict
+
+
+def answer(query: bytes, rcode: int, addresses: int = 0) -> bytes:
+    qid = query[:2]
+    question = query[12:]
+    out = qid + struct.pack(">HHHHH", 0x8180 | rcode, 1, addresses, 0, 0) + question
+    for _ in range(addresses):
+        out += b"\xc0\x0c" + struct.pack(">HHIH", 1, 1, 60, 4) + bytes((192, 0, 2, 1))
+    return out
+
+
+def qname(query: bytes) -> str:
+    labels, i = [], 12
+    while query[i]:
+        labels.append(query[i + 1:i + 1 + query[i]].decode("ascii"))
+        i += 1 + query[i]
+    return ".".join(labels)
+
+
+def zone(dead_here):
+    """Stub zone: names starting with "alive" resolve, "empty" have no
+    addresses, and the names in dead_here do not exist."""
+    def respond(query: bytes) -> bytes:
+        name = qname(query)
+        if name in dead_here:
+            return answer(query, NXDOMAIN)
+        if name.startswith("alive"):
+            return answer(query, 0, 1)
+        return answer(query, 0)
+    return respond
+
+
+@pytest.fixture
+def udp_stub():
+    servers = []
+
+    def start(respond):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(0.1)
+        stop = threading.Event()
+
+        def serve():
+            while not stop.is_set():
+                try:
+                    data, addr = sock.recvfrom(512)
+                except socket.timeout:
+                    continue
+                sock.sendto(respond(data), addr)
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        servers.append((sock, stop, thread))
+        return f"udp://127.0.0.1:{sock.getsockname()[1]}"
+
+    yield start
+    for sock, stop, thread in servers:
+        stop.set()
+        thread.join()
+        sock.close()
+
+
+@pytest.fixture
+def doh_stub():
+    servers = []
+
+    def start(respond):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                dns = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)["dns"][0]
+                body = respond(base64.urlsafe_b64decode(dns + "=" * (-len(dns) % 4)))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/dns-message")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_address[1]}/dns-query"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def run(domains, specs):
+    resolvers = [make_resolver(s, rate=0, retries=1, timeout=2, workers=4) for s in specs]
+    results = asyncio.run(check_all(domains, resolvers, concurrency=8, log=None))
+    names = [r.name for r in resolvers]
+    return {d: verdict(s, names) for d, s in results.items()}, results
+
+
+def test_dead_only_when_every_resolver_says_nxdomain(udp_stub, doh_stub):
+    domains = ["gone.example", "half.example", "alive.example", "empty.example"]
+    udp = udp_stub(zone({"gone.example", "half.example"}))
+    doh = doh_stub(zone({"gone.example"}))
+    verdicts, results = run(domains, [udp, doh])
+    assert verdicts == {"gone.example": DEAD, "half.example": EMPTY,
+                        "alive.example": ALIVE, "empty.example": EMPTY}
+    assert list(results["gone.example"].values()) == [DEAD, DEAD]
+
+
+def test_unanswered_resolver_gives_error(udp_stub, monkeypatch):
+    monkeypatch.setattr(liveness, "BACKOFF", 0)
+    udp = udp_stub(lambda q: answer(q, 2))          # SERVFAIL, retried then given up
+    verdicts, _ = run(["x.example"], [udp])
+    assert verdicts == {"x.example": ERROR}
+
+
+def test_verdict():
+    assert verdict({"a": DEAD, "b": DEAD}, ["a", "b"]) == DEAD
+    assert verdict({"a": DEAD}, ["a", "b"]) == ERROR
+    assert verdict({"a": DEAD, "b": EMPTY}, ["a", "b"]) == EMPTY
+    assert verdict({"a": ERROR, "b": ALIVE}, ["a", "b"]) == ALIVE
+
+
+def test_interval_doubles_up_to_the_ceiling():
+    for status in (ALIVE, DEAD):
+        first = liveness.interval("a.example", status, 1)
+        assert liveness.TTL[status] * 0.75 <= first <= liveness.TTL[status] * 1.25
+        assert liveness.interval("a.example", status, 2) == pytest.approx(first * 2)
+        capped = liveness.interval("a.example", status, 40)
+        assert capped == pytest.approx(first / liveness.TTL[status] * liveness.MAX_TTL[status])
+
+
+def test_store_reschedules_by_verdict():
+    store = liveness.Store(":memory:")
+    day = liveness.DAY
+    now = 1_000_000.0
+    store.record({"a.example": {"r": DEAD}, "b.example": {"r": ALIVE}}, ["r"], now)
+    status, since, checked, streak, due = store.get(["a.example"])["a.example"]
+    assert (status, since, streak) == (DEAD, now, 1)
+    assert due == now + liveness.interval("a.example", DEAD, 1)
+
+    # nothing is due until the TTL runs out; new names always are
+    assert store.due(["a.example", "b.example", "c.example"], now + day / 2) == ["c.example"]
+    later = now + 2 * day
+    assert store.due(["a.example", "b.example"], later) == ["a.example"]
+
+    # a confirming check extends the TTL, a changed verdict resets it
+    store.record({"a.example": {"r": DEAD}}, ["r"], later)
+    status, since, _, streak, due = store.get(["a.example"])["a.example"]
+    assert (status, since, streak) == (DEAD, now, 2)
+    assert due == later + liveness.interval("a.example", DEAD, 2)
+    store.record({"a.example": {"r": EMPTY}}, ["r"], later + day)
+    assert store.get(["a.example"])["a.example"][:4] == (EMPTY, later + day, later + day, 1)
+
+    assert store.dead(["a.example", "b.example"]) == []
+    assert store.db.execute("SELECT COUNT(*) FROM history").fetchone()[0] == 4
+    store.close()
+
+
+def test_due_budget_takes_new_then_most_overdue():
+    store = liveness.Store(":memory:")
+    store.record({"old.example": {"r": ERROR}}, ["r"], 0.0)
+    store.record({"older.example": {"r": ERROR}}, ["r"], -liveness.DAY)
+    names = ["old.example", "older.example", "new.example"]
+    assert store.due(names, 10 * liveness.DAY) == ["new.example", "older.example", "old.example"]
+    assert store.due(names, 10 * liveness.DAY, budget=2) == ["new.example", "older.example"]
+    store.close()
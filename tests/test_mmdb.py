@@ -0,0 +1,68 @@
+import ipaddress
+
+import pytest
+
+import mmdb
+from mmdb import MMDBError, build, open_mmdb, verify
+
+
+def networks(path):
+    reader, mm = open_mmdb(path)
+    try:
+        out = {}
+        for version, net, plen, offset in reader.networks():
+            cls = ipaddress.IPv4Network if version == 4 else ipaddress.IPv6Network
+            out[str(cls((net, plen)))] = mmdb.label(reader.record(offset))
+        return out
+    finally:
+        mm.close()
+
+
+@pytest.fixture
+def lists(tmp_path):
+    d = tmp_path / "text"
+    d.mkdir()
+    (d / "ir.txt").write_text("5.0.0.0/8\n2001:db8::/32\n", encoding="utf-8")
+    (d / "cloudflare.txt").write_text("5.1.0.0/16\n", encoding="utf-8")
+    (d / "private.txt").write_text("10.0.0.0/8\n192.168.0.0/16\n", encoding="utf-8")
+    return d
+
+
+def test_build_then_verify(tmp_path, lists):
+    specs = [
+        {"outputName": "Country.mmdb", "overwriteList": ["cloudflare"]},
+        {"outputName": "Private.mmdb", "wantedList": ["private"]},
+    ]
+    results = build(specs, lists, tmp_path / "out", jobs=2)
+    assert [r["lists"] for r in results] == [3, 1]
+
+    country = tmp_path / "out" / "Country.mmdb"
+    stats = verify(country)
+    assert stats["records"] == 3
+    got = networks(country)
+    # cloudflare is inserted last, so it replaces that part of IR
+    assert got["5.1.0.0/16"] == "CLOUDFLARE"
+    assert got["5.0.0.0/16"] == "IR" and got["5.128.0.0/9"] == "IR"
+    assert got["2001:db8::/32"] == "IR"
+
+    private = tmp_path / "out" / "Private.mmdb"
+    verify(private)
+    assert networks(private) == {"10.0.0.0/8": "PRIVATE", "192.168.0.0/16": "PRIVATE"}
+
+
+def test_verify_rejects_a_broken_file(tmp_path, lists):
+    build([{"outputName": "Country.mmdb"}], lists, tmp_path, jobs=1)
+    path = tmp_path / "Country.mmdb"
+    buf = bytearray(path.read_bytes())
+    reader, mm = open_mmdb(path)
+    separator = reader.tree_size
+    mm.close()
+    buf[separator] = 1
+    path.write_bytes(bytes(buf))
+    with pytest.raises(MMDBError, match="separator"):
+        verify(path)
+
+
+def test_build_without_lists(tmp_path):
+    with pytest.raises(MMDBError, match="no lists"):
+        build([{"outputName": "Country.mmdb"}], tmp_path, tmp_path / "out")
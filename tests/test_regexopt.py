@@ -0,0 +1,64 @@
+import pytest
+
+from regexopt import Report, _covered, optimize, rewrite
+
+
+@pytest.mark.parametrize("pattern, rules", [
+    (r"^ads\.example\.com$", [("full", "ads.example.com")]),
+    (r"(^|\.)example\.(com|net)$", [("domain", "example.com"), ("domain", "example.net")]),
+    (r"^(.*\.)?example\.com$", [("domain", "example.com")]),
+    (r"\.pk$", [("domain", "pk")]),
+    (r".*\.pk$", [("domain", "pk")]),
+    (r"tracker", [("keyword", "tracker")]),
+    (r".*doubleclick.*", [("keyword", "doubleclick")]),
+    (r"^ad[12]\.x\.com$", [("full", "ad1.x.com"), ("full", "ad2.x.com")]),
+    (r"^a\.b$|\.a\.b$", [("domain", "a.b")]),
+])
+def test_rewrite(pattern, rules):
+    assert rewrite(pattern) == (rules, "")
+
+
+@pytest.mark.parametrize("pattern, why", [
+    (r"\.example\.com$", "bare name"),          # domain: would also match example.com
+    (r"^ads\.", "prefix"),
+    (r"^ad[0-9]+\.example\.com$", "repetition"),
+    (r"example\.com$", "label boundary"),
+    (r"(?i)example", "flags"),
+    (r"^a b$", "never occur"),
+    (r"(", "invalid"),
+])
+def test_rewrite_keeps(pattern, why):
+    rules, reason = rewrite(pattern)
+    assert rules is None
+    assert why in reason
+
+
+def test_covered():
+    rules = [
+        ("domain", "pk", ()),
+        ("domain", "com.pk", ()),           # under domain:pk
+        ("full", "a.com.pk", ()),
+        ("domain", "pk", ()),               # duplicate
+        ("domain", "pk.example", ()),       # not under pk
+        ("full", "x.org", ("ads",)),        # other attributes than the domain below
+        ("domain", "x.org", ()),
+        ("keyword", "track", ()),
+        ("keyword", "tracker", ()),         # contains another keyword
+        ("full", "tracking.io", ()),        # contains a keyword
+        ("domain", "ad.x", ("ads",)),       # keyword only covers without attributes
+    ]
+    assert _covered(rules) == [False, True, True, True, False, False, False,
+                               False, True, True, False]
+
+
+def test_optimize_reports():
+    report = Report()
+    rules = [
+        ("regexp", r"\.pk$", ("cc",)),
+        ("domain", "gov.pk", ("cc",)),
+        ("regexp", r"^ad[0-9]+\.x$", ()),
+    ]
+    assert optimize(rules, report) == [("domain", "pk", ("cc",)), ("regexp", r"^ad[0-9]+\.x$", ())]
+    assert report.rewritten == {r"\.pk$": [("domain", "pk")]}
+    assert list(report.kept) == [r"^ad[0-9]+\.x$"]
+    assert report.shadowed == 1
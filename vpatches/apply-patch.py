@@ -7,22 +7,18 @@ Works with the current upstream code (April 2026).
 
 import re
 import sys
-import shutil
-from datetime import datetime
 from pathlib import Path
 
+from patchengine import Document, PatchError, PatchSet, run
 
-def create_backup(filepath: Path) -> Path:
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup = filepath.with_suffix(f".kts.bak.{timestamp}")
-    shutil.copy2(filepath, backup)
-    print(f"Backup: {backup}")
-    return backup
+PATCHES = PatchSet("apply-patch")
+TARGET = "app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt"
 
 
-def patch_file(filepath: Path) -> bool:
-    print(f"Patching: {filepath}")
-    content = filepath.read_text(encoding="utf-8")
+@PATCHES.patch("subscription-chain", TARGET, required=True)
+def patch_file(doc: Document):
+    doc.log(f"Patching: {doc.path}")
+    content = doc.text
 
     # ------------------------------------------------------------------
     # 1. Replace injectCustomOutbounds with chain-enabled version
@@ -32,10 +28,9 @@ def patch_file(filepath: Path) -> bool:
         r'(.*?)\n\1\}',
         re.DOTALL
     )
-    match = old_func_pattern.search(content)
+    match = doc.search(old_func_pattern)
     if not match:
-        print("  ✗ Could not find injectCustomOutbounds function")
-        return False
+        raise PatchError("Could not find injectCustomOutbounds function")
 
     indent = match.group(1)
     new_func = f'''{indent}private fun injectCustomOutbounds(v2rayConfig: V2rayConfig, outboundTagMap: MutableMap<String, String> = mutableMapOf()) {{
@@ -79,16 +74,16 @@ def patch_file(filepath: Path) -> bool:
 {indent}}}'''
 
     content = content[:match.start()] + new_func + content[match.end():]
-    print("  ✓ Replaced injectCustomOutbounds with chain-enabled version")
+    doc.log("  ✓ Replaced injectCustomOutbounds with chain-enabled version")
 
     # ------------------------------------------------------------------
     # 2. Insert applySubscriptionChain before getRouting
     # ------------------------------------------------------------------
     routing_pattern = re.compile(r'(\n\s*private fun getRouting\([^)]*\):)')
-    match = re.search(routing_pattern, content)
+    doc.text = content
+    match = doc.search(routing_pattern)
     if not match:
-        print("  ✗ Could not find getRouting function")
-        return False
+        raise PatchError("Could not find getRouting function")
 
     new_function = '''
     /**
@@ -169,7 +164,7 @@ def patch_file(filepath: Path) -> bool:
     }
 '''
     content = content[:match.start()] + new_function + "\n" + content[match.start():]
-    print("  ✓ Inserted applySubscriptionChain function")
+    doc.log("  ✓ Inserted applySubscriptionChain function")
 
     # ------------------------------------------------------------------
     # 3. Modify getRouting to create outboundTagMap and pass it
@@ -179,29 +174,26 @@ def patch_file(filepath: Path) -> bool:
             injectCustomOutbounds(v2rayConfig, outboundTagMap)'''
     if old_call in content:
         content = content.replace(old_call, new_call)
-        print("  ✓ Updated getRouting call")
+        doc.log("  ✓ Updated getRouting call")
     else:
-        print("  ✗ Could not find injectCustomOutbounds call in getRouting")
-        return False
+        raise PatchError("Could not find injectCustomOutbounds call in getRouting")
 
-    filepath.write_text(content, encoding="utf-8")
-    print("  ✅ Patch applied successfully.")
-    return True
+    doc.text = content
+    doc.log("  ✅ Patch applied successfully.")
 
 
 def main():
-    if len(sys.argv) < 2:
-        target = Path("V2rayNG/app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt")
-    else:
-        target = Path(sys.argv[1])
-    if not target.exists():
-        print(f"File not found: {target}")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    paths = {TARGET: Path(args[0])} if args else None
+    try:
+        results = run(PATCHES, paths=paths)
+    except PatchError as e:
+        print(e)
         sys.exit(1)
-    create_backup(target)
-    if patch_file(target):
+    if not results[0].failed:
         print("\n👉 Rebuild the app and test subscription chaining for custom outbounds.")
     else:
-        print("\n❌ Patching failed. Restore from backup.")
+        print("\n❌ Patching failed. File left unchanged.")
 
 
 if __name__ == "__main__":
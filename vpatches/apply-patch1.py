@@ -1,61 +1,39 @@
 #!/usr/bin/env python3
 """
 Converts prev/next profile EditText fields to spinners with [Current Server] option.
-No backups for resource files (to avoid build breakage).
+Originals are kept in the checkout's backup store (see backupstore.py).
 """
 
 import re
 import sys
-import shutil
-from pathlib import Path
-from datetime import datetime
 
-def backup_kotlin(filepath: Path):
-    """Only backup Kotlin files, skip resources."""
-    if filepath.suffix == ".kt":
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        bak = filepath.with_suffix(f".kt.bak.{ts}")
-        shutil.copy2(filepath, bak)
-        print(f"  ✓ backup: {bak.name}")
+from patchengine import Document, PatchError, PatchSet, run
+from xmlres import add_resources, replace_element
 
-def patch_app_config(filepath: Path):
-    content = filepath.read_text(encoding="utf-8")
+PATCHES = PatchSet("apply-patch1")
+
+@PATCHES.patch("appconfig-current-server", "app/src/main/java/com/v2ray/ang/AppConfig.kt", required=True)
+def patch_app_config(doc: Document):
+    content = doc.text
     if "CURRENT_SERVER" in content and '"__CURRENT_SERVER__"' in content:
-        print("  • AppConfig already has CURRENT_SERVER")
+        doc.log("  • AppConfig already has CURRENT_SERVER")
         return
     pattern = re.compile(r'(const val TAG_PROXY\s*=\s*".*?")')
-    if not pattern.search(content):
+    if not doc.search(pattern):
         pattern = re.compile(r'(object AppConfig\s*\{)')
-    match = pattern.search(content)
+    match = doc.search(pattern)
     if not match:
-        raise Exception("Could not find insertion point in AppConfig.kt")
+        raise PatchError("Could not find insertion point in AppConfig.kt")
     insert_after = match.end()
     new_line = '\n    const val CURRENT_SERVER = "__CURRENT_SERVER__"'
     content = content[:insert_after] + new_line + content[insert_after:]
-    filepath.write_text(content, encoding="utf-8")
-    print("  ✓ Added CURRENT_SERVER constant to AppConfig")
-
-def patch_sub_edit_xml(filepath: Path):
-    content = filepath.read_text(encoding="utf-8")
-    old_pre = '''            <LinearLayout
-                android:layout_width="match_parent"
-                android:layout_height="wrap_content"
-                android:layout_marginTop="@dimen/padding_spacing_dp16"
-                android:orientation="vertical">
-
-                <TextView
-                    android:layout_width="wrap_content"
-                    android:layout_height="wrap_content"
-                    android:text="@string/sub_setting_pre_profile" />
-
-                <EditText
-                    android:id="@+id/et_pre_profile"
-                    android:layout_width="match_parent"
-                    android:layout_height="wrap_content"
-                    android:hint="@string/sub_setting_pre_profile_tip"
-                    android:inputType="text" />
+    doc.text = content
+    doc.log("  ✓ Added CURRENT_SERVER constant to AppConfig")
 
-            </LinearLayout>'''
+@PATCHES.patch("sub-edit-layout-spinners", "app/src/main/res/layout/activity_sub_edit.xml", required=True)
+def patch_sub_edit_xml(doc: Document):
+    # the LinearLayout wrapping each EditText (found by android:id) is
+    # replaced whole, however its attributes are ordered or formatted
     new_pre = '''            <LinearLayout
                 android:layout_width="match_parent"
                 android:layout_height="wrap_content"
@@ -73,31 +51,13 @@ def patch_sub_edit_xml(filepath: Path):
                     android:layout_height="wrap_content" />
 
             </LinearLayout>'''
-    if old_pre in content:
-        content = content.replace(old_pre, new_pre)
-        print("  ✓ Replaced et_pre_profile with spinner")
+    el = doc.xml.by_id("et_pre_profile", "LinearLayout")
+    if el is not None:
+        replace_element(doc, el, new_pre)
+        doc.log("  ✓ Replaced et_pre_profile with spinner")
     else:
-        print("  ✗ Could not find pre profile EditText block")
-
-    old_next = '''            <LinearLayout
-                android:layout_width="match_parent"
-                android:layout_height="wrap_content"
-                android:layout_marginTop="@dimen/padding_spacing_dp16"
-                android:orientation="vertical">
-
-                <TextView
-                    android:layout_width="wrap_content"
-                    android:layout_height="wrap_content"
-                    android:text="@string/sub_setting_next_profile" />
-
-                <EditText
-                    android:id="@+id/et_next_profile"
-                    android:layout_width="match_parent"
-                    android:layout_height="wrap_content"
-                    android:hint="@string/sub_setting_pre_profile_tip"
-                    android:inputType="text" />
+        doc.log("  ✗ Could not find pre profile EditText block")
 
-            </LinearLayout>'''
     new_next = '''            <LinearLayout
                 android:layout_width="match_parent"
                 android:layout_height="wrap_content"
@@ -115,16 +75,17 @@ def patch_sub_edit_xml(filepath: Path):
                     android:layout_height="wrap_content" />
 
             </LinearLayout>'''
-    if old_next in content:
-        content = content.replace(old_next, new_next)
-        print("  ✓ Replaced et_next_profile with spinner")
+    el = doc.xml.by_id("et_next_profile", "LinearLayout")
+    if el is not None:
+        replace_element(doc, el, new_next)
+        doc.log("  ✓ Replaced et_next_profile with spinner")
     else:
-        print("  ✗ Could not find next profile EditText block")
+        doc.log("  ✗ Could not find next profile EditText block")
 
-    filepath.write_text(content, encoding="utf-8")
 
-def patch_sub_edit_activity(filepath: Path):
-    content = filepath.read_text(encoding="utf-8")
+@PATCHES.patch("sub-edit-activity-spinners", "app/src/main/java/com/v2ray/ang/ui/SubEditActivity.kt", required=True)
+def patch_sub_edit_activity(doc: Document):
+    content = doc.text
     if "import android.widget.AdapterView" not in content:
         content = content.replace(
             "import android.view.MenuItem",
@@ -132,7 +93,7 @@ def patch_sub_edit_activity(filepath: Path):
         )
     insert_pos = content.find("class SubEditActivity : BaseActivity() {")
     if insert_pos == -1:
-        raise Exception("Could not find class declaration in SubEditActivity")
+        raise PatchError("Could not find class declaration in SubEditActivity")
     insert_pos = content.index('\n', insert_pos) + 1
     extra_vars = '''
     private val allProfiles: List<Pair<String, String>> by lazy {
@@ -173,7 +134,7 @@ def patch_sub_edit_activity(filepath: Path):
     if old_binding in content:
         content = content.replace(old_binding, new_binding)
     else:
-        print("  ✗ Could not replace bindingServer")
+        doc.log("  ✗ Could not replace bindingServer")
         return
 
     old_clear = '''        binding.etPreProfile.text = null
@@ -183,7 +144,7 @@ def patch_sub_edit_activity(filepath: Path):
     if old_clear in content:
         content = content.replace(old_clear, new_clear)
     else:
-        print("  ✗ Could not replace clearServer")
+        doc.log("  ✗ Could not replace clearServer")
 
     old_save = '''        subItem.prevProfile = binding.etPreProfile.text.toString()
         subItem.nextProfile = binding.etNextProfile.text.toString()'''
@@ -194,13 +155,14 @@ def patch_sub_edit_activity(filepath: Path):
     if old_save in content:
         content = content.replace(old_save, new_save)
     else:
-        print("  ✗ Could not replace saveServer")
+        doc.log("  ✗ Could not replace saveServer")
 
-    filepath.write_text(content, encoding="utf-8")
-    print("  ✓ Updated SubEditActivity for spinners")
+    doc.text = content
+    doc.log("  ✓ Updated SubEditActivity for spinners")
 
-def patch_v2ray_config_manager(filepath: Path):
-    content = filepath.read_text(encoding="utf-8")
+@PATCHES.patch("v2rayconfigmanager-current-server", "app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt", required=True)
+def patch_v2ray_config_manager(doc: Document):
+    content = doc.text
     resolve_func = '''
     private fun resolveCurrentServer(remark: String?): String? {
         if (remark == AppConfig.CURRENT_SERVER) {
@@ -212,9 +174,9 @@ def patch_v2ray_config_manager(filepath: Path):
     }
 '''
     pattern = r'(\n\s*private fun getMoreOutbounds\()'
-    match = re.search(pattern, content)
+    match = doc.search(pattern)
     if not match:
-        print("  ✗ Could not find getMoreOutbounds")
+        doc.log("  ✗ Could not find getMoreOutbounds")
         return
     content = content[:match.start()] + resolve_func + content[match.start():]
 
@@ -223,80 +185,56 @@ def patch_v2ray_config_manager(filepath: Path):
     if old_prev in content:
         content = content.replace(old_prev, new_prev)
     else:
-        print("  ✗ Could not update prevNode line")
+        doc.log("  ✗ Could not update prevNode line")
     old_next = "val nextNode = SettingsManager.getServerViaRemarks(subItem.nextProfile)"
     new_next = "val nextNode = SettingsManager.getServerViaRemarks(resolveCurrentServer(subItem.nextProfile) ?: subItem.nextProfile)"
     if old_next in content:
         content = content.replace(old_next, new_next)
     else:
-        print("  ✗ Could not update nextNode line")
+        doc.log("  ✗ Could not update nextNode line")
 
     if "private fun applySubscriptionChain" in content:
         old_chain_get = "val chainProfile = SettingsManager.getServerViaRemarks(targetRemark) ?: return"
         new_chain_get = "val chainProfile = SettingsManager.getServerViaRemarks(resolveCurrentServer(targetRemark) ?: targetRemark) ?: return"
         if old_chain_get in content:
             content = content.replace(old_chain_get, new_chain_get)
-            print("  ✓ Updated applySubscriptionChain to resolve CURRENT_SERVER")
+            doc.log("  ✓ Updated applySubscriptionChain to resolve CURRENT_SERVER")
         else:
-            print("  ⚠ applySubscriptionChain not found or already patched differently")
+            doc.log("  ⚠ applySubscriptionChain not found or already patched differently")
     else:
-        print("  ⚠ applySubscriptionChain not present (maybe not patched yet)")
+        doc.log("  ⚠ applySubscriptionChain not present (maybe not patched yet)")
 
-    filepath.write_text(content, encoding="utf-8")
-    print("  ✓ Updated V2rayConfigManager for CURRENT_SERVER resolution")
+    doc.text = content
+    doc.log("  ✓ Updated V2rayConfigManager for CURRENT_SERVER resolution")
 
-def patch_strings_xml(filepath: Path):
-    content = filepath.read_text(encoding="utf-8")
+@PATCHES.patch("strings-spinner-items", "app/src/main/res/values/strings.xml", required=True)
+def patch_strings_xml(doc: Document):
     needed = {
         "sub_setting_none": "None",
         "sub_setting_current_server": "[Current Server]",
     }
-    changed = False
-    for k, v in needed.items():
-        if f'name="{k}"' in content:
-            continue
-        m = re.search(r'(\s*)</resources>', content, re.IGNORECASE)
-        if not m:
-            print(f"  ✗ Could not find </resources>")
-            return
-        indent = m.group(1)
-        pos = m.start()
-        content = content[:pos] + f'\n{indent}<string name="{k}">{v}</string>' + content[pos:]
-        changed = True
-    if changed:
-        filepath.write_text(content, encoding="utf-8")
-        print("  ✓ Added strings for spinner items")
+    try:
+        added = add_resources(doc, needed)
+    except ValueError:
+        doc.log(f"  ✗ Could not find </resources>")
+        return
+    if added:
+        doc.log("  ✓ Added strings for spinner items")
     else:
-        print("  • Strings already present")
+        doc.log("  • Strings already present")
 
 def main():
-    base = Path("V2rayNG")
-    files = {
-        "AppConfig.kt": base / "app/src/main/java/com/v2ray/ang/AppConfig.kt",
-        "activity_sub_edit.xml": base / "app/src/main/res/layout/activity_sub_edit.xml",
-        "SubEditActivity.kt": base / "app/src/main/java/com/v2ray/ang/ui/SubEditActivity.kt",
-        "V2rayConfigManager.kt": base / "app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt",
-        "strings.xml": base / "app/src/main/res/values/strings.xml",
-    }
-    for name, path in files.items():
-        if not path.exists():
-            print(f"File not found: {path}")
-            sys.exit(1)
-        # Only backup Kotlin files
-        if path.suffix == ".kt":
-            backup_kotlin(path)
-
     try:
-        patch_app_config(files["AppConfig.kt"])
-        patch_sub_edit_xml(files["activity_sub_edit.xml"])
-        patch_sub_edit_activity(files["SubEditActivity.kt"])
-        patch_v2ray_config_manager(files["V2rayConfigManager.kt"])
-        patch_strings_xml(files["strings.xml"])
-        print("\n✅ All patches applied successfully.")
-        print("👉 Rebuild the app and enjoy auto‑tracking front/landing proxy.")
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
+        results = run(PATCHES)
+    except PatchError as e:
+        print(e)
+        sys.exit(1)
+    failed = [pid for r in results for pid in r.failed]
+    if failed:
+        print(f"\n❌ Error: {', '.join(failed)} failed")
         sys.exit(1)
+    print("\n✅ All patches applied successfully.")
+    print("👉 Rebuild the app and enjoy auto‑tracking front/landing proxy.")
 
 if __name__ == "__main__":
     main()
@@ -2,10 +2,11 @@
 """Robust fix: replace resolveCurrentServer body using regex."""
 
 import re
-from pathlib import Path
 
-target = Path("V2rayNG/app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt")
-content = target.read_text(encoding="utf-8")
+from patchengine import Document, PatchError, PatchSet, run
+
+PATCHES = PatchSet("apply-patch2")
+TARGET = "app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt"
 
 # Pattern to match the entire function, capturing indentation
 pattern = re.compile(
@@ -29,13 +30,19 @@ def new_body(indent):
         f'{indent}}}'
     )
 
-match = pattern.search(content)
-if match:
+@PATCHES.patch("resolve-current-server-selected", TARGET)
+def patch_resolve_current_server(doc: Document):
+    content = doc.text
+    match = doc.search(pattern)
+    if not match:
+        # Fallback: if not found, maybe not added yet? Let user know.
+        raise PatchError(
+            "Could not find resolveCurrentServer function. It may not exist yet.\n"
+            "   Run the spinner patcher first (schedule.py apply-patch2 does)."
+        )
     indent = match.group('indent')
-    content = content[:match.start()] + new_body(indent) + content[match.end():]
-    target.write_text(content, encoding="utf-8")
-    print("✅ resolveCurrentServer replaced successfully.")
-else:
-    # Fallback: if not found, maybe not added yet? Let user know.
-    print("⚠️ Could not find resolveCurrentServer function. It may not exist yet.")
-    print("   Try running the spinner patcher first, then this fix.")
+    doc.text = content[:match.start()] + new_body(indent) + content[match.end():]
+    doc.log("✅ resolveCurrentServer replaced successfully.")
+
+if __name__ == "__main__":
+    run(PATCHES)
@@ -4,17 +4,21 @@ Unified patcher: makes both getMoreOutbounds and applySubscriptionChain
 reuse the existing 'proxy' outbound when the front/landing proxy resolves
 to the currently active server.
 
-Run this AFTER the spinner patch and resolveCurrentServer fix.
+Run this AFTER the spinner patch and resolveCurrentServer fix;
+`python3 vpatches/schedule.py apply-patch3` does that ordering for you
+(see manifest.json).
 """
 
 import re
-from pathlib import Path
 
-TARGET = Path("V2rayNG/app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt")
+from patchengine import Document, PatchError, PatchSet, run
 
-def apply():
-    content = TARGET.read_text(encoding="utf-8")
-    original = content
+PATCHES = PatchSet("apply-patch3")
+TARGET = "app/src/main/java/com/v2ray/ang/handler/V2rayConfigManager.kt"
+
+@PATCHES.patch("reuse-main-proxy-outbound", TARGET)
+def apply(doc: Document):
+    content = doc.text
 
     # ── 1. getMoreOutbounds signature ─────────────────────────────────
     content = content.replace(
@@ -28,8 +32,8 @@ def apply():
         content = content.replace(old, new)
 
     # ── 3. Previous proxy block ──────────────────────────────────────
+    # Matched as tokens: indentation, comments and line breaks may differ.
     old_prev = (
-        "            //Previous proxy\n"
         "            val prevNode = SettingsManager.getServerViaRemarks(resolveCurrentServer(subItem.prevProfile) ?: subItem.prevProfile)\n"
         "            if (prevNode != null) {\n"
         "                val prevOutbound = convertProfile2Outbound(prevNode)\n"
@@ -42,7 +46,6 @@ def apply():
         "            }"
     )
     new_prev = (
-        "            //Previous proxy\n"
         "            val prevNode = SettingsManager.getServerViaRemarks(resolveCurrentServer(subItem.prevProfile) ?: subItem.prevProfile)\n"
         "            if (prevNode != null) {\n"
         "                if (prevNode.remarks == mainProfileRemarks) {\n"
@@ -60,16 +63,17 @@ def apply():
         "                }\n"
         "            }"
     )
-    if old_prev in content:
-        content = content.replace(old_prev, new_prev)
-        print("✓ Patched prev proxy block")
+    doc.text = content
+    m = doc.find(old_prev, min_confidence=1.0)
+    if m is not None:
+        doc.replace_span(m.start, m.end, new_prev)
+        content = doc.text
+        doc.log("✓ Patched prev proxy block")
     else:
-        print("✗ Could not find prev proxy block – ensure spinner patch is applied first")
-        return False
+        raise PatchError("Could not find prev proxy block – ensure spinner patch is applied first")
 
     # ── 4. Next proxy block ──────────────────────────────────────────
     old_next = (
-        "            //Next proxy\n"
         "            val nextNode = SettingsManager.getServerViaRemarks(resolveCurrentServer(subItem.nextProfile) ?: subItem.nextProfile)\n"
         "            if (nextNode != null) {\n"
         "                val nextOutbound = convertProfile2Outbound(nextNode)\n"
@@ -83,7 +87,6 @@ def apply():
         "            }"
     )
     new_next = (
-        "            //Next proxy\n"
         "            val nextNode = SettingsManager.getServerViaRemarks(resolveCurrentServer(subItem.nextProfile) ?: subItem.nextProfile)\n"
         "            if (nextNode != null) {\n"
         "                if (nextNode.remarks == mainProfileRemarks) {\n"
@@ -101,12 +104,14 @@ def apply():
         "                }\n"
         "            }"
     )
-    if old_next in content:
-        content = content.replace(old_next, new_next)
-        print("✓ Patched next proxy block")
+    doc.text = content
+    m = doc.find(old_next, min_confidence=1.0)
+    if m is not None:
+        doc.replace_span(m.start, m.end, new_next)
+        content = doc.text
+        doc.log("✓ Patched next proxy block")
     else:
-        print("✗ Could not find next proxy block – ensure spinner patch is applied first")
-        return False
+        raise PatchError("Could not find next proxy block – ensure spinner patch is applied first")
 
     # ── 5. applySubscriptionChain (if present) ───────────────────────
     if "private fun applySubscriptionChain" in content:
@@ -114,7 +119,7 @@ def apply():
         pattern = re.compile(
             r'(?P<indent>[ \t]*)val chainProfile = SettingsManager\.getServerViaRemarks\(.*?\n'
         )
-        match = re.search(pattern, content)
+        match = doc.search(pattern)
         if match:
             line_indent = match.group('indent')
             insertion = (
@@ -128,19 +133,18 @@ def apply():
             )
             insert_pos = match.end()
             content = content[:insert_pos] + insertion + content[insert_pos:]
-            print("✓ Inserted reuse check into applySubscriptionChain")
+            doc.log("✓ Inserted reuse check into applySubscriptionChain")
         else:
-            print("⚠ applySubscriptionChain found but 'chainProfile' line not located – skipping")
+            doc.log("⚠ applySubscriptionChain found but 'chainProfile' line not located – skipping")
     else:
-        print("ℹ applySubscriptionChain not present (custom chain patch not applied) – nothing to do")
+        doc.log("ℹ applySubscriptionChain not present (custom chain patch not applied) – nothing to do")
+
+    doc.text = content
 
-    # Write back if any changes were made
-    if content != original:
-        TARGET.write_text(content, encoding="utf-8")
+if __name__ == "__main__":
+    results = run(PATCHES)
+    if any(r.changed for r in results):
         print("\n✅ Reuse proxy logic applied successfully.")
         print("👉 Rebuild the app and test.")
     else:
         print("\n⚠ No changes made – file may already be patched or missing expected blocks.")
-
-if __name__ == "__main__":
-    apply()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Deduplicating backup store for patched files.
+
+Replaces the timestamped `.kt.bak.*` copies the scripts used to drop next to
+every file on every run. Snapshots live under <checkout>/.vpatches/backups:
+
+  objects/<sha256>           file content, stored once however many files
+                             or runs share it
+  refs/<relative path>/<sha256>
+                             empty marker: this file had this content; its
+                             mtime is when the snapshot was last taken
+  outputs/<relative path>/<sha256>
+                             empty marker: patchengine wrote this content
+
+A snapshot whose content patchengine never wrote is a base: what the
+checkout had before it was patched. After a new upstream checkout the
+newest base is that checkout's pristine file, while older bases belong to
+earlier checkouts, so restore picks the newest base.
+
+Snapshotting content that is already recorded for a path costs one hash and
+a touch of its marker. New objects are reflinked where the filesystem supports it, else
+hard-linked, else copied. A hard link is safe because patchengine replaces
+files (write to a temp file + rename) instead of writing them in place.
+
+Usage:
+  python3 vpatches/backupstore.py list    [--base V2rayNG]
+  python3 vpatches/backupstore.py restore [--base V2rayNG] [--latest | --snapshot SHA] [PATH...]
+    restore every (or each given) file to its newest base, i.e. the
+    pristine content of the current checkout; --latest picks the newest
+    snapshot of any kind, --snapshot the one whose sha256 starts with SHA
+"""
+
+import argparse
+import fcntl
+import hashlib
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+FICLONE = 0x40049409  # linux/fs.h _IOW(0x94, 9, int)
+STORE_DIR = Path(".vpatches") / "backups"
+
+
+class Snapshot(NamedTuple):
+    time: float         # when it was last taken
+    sha: str
+    base: bool          # content patchengine did not write
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        dst.unlink(missing_ok=True)
+        return False
+
+
+def clone(src: Path, dst: Path, allow_link: bool) -> str:
+    """Materialize src at dst as cheaply as possible; returns the method used."""
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    if reflink(src, tmp):
+        method = "reflink"
+    else:
+        try:
+            if not allow_link:
+                raise OSError
+            os.link(src, tmp)
+            method = "hardlink"
+        except OSError:
+            shutil.copy2(src, tmp)
+            method = "copy"
+    os.replace(tmp, dst)
+    return method
+
+
+class BackupStore:
+    def __init__(self, base: Path):
+        self.base = base
+        self.root = base / STORE_DIR
+        self.objects = self.root / "objects"
+        self.refs = self.root / "refs"
+        self.outputs = self.root / "outputs"
+
+    def _rel(self, path: Path) -> Path:
+        try:
+            return path.resolve().relative_to(self.base.resolve())
+        except ValueError:
+            return Path(*path.resolve().parts[1:])
+
+    def snapshot(self, path: Path) -> Tuple[str, Optional[str]]:
+        """
+        Record the current content of path. Returns (sha256, method), where
+        method is None when that content was already recorded for the path.
+        """
+        sha = file_sha256(path)
+        ref = self.refs / self._rel(path) / sha
+        if ref.exists():
+            os.utime(ref)
+            return sha, None
+        self.objects.mkdir(parents=True, exist_ok=True)
+        obj = self.objects / sha
+        method = "dedup" if obj.exists() else clone(path, obj, allow_link=True)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        ref.touch()
+        return sha, method
+
+    def written(self, path: Path, sha: str):
+        """Record that patchengine wrote content sha to path."""
+        marker = self.outputs / self._rel(path) / sha
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+
+    def snapshots(self) -> Dict[Path, List[Snapshot]]:
+        """relative path -> snapshots, oldest first."""
+        out: Dict[Path, List[Snapshot]] = {}
+        if not self.refs.exists():
+            return out
+        for ref in self.refs.rglob("*"):
+            if ref.is_file():
+                rel = ref.parent.relative_to(self.refs)
+                base = not (self.outputs / rel / ref.name).exists()
+                out.setdefault(rel, []).append(Snapshot(ref.stat().st_mtime, ref.name, base))
+        for entries in out.values():
+            entries.sort()
+        return out
+
+    @staticmethod
+    def pick(entries: List[Snapshot], latest: bool = False, prefix: str = "") -> Optional[Snapshot]:
+        """The snapshot restore uses: newest base by default (see the module doc)."""
+        if prefix:
+            return next((e for e in entries if e.sha.startswith(prefix)), None)
+        if latest:
+            return entries[-1]
+        bases = [e for e in entries if e.base]
+        return bases[-1] if bases else entries[0]
+
+    def restore(self, rel: Path, sha: str) -> str:
+        target = self.base / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # never hard-link back: the object must survive later in-place edits
+        return clone(self.objects / sha, target, allow_link=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="List or restore vpatches backups.")
+    ap.add_argument("command", choices=["list", "restore"])
+    ap.add_argument("paths", nargs="*", type=Path, help="files relative to --base")
+    ap.add_argument("--base", type=Path, default=Path("V2rayNG"))
+    which = ap.add_mutually_exclusive_group()
+    which.add_argument("--latest", action="store_true", help="newest snapshot, base or not")
+    which.add_argument("--snapshot", metavar="SHA", default="", help="snapshot whose sha256 starts with SHA")
+    args = ap.parse_args()
+
+    store = BackupStore(args.base)
+    snaps = store.snapshots()
+    if args.paths:
+        snaps = {p: snaps[p] for p in args.paths if p in snaps}
+    if not snaps:
+        print(f"no backups under {store.root}")
+        sys.exit(1 if args.command == "restore" else 0)
+
+    for rel in sorted(snaps):
+        entries = snaps[rel]
+        if args.command == "list":
+            print(f"{rel}  ({len(entries)} snapshot{'s' if len(entries) != 1 else ''})")
+            for e in entries:
+                print(f"    {e.sha[:12]}{'  base' if e.base else ''}")
+            continue
+        snap = store.pick(entries, args.latest, args.snapshot)
+        if snap is None:
+            print(f"⚠️ {rel}: no snapshot {args.snapshot}")
+            continue
+        sha = snap.sha
+        target = args.base / rel
+        if target.exists() and file_sha256(target) == sha:
+            print(f"• {rel}: already at {sha[:12]}")
+            continue
+        method = store.restore(rel, sha)
+        print(f"✓ {rel}: restored {sha[:12]} ({method})")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,13 +18,16 @@ Usage:
   # or, in GitHub Actions, GITHUB_WORKSPACE is already set for you:
   python3 disable_release_shrinking.py
 
-  Add --dry-run to preview the change without writing the file.
+  Add --dry-run (or set VPATCHES_DRY_RUN, as for the other vpatches scripts)
+  to preview the change without writing the file.
 """
 
 import os
 import re
 import sys
 
+from kotlinindex import KotlinIndex
+
 FILE_PATH_ENV = "GRADLE_FILE_PATH"
 WORKSPACE_ENV = "GITHUB_WORKSPACE"
 DEFAULT_RELATIVE_PATH = "app/build.gradle.kts"
@@ -47,21 +50,13 @@ def find_top_level_block(text: str, block_name: str):
     `create("release")` never match). Returns (open_brace_idx,
     one_past_close_brace_idx, block_text), or None if not found.
     """
-    match = re.search(rf'^[ \t]*{re.escape(block_name)}[ \t]*\{{', text, re.MULTILINE)
-    if not match:
-        return None
-
-    open_idx = text.index("{", match.start())
-    depth = 0
-    for i in range(open_idx, len(text)):
-        ch = text[i]
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return open_idx, i + 1, text[open_idx:i + 1]
-    return None  # unbalanced braces -- shouldn't happen on valid Kotlin
+    index = KotlinIndex(text)
+    for match in re.finditer(rf'^[ \t]*{re.escape(block_name)}[ \t]*\{{', text, re.MULTILINE):
+        open_idx = text.index("{", match.start())
+        block = index.block_at_brace(open_idx)
+        if block is not None:  # None: the match sits in a comment or string
+            return open_idx, block.end, text[open_idx:block.end]
+    return None  # not found, or unbalanced braces -- shouldn't happen on valid Kotlin
 
 
 def set_boolean_flag(block_text: str, flag_name: str, new_value: str):
@@ -90,7 +85,7 @@ def set_boolean_flag(block_text: str, flag_name: str, new_value: str):
 
 
 def main():
-    dry_run = "--dry-run" in sys.argv[1:]
+    dry_run = "--dry-run" in sys.argv[1:] or bool(os.environ.get("VPATCHES_DRY_RUN"))
     path = resolve_path()
 
     if not os.path.isfile(path):
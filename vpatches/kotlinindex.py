@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+One-pass brace/block index for Kotlin (and Gradle .kts) sources.
+
+KotlinIndex lexes a file once, skipping string literals (plain, raw and
+`${...}` templates), char literals and comments (nested /* */ included), and
+records every `{ ... }` pair as a Block with its header, kind, name and
+parent/children. Functions and classes are additionally indexed by name, so
+"find the body of function X" is a dict lookup instead of a char loop from an
+anchor.
+
+The index describes the text it was built from; after editing the text build
+a new one (patchengine.Document.kotlin does that lazily).
+
+Usage:
+  python3 vpatches/kotlinindex.py File.kt
+    print the block tree of a file
+"""
+
+import bisect
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_CODE = re.compile(r'[{}"\'/;]')
+_PARENS = re.compile(r'[()]')
+_STRING = re.compile(r'["\\$]')
+_RAW = re.compile(r'"""|\$')
+_COMMENT = re.compile(r'/\*|\*/')
+
+_FUN = re.compile(r'\bfun\s+(?:<[^>]*>\s*)?(?:[\w.<>?, *]+?\.)?(\w+)\s*\(')
+_CLASS = re.compile(r'\b(class|object|interface)\s+(\w+)')
+_COMPANION = re.compile(r'\bcompanion\s+object\b')
+_CALL = re.compile(r'([A-Za-z_][\w.]*)\s*(?:\(.*\))?', re.DOTALL)
+_KEYWORDS = {"if", "else", "when", "for", "while", "do", "try", "catch", "finally"}
+
+
+@dataclass(eq=False)
+class Block:
+    open: int                       # index of `{`
+    close: int = -1                 # index of the matching `}`
+    start: int = -1                 # first code char of the header
+    kind: str = "block"             # fun / class / object / interface / call / block
+    name: str = ""
+    header: str = ""
+    parent: Optional["Block"] = None
+    children: List["Block"] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        """One past the closing brace."""
+        return self.close + 1
+
+    @property
+    def body(self) -> Tuple[int, int]:
+        """Span between the braces, exclusive."""
+        return self.open + 1, self.close
+
+    def __repr__(self):
+        return f"Block({self.kind} {self.name!r} {self.start}:{self.end})"
+
+
+class KotlinIndex:
+    def __init__(self, text: str):
+        self.text = text
+        self.blocks: List[Block] = []
+        self.roots: List[Block] = []
+        self.unbalanced = False
+        # sorted, non-overlapping (start, end) spans of strings and comments
+        self.skipped: List[Tuple[int, int]] = []
+        self._by_open: Dict[int, Block] = {}
+        self._functions: Dict[str, List[Block]] = {}
+        self._classes: Dict[str, List[Block]] = {}
+        self._calls: Dict[str, List[Block]] = {}
+        # (parent, `(` offset, header start, name) of a fun whose parameter
+        # list holds a `{`, e.g. a `cb: () -> Unit = {}` default argument
+        self._pending: Optional[Tuple[Optional[Block], int, int, str]] = None
+        self._lex()
+
+    # ------------------------------------------------------------------
+    # lexing
+    # ------------------------------------------------------------------
+    def _lex(self):
+        text = self.text
+        n = len(text)
+        stack: List[Block] = []
+        boundary = 0                    # just after the last `{`, `}` or `;`
+        i = 0
+        while True:
+            m = _CODE.search(text, i)
+            if not m:
+                break
+            i = m.start()
+            ch = text[i]
+            if ch == "{":
+                b = Block(open=i, parent=stack[-1] if stack else None)
+                self._set_header(b, boundary)
+                stack.append(b)
+                boundary = i + 1
+                i += 1
+            elif ch == "}":
+                if not stack:
+                    self.unbalanced = True
+                    boundary = i = i + 1
+                    continue
+                b = stack.pop()
+                b.close = i
+                self._add(b)
+                boundary = i = i + 1
+            elif ch == ";":
+                boundary = i = i + 1
+            elif ch == '"':
+                if text.startswith('"""', i):
+                    end = self._skip_raw(i + 3)
+                else:
+                    end = self._skip_string(i + 1)
+                self.skipped.append((i, end))
+                i = end
+            elif ch == "'":
+                j = i + 1
+                while j < n and text[j] != "'":
+                    j += 2 if text[j] == "\\" else 1
+                self.skipped.append((i, j + 1))
+                i = j + 1
+            elif text.startswith("//", i):
+                j = text.find("\n", i)
+                j = n if j == -1 else j
+                self.skipped.append((i, j))
+                i = j
+            elif text.startswith("/*", i):
+                j = self._skip_comment(i + 2)
+                self.skipped.append((i, j))
+                i = j
+            else:
+                i += 1
+        if stack:
+            self.unbalanced = True
+        self.blocks.sort(key=lambda b: b.open)
+        self._opens = [b.open for b in self.blocks]
+
+    def _skip_comment(self, i: int) -> int:
+        depth = 1
+        while depth:
+            m = _COMMENT.search(self.text, i)
+            if not m:
+                return len(self.text)
+            depth += 1 if m.group() == "/*" else -1
+            i = m.end()
+        return i
+
+    def _skip_string(self, i: int) -> int:
+        text = self.text
+        while True:
+            m = _STRING.search(text, i)
+            if not m:
+                return len(text)
+            i = m.start()
+            ch = text[i]
+            if ch == '"':
+                return i + 1
+            if ch == "\\":
+                i += 2
+            elif text.startswith("${", i):
+                i = self._skip_template(i + 2)
+            else:
+                i += 1
+
+    def _skip_raw(self, i: int) -> int:
+        text = self.text
+        while True:
+            m = _RAW.search(text, i)
+            if not m:
+                return len(text)
+            i = m.start()
+            if m.group() == '"""':
+                # a raw string may end in more than three quotes
+                while text.startswith('"', i + 3):
+                    i += 1
+                return i + 3
+            if text.startswith("${", i):
+                i = self._skip_template(i + 2)
+            else:
+                i += 1
+
+    def _skip_template(self, i: int) -> int:
+        """Skip a `${ ... }` expression, including nested strings and braces."""
+        text = self.text
+        depth = 1
+        while depth:
+            m = _CODE.search(text, i)
+            if not m:
+                return len(text)
+            i = m.start()
+            ch = text[i]
+            if ch == "{":
+                depth += 1
+                i += 1
+            elif ch == "}":
+                depth -= 1
+                i += 1
+            elif ch == '"':
+                i = self._skip_raw(i + 3) if text.startswith('"""', i) else self._skip_string(i + 1)
+            else:
+                i += 1
+        return i
+
+    def _set_header(self, b: Block, boundary: int):
+        # Kotlin needs no `;`, so the text since the last boundary may hold
+        # earlier statements; the header starts on the line of the last
+        # declaration keyword (or, for calls, on the last line).
+        start = self._skip_blank(boundary, b.open)
+        if self._pending is not None and self._pending[0] is b.parent and self._set_fun_body(b):
+            return
+        header = self.text[start:b.open]
+        for regex, kind in ((_FUN, "fun"), (_CLASS, None), (_COMPANION, "object")):
+            m = None
+            for m in regex.finditer(header):
+                pass
+            if m and kind == "fun" and self._close_paren(start + m.end() - 1, b.open) < 0:
+                # `{` inside the parameter list; the body is a later brace
+                line = start + header.rfind("\n", 0, m.start()) + 1
+                self._pending = (b.parent, start + m.end() - 1, line, m.group(1))
+                break
+            if m:
+                if kind is None:
+                    b.kind, b.name = m.group(1), m.group(2)
+                else:
+                    b.kind, b.name = kind, m.group(1) if kind == "fun" else "Companion"
+                self._finish_header(b, start, header.rfind("\n", 0, m.start()) + 1)
+                return
+        line = header.rstrip().rfind("\n") + 1
+        m = _CALL.fullmatch(header[line:].strip())
+        if m and m.group(1) not in _KEYWORDS:
+            b.kind, b.name = "call", m.group(1)
+        self._finish_header(b, start, line)
+
+    def _set_fun_body(self, b: Block) -> bool:
+        """Bind b to the pending fun if its parameter list closed before b."""
+        _, paren, line, name = self._pending
+        close = self._close_paren(paren, b.open)
+        if close < 0:
+            return False                # another brace inside the parameters
+        self._pending = None
+        tail = self.text[close + 1:b.open]
+        if "=" in tail or _FUN.search(tail) or _CLASS.search(tail):
+            return False                # expression body or no body at all
+        b.kind, b.name = "fun", name
+        self._finish_header(b, line, 0)
+        return True
+
+    def _close_paren(self, paren: int, limit: int) -> int:
+        """Offset of the `)` closing the `(` at paren, or -1 if not before limit."""
+        depth = 0
+        for m in _PARENS.finditer(self.text, paren, limit):
+            if self._skipped_at(m.start()) is not None:
+                continue
+            depth += 1 if m.group() == "(" else -1
+            if not depth:
+                return m.start()
+        return -1
+
+    def _finish_header(self, b: Block, start: int, offset: int):
+        b.start = self._skip_blank(start + offset, b.open)
+        b.header = self.text[b.start:b.open].strip()
+
+    def _skip_blank(self, i: int, limit: int) -> int:
+        """Advance past whitespace and comments (already lexed) up to limit."""
+        text = self.text
+        while i < limit:
+            if text[i].isspace():
+                i += 1
+                continue
+            span = self._skipped_at(i)
+            if span is None or span[0] != i or text[i] in "\"'":
+                return i
+            i = span[1]
+        return limit
+
+    def _skipped_at(self, pos: int) -> Optional[Tuple[int, int]]:
+        k = bisect.bisect_right(self.skipped, (pos, float("inf"))) - 1
+        if k >= 0 and self.skipped[k][0] <= pos < self.skipped[k][1]:
+            return self.skipped[k]
+        return None
+
+    def _add(self, b: Block):
+        self.blocks.append(b)
+        self._by_open[b.open] = b
+        if b.parent is None:
+            self.roots.append(b)
+        else:
+            b.parent.children.append(b)
+        table = {"fun": self._functions, "class": self._classes,
+                 "object": self._classes, "interface": self._classes,
+                 "call": self._calls}.get(b.kind)
+        if table is not None:
+            table.setdefault(b.name, []).append(b)
+
+    # ------------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------------
+    def functions(self, name: str) -> List[Block]:
+        """All functions called `name`, in source order."""
+        return sorted(self._functions.get(name, ()), key=lambda b: b.open)
+
+    def function(self, name: str, header_contains: str = "") -> Optional[Block]:
+        """First function `name` whose header contains `header_contains`."""
+        for b in self.functions(name):
+            if header_contains in b.header:
+                return b
+        return None
+
+    def classes(self, name: str) -> List[Block]:
+        return sorted(self._classes.get(name, ()), key=lambda b: b.open)
+
+    def calls(self, name: str) -> List[Block]:
+        """Blocks opened by a bare call/DSL name, e.g. `release { }`."""
+        return sorted(self._calls.get(name, ()), key=lambda b: b.open)
+
+    def block_at_brace(self, open_idx: int) -> Optional[Block]:
+        return self._by_open.get(open_idx)
+
+    def innermost(self, pos: int) -> Optional[Block]:
+        """Innermost block whose braces enclose pos."""
+        k = bisect.bisect_right(self._opens, pos) - 1
+        while k >= 0:
+            b = self.blocks[k]
+            if b.open < pos <= b.close:
+                return b
+            k -= 1
+        return None
+
+    def is_code(self, pos: int) -> bool:
+        """False if pos lies inside a string literal or comment."""
+        return self._skipped_at(pos) is None
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__.strip())
+        sys.exit(2)
+    idx = KotlinIndex(Path(sys.argv[1]).read_text(encoding="utf-8"))
+
+    def show(b: Block, depth: int):
+        if b.kind != "block":
+            line = idx.text.count("\n", 0, b.start) + 1
+            print(f"{'  ' * depth}{b.kind} {b.name}  (line {line})")
+            depth += 1
+        for child in b.children:
+            show(child, depth)
+
+    for root in idx.roots:
+        show(root, 0)
+    if idx.unbalanced:
+        print("⚠ unbalanced braces")
+
+
+if __name__ == "__main__":
+    main()
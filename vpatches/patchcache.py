@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Persistent result cache for patchengine.
+
+A file's patch outcome depends only on its content and on the patches run
+over it, so the cache maps (sha256 of the content, key of the patch group)
+to what that run produced: the sha256 of the output (None when the file was
+left alone), the ids of the failed patches and the log. Outputs that differ
+from their input are kept as content-addressed blobs next to the index.
+
+On a hit the engine only hashes the file: it replays the recorded log, and
+writes the cached output when there is one. A patch's key is its id plus its
+`version`; without an explicit version a fingerprint of its code (and, for
+closures, the strings it captured) is used, so editing a patch invalidates
+its entries. A patch's key also covers the source of the script defining
+it, since patches read module-level helpers and constants the fingerprint
+cannot see, and every group key covers the source of the engine and the
+helpers patches call (ENGINE_MODULES), so fixing a helper invalidates all
+entries too.
+
+Location: $VPATCHES_CACHE, default ~/.cache/vpatches. VPATCHES_CACHE=off
+disables the cache.
+
+Usage:
+  python3 vpatches/patchcache.py stats
+  python3 vpatches/patchcache.py clear
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import shutil
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CACHE_ENV = "VPATCHES_CACHE"
+DEFAULT_DIR = Path.home() / ".cache" / "vpatches"
+FORMAT = 1
+HERE = Path(__file__).resolve().parent
+# modules whose behaviour every patch's output depends on
+ENGINE_MODULES = ("patchengine.py", "structmatch.py", "kotlinindex.py", "xmlres.py")
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint(func) -> str:
+    """Stable-enough hash of a patch function's code and captured strings."""
+    h = hashlib.sha1(marshal.dumps(func.__code__))
+    for cell in func.__closure__ or ():
+        value = cell.cell_contents
+        if isinstance(value, (str, int, bool, type(None))):
+            h.update(repr(value).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def source_hash(path: str) -> str:
+    try:
+        return hashlib.sha1(Path(path).read_bytes()).hexdigest()[:16]
+    except OSError:
+        return "-"
+
+
+def patch_key(patch) -> str:
+    source = source_hash(patch.func.__globals__.get("__file__") or "")
+    return f"{patch.id}@{patch.version or fingerprint(patch.func)}@{source}"
+
+
+@lru_cache(maxsize=None)
+def engine_version() -> str:
+    """Hash of the ENGINE_MODULES sources."""
+    h = hashlib.sha1()
+    for name in ENGINE_MODULES:
+        h.update(name.encode("utf-8") + b"\0" + (HERE / name).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def group_key(group) -> str:
+    keys = [f"engine@{engine_version()}"] + [patch_key(p) for p in group]
+    return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+
+
+class PatchCache:
+    def __init__(self, root: Path):
+        self.root = root
+        self.index_path = root / "index.json"
+        self.blob_dir = root / "blobs"
+        self.entries: Dict[str, Dict[str, dict]] = {}
+        self.dirty = False
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if data.get("format") == FORMAT:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def lookup(self, digest: str, key: str) -> Optional[dict]:
+        """Recorded outcome for this content + patch group, if still usable."""
+        hit = self.entries.get(digest, {}).get(key)
+        if hit is None:
+            return None
+        if hit["out"] is not None and not (self.blob_dir / hit["out"]).exists():
+            return None
+        return hit
+
+    def blob(self, digest: str) -> str:
+        return (self.blob_dir / digest).read_text(encoding="utf-8")
+
+    def record(self, digest: str, key: str, output: Optional[str],
+               failed: List[str], log: List[str]):
+        """Remember an outcome; output is the new text, or None if unchanged."""
+        out = None
+        if output is not None:
+            out = sha256(output)
+            self.blob_dir.mkdir(parents=True, exist_ok=True)
+            blob = self.blob_dir / out
+            if not blob.exists():
+                blob.write_text(output, encoding="utf-8")
+        self.entries.setdefault(digest, {})[key] = {"out": out, "failed": failed, "log": log}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"format": FORMAT, "entries": self.entries}), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+        self.dirty = False
+
+
+def open_cache() -> Optional[PatchCache]:
+    setting = os.environ.get(CACHE_ENV, "")
+    if setting.lower() in ("off", "0", "no", "false"):
+        return None
+    return PatchCache(Path(setting) if setting else DEFAULT_DIR)
+
+
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    cache = open_cache()
+    if cache is None:
+        print(f"cache disabled via {CACHE_ENV}")
+        return
+    if cmd == "stats":
+        outcomes = sum(len(v) for v in cache.entries.values())
+        blobs = list(cache.blob_dir.glob("*")) if cache.blob_dir.exists() else []
+        size = sum(b.stat().st_size for b in blobs)
+        print(f"{cache.root}: {len(cache.entries)} inputs, {outcomes} outcomes, "
+              f"{len(blobs)} blobs ({size} bytes)")
+    elif cmd == "clear":
+        shutil.rmtree(cache.root, ignore_errors=True)
+        print(f"removed {cache.root}")
+    else:
+        print(__doc__.strip())
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Shared patch engine for the vpatches scripts.
+
+Every script declares its edits as an ordered PatchSet: each patch names the
+file it touches (relative to the V2rayNG checkout) and a function that edits
+an in-memory Document. The engine groups the patches by file, loads each file
+once, runs that file's patches in declaration order and writes it back once,
+only if something actually changed.
+
+Patches locate code through doc.kotlin (block index), doc.find and
+doc.balanced (token-level anchor match, see structmatch.py) and doc.xml
+(element spans, resource names and view ids, see xmlres.py) rather than
+literal multi-line strings; doc.search and doc.sub run a regex over the
+text. These helpers keep the patchtrace counters.
+
+A patch aborts itself by raising PatchError; whatever it did to the document
+is dropped and the remaining patches still run.
+
+Outcomes are remembered per (content hash, patch group) by patchcache, so a
+file whose content was seen before is settled by hashing it, without running
+any patch; see patchcache.py for location and invalidation.
+
+Before a file is overwritten it is snapshotted into the checkout's
+deduplicating backup store (backupstore.py, which also restores).
+
+Files are independent of each other, so with jobs > 1 they are patched on a
+process pool. Each worker buffers its file's log and the parent prints the
+logs in the same file order a sequential run would use.
+
+Usage:
+  python3 vpatches/patchengine.py [-j N] [--base DIR ...] SCRIPT...
+    run the PATCHES of several scripts together, one read/write per file.
+    Scripts are resolved relative to this directory unless given as paths.
+    -j N        patch up to N files at once (0 = one per CPU)
+    --base DIR  V2rayNG checkout to patch; repeat for several forks
+    --no-cache  do not consult or update the patch result cache
+    --dry-run[=diff|json]
+                patch in memory only: print unified diffs (default) or a
+                JSON summary; the checkout is never written or copied
+    --trace[=FILE], --chrome-trace=FILE
+                record time, bytes and regex counts per file and patch
+                (see patchtrace.py)
+
+  VPATCHES_JOBS=N and VPATCHES_DRY_RUN=diff|json set the defaults for -j and
+  --dry-run, also for the individual scripts, which accept --dry-run too.
+"""
+
+import argparse
+import difflib
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import patchtrace
+from backupstore import BackupStore
+from kotlinindex import KotlinIndex
+from patchcache import PatchCache, group_key, open_cache, sha256
+from structmatch import Match, Tokens, balanced, find, line_start
+from xmlres import XmlTree
+
+BASE = Path("V2rayNG")
+NEAR_MISS = 0.9         # approximate matches reported when an exact one is required
+HERE = Path(__file__).resolve().parent
+
+# before any file is read, so the whole run is covered
+patchtrace.enable()
+
+
+class PatchError(Exception):
+    """Raised by a patch to abort itself; its edits are rolled back."""
+
+
+def read(p: Path) -> str:
+    data = p.read_bytes()
+    patchtrace.count("bytes_read", len(data))
+    return data.decode("utf-8")
+
+
+def write(p: Path, s: str):
+    """Replace p atomically; hard-linked backups keep the old inode intact."""
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
+    data = s.encode("utf-8")
+    tmp.write_bytes(data)
+    patchtrace.count("bytes_written", len(data))
+    os.chmod(tmp, p.stat().st_mode & 0o7777)
+    os.replace(tmp, p)
+
+
+def backup(store: Optional[BackupStore], p: Path, log: Callable[[str], None] = print):
+    if store is None:
+        return
+    sha, method = store.snapshot(p)
+    if method is not None:
+        log(f"  backup: {p.name} @ {sha[:12]} ({method})")
+
+
+class Document:
+    """One target file, loaded once and edited in memory by its patches."""
+
+    def __init__(self, path: Path, text: str, log: Callable[[str], None] = print):
+        self.path = path
+        self.original = text
+        self.text = text
+        self._log = log
+        self._index: Optional[KotlinIndex] = None
+        self._tokens: Optional[Tokens] = None
+        self._xml: Optional[XmlTree] = None
+
+    @property
+    def changed(self) -> bool:
+        return self.text != self.original
+
+    @property
+    def kotlin(self) -> KotlinIndex:
+        """Block index of the current text, rebuilt only after it changes."""
+        if self._index is None or self._index.text is not self.text:
+            with patchtrace.span("kotlin-index", "index"):
+                self._index = KotlinIndex(self.text)
+        return self._index
+
+    @property
+    def lang(self) -> str:
+        return "xml" if self.path.suffix == ".xml" else "kotlin"
+
+    @property
+    def tokens(self) -> Tokens:
+        """Token stream of the current text (see structmatch)."""
+        if self._tokens is None or self._tokens.text is not self.text:
+            with patchtrace.span("tokens", "index"):
+                self._tokens = Tokens(self.text, self.lang)
+        return self._tokens
+
+    @property
+    def xml(self) -> XmlTree:
+        if self._xml is None or self._xml.text is not self.text:
+            with patchtrace.span("xml-tree", "index"):
+                self._xml = XmlTree(self.text)
+        return self._xml
+
+    def find(self, anchor: str, min_confidence: float = 0.9,
+             lo: int = 0, hi: Optional[int] = None) -> Optional[Match]:
+        """
+        Structural lookup of anchor: whitespace, comments and trailing
+        commas don't matter. Non-exact matches are logged with their
+        confidence. With min_confidence=1.0 (every lookup whose span is
+        replaced) a near miss raises PatchError naming the best candidate,
+        so an anchor that differs by one argument is never overwritten.
+        """
+        tokens = self.tokens
+        patchtrace.count("anchor_finds")
+        with patchtrace.span("find", "anchor"):
+            m = find(tokens, anchor, min_confidence, lo, hi, self.lang)
+            near = None
+            if m is None and min_confidence >= 1.0:
+                near = find(tokens, anchor, NEAR_MISS, lo, hi, self.lang)
+        if near is not None:
+            line = self.text.count("\n", 0, near.start) + 1
+            first = self.text[near.start:near.end].split("\n", 1)[0]
+            raise PatchError(f"anchor only matches approximately at line {line} "
+                             f"(confidence {near.confidence:.2f}): {first.strip()}")
+        if m is not None and not m.exact:
+            patchtrace.count("anchor_approx")
+            line = self.text.count("\n", 0, m.start) + 1
+            self.log(f"  ~ approximate anchor match at line {line} "
+                     f"(confidence {m.confidence:.2f})")
+        return m
+
+    def balanced(self, match: Match) -> Optional[Match]:
+        """structmatch.balanced over the current tokens."""
+        patchtrace.count("anchor_balanced")
+        return balanced(self.tokens, match)
+
+    def search(self, pattern, flags: int = 0) -> Optional["re.Match"]:
+        """re.search over the current text."""
+        m = re.search(pattern, self.text, flags)
+        patchtrace.count("regex_evals")
+        patchtrace.count("regex_matches", int(m is not None))
+        return m
+
+    def sub(self, pattern, repl, count: int = 0, flags: int = 0) -> int:
+        """re.subn on the current text, in place; returns the number of replacements."""
+        self.text, n = re.subn(pattern, repl, self.text, count, flags)
+        patchtrace.count("regex_evals")
+        patchtrace.count("regex_matches", n)
+        return n
+
+    def replace_span(self, start: int, end: int, new: str):
+        """
+        Replace text[start:end]. If `new` carries its own leading
+        indentation and start is the first code on its line, the existing
+        indentation is replaced too.
+        """
+        ls = line_start(self.text, start)
+        if new[:1] in (" ", "\t") and not self.text[ls:start].strip():
+            start = ls
+        self.text = self.text[:start] + new + self.text[end:]
+
+    def log(self, msg: str):
+        self._log(msg)
+
+
+@dataclass
+class Patch:
+    id: str
+    target: str
+    func: Callable[[Document], None]
+    backup: bool = True
+    required: bool = False
+    version: str = ""
+
+
+@dataclass
+class FileResult:
+    path: Path
+    missing: bool = False
+    changed: bool = False
+    failed: List[str] = field(default_factory=list)
+    log: List[str] = field(default_factory=list)
+    cached: bool = False
+    applied: List[str] = field(default_factory=list)   # patches that changed the text
+    added: int = 0
+    removed: int = 0
+    diff: str = ""
+    # (input sha256, group key, output text or None, patch log) for the cache
+    record: Optional[Tuple[str, str, Optional[str], List[str]]] = None
+    trace: List[dict] = field(default_factory=list)   # patchtrace spans from a worker
+
+
+class PatchSet:
+    """Ordered list of patches, built with the @patch decorator."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.patches: List[Patch] = []
+
+    def __iter__(self):
+        return iter(self.patches)
+
+    def __len__(self):
+        return len(self.patches)
+
+    def patch(self, id: str, target: str, **kw):
+        def deco(func):
+            self.patches.append(Patch(id, target, func, **kw))
+            return func
+        return deco
+
+    def replace(self, id: str, target: str, old: str, new: str, *,
+                done: Optional[str] = None, ok: str = "", miss: str = "", **kw):
+        """
+        Declarative single replacement of `old` by `new`. `done` is a marker
+        whose presence means the patch is already applied.
+        """
+        def func(doc: Document):
+            if done is not None and done in doc.text:
+                doc.log(f"• {id}: already applied")
+                return
+            if old not in doc.text:
+                raise PatchError(miss or f"{id}: anchor not found")
+            doc.text = doc.text.replace(old, new, 1)
+            doc.log(ok or f"✓ {id}")
+        self.patches.append(Patch(id, target, func, **kw))
+        return func
+
+
+def group_by_file(patches: Iterable[Patch]) -> Dict[str, List[Patch]]:
+    """Group patches by target, keeping declaration order within each file."""
+    groups: Dict[str, List[Patch]] = {}
+    for p in patches:
+        groups.setdefault(p.target, []).append(p)
+    return groups
+
+
+def unified_diff(path: Path, old: str, new: str) -> str:
+    return "".join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile=f"a/{path}", tofile=f"b/{path}"))
+
+
+def apply_file(path: Path, group: List[Patch], buffered: bool = False,
+               cache: Optional[PatchCache] = None,
+               backups: Optional[BackupStore] = None,
+               dry_run: bool = False) -> FileResult:
+    """
+    Patch one file. With buffered=True the log is kept in result.log. The
+    cache is only read here; the outcome to store is left in result.record.
+    The file is snapshotted into `backups` before it is overwritten. With
+    dry_run=True nothing is written; the change is left in result.diff.
+    """
+    with patchtrace.span(str(path), "file") as span:
+        result = _apply_file(path, group, buffered, cache, backups, dry_run)
+        if span is not None:
+            span.args.update(cached=result.cached, changed=result.changed)
+    return result
+
+
+def _apply_file(path: Path, group: List[Patch], buffered: bool,
+                cache: Optional[PatchCache], backups: Optional[BackupStore],
+                dry_run: bool) -> FileResult:
+    result = FileResult(path)
+    if buffered:
+        log = result.log.append
+    elif dry_run:
+        def log(msg: str):
+            print(msg, file=sys.stderr)
+    else:
+        log = print
+    if not path.exists():
+        log(f"✗ {path.name} not found")
+        result.missing = True
+        return result
+
+    text = read(path)
+    output: Optional[str] = None
+    hit = None
+    if cache is not None:
+        digest, key = sha256(text), group_key(group)
+        hit = cache.lookup(digest, key)
+    if hit is not None:
+        log(f"• {path.name}: cached outcome of {len(group)} patch(es)")
+        for line in hit["log"]:
+            log(line)
+        result.cached = True
+        result.failed = list(hit["failed"])
+        if hit["out"] is not None:
+            output = cache.blob(hit["out"])
+    else:
+        patch_log: List[str] = []
+
+        def doc_log(msg: str):
+            patch_log.append(msg)
+            log(msg)
+
+        doc = Document(path, text, doc_log)
+        for p in group:
+            before = doc.text
+            with patchtrace.span(p.id, "patch", file=str(path)):
+                try:
+                    p.func(doc)
+                except PatchError as e:
+                    doc.text = before
+                    doc.log(f"✗ {e}")
+                    result.failed.append(p.id)
+                    continue
+            if doc.text != before:
+                result.applied.append(p.id)
+        if doc.changed:
+            output = doc.text
+        if cache is not None:
+            result.record = (digest, key, output, patch_log)
+
+    if output is None:
+        return result
+    result.changed = True
+    result.added = result.removed = 0
+    if dry_run:
+        result.diff = unified_diff(path, text, output)
+        for line in result.diff.splitlines()[2:]:
+            if line.startswith("+"):
+                result.added += 1
+            elif line.startswith("-"):
+                result.removed += 1
+        return result
+    if any(p.backup for p in group):
+        backup(backups, path, log)
+    write(path, output)
+    if backups is not None:
+        backups.written(path, sha256(output))
+    return result
+
+
+# work list of the current parallel run; workers are forked and inherit it,
+# so patch functions (often closures) never have to be pickled
+_WORK: List[Tuple[Path, List[Patch], BackupStore]] = []
+_CACHE: Optional[PatchCache] = None
+_DRY_RUN = False
+
+
+def _apply_nth(n: int) -> FileResult:
+    path, group, backups = _WORK[n]
+    if patchtrace.TRACER is not None:
+        patchtrace.TRACER.drain()       # spans inherited from the parent
+    result = apply_file(path, group, buffered=True, cache=_CACHE, backups=backups,
+                        dry_run=_DRY_RUN)
+    if patchtrace.TRACER is not None:
+        result.trace = patchtrace.TRACER.drain()
+    return result
+
+
+def dry_run_mode(argv: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    "diff", "json" or None, from --dry-run[=diff|json] in argv (default
+    sys.argv) or else $VPATCHES_DRY_RUN. Lets every script offer the same flag.
+    """
+    for arg in sys.argv[1:] if argv is None else argv:
+        if arg == "--dry-run":
+            return "diff"
+        if arg.startswith("--dry-run="):
+            return arg.split("=", 1)[1]
+    return os.environ.get("VPATCHES_DRY_RUN") or None
+
+
+def run(patches: Iterable[Patch], base: Path = BASE,
+        paths: Optional[Dict[str, Path]] = None, jobs: Optional[int] = None,
+        bases: Sequence[Path] = (), cache: bool = True,
+        dry_run: Optional[str] = None) -> List[FileResult]:
+    """
+    Apply `patches` with one read and at most one write per file. `paths`
+    overrides where individual targets live (e.g. a path given on argv);
+    `bases` patches several checkouts with the same patches. With jobs > 1
+    (default: $VPATCHES_JOBS, else 1) files are patched in parallel (needs
+    the fork start method; otherwise this falls back to a sequential run).
+    cache=False bypasses patchcache.
+
+    dry_run ("diff" or "json", default from dry_run_mode()) never writes the
+    checkout: "diff" streams a unified diff per file to stdout as files
+    complete, "json" prints a summary once all files are done. Logs then go
+    to stderr so stdout stays machine-readable.
+
+    Raises PatchError before touching anything if a required file is missing.
+    """
+    global _WORK, _CACHE, _DRY_RUN
+    paths = paths or {}
+    if dry_run is None:
+        dry_run = dry_run_mode()
+    if dry_run not in (None, "diff", "json"):
+        raise PatchError(f"unknown dry-run mode: {dry_run}")
+    groups = group_by_file(patches)
+    work = [(paths.get(t, b / t), group, BackupStore(b))
+            for b in (bases or [base]) for t, group in groups.items()]
+
+    for path, group, _ in work:
+        if any(p.required for p in group) and not path.exists():
+            raise PatchError(f"File not found: {path}")
+
+    if jobs is None:
+        jobs = int(os.environ.get("VPATCHES_JOBS", "1"))
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    store = open_cache() if cache else None
+    log_stream = sys.stderr if dry_run else sys.stdout
+
+    def emit(result: FileResult, buffered: bool):
+        if buffered:
+            for line in result.log:
+                print(line, file=log_stream)
+        if dry_run == "diff" and result.diff:
+            sys.stdout.write(result.diff)
+            sys.stdout.flush()
+
+    results: List[FileResult] = []
+    if jobs < 2 or len(work) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        for path, group, backups in work:
+            result = apply_file(path, group, cache=store, backups=backups,
+                                dry_run=bool(dry_run))
+            emit(result, buffered=False)
+            results.append(result)
+    else:
+        _WORK, _CACHE, _DRY_RUN = work, store, bool(dry_run)
+        try:
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(min(jobs, len(work)), mp_context=ctx) as pool:
+                # map() yields in submission order, so logs come out as in a
+                # sequential run no matter which worker finishes first
+                for result in pool.map(_apply_nth, range(len(work))):
+                    if patchtrace.TRACER is not None:
+                        patchtrace.TRACER.events.extend(result.trace)
+                    emit(result, buffered=True)
+                    results.append(result)
+        finally:
+            _WORK, _CACHE, _DRY_RUN = [], None, False
+
+    _save_outcomes(store, results)
+    if dry_run == "json":
+        print(json.dumps(summary(results), indent=2))
+    return results
+
+
+def summary(results: List[FileResult]) -> dict:
+    files = [{
+        "path": str(r.path),
+        "missing": r.missing,
+        "changed": r.changed,
+        "cached": r.cached,
+        "applied": r.applied,
+        "failed": r.failed,
+        "added": r.added,
+        "removed": r.removed,
+    } for r in results]
+    return {
+        "files": files,
+        "changed": sum(r.changed for r in results),
+        "failed": sum(len(r.failed) for r in results),
+    }
+
+
+def _save_outcomes(store: Optional[PatchCache], results: List[FileResult]):
+    if store is None:
+        return
+    for r in results:
+        if r.record is not None:
+            digest, key, output, log = r.record
+            store.record(digest, key, output, r.failed, log)
+    store.save()
+
+
+def load_patches(script: str) -> PatchSet:
+    """Import a vpatches script by file name and return its PATCHES."""
+    path = Path(script)
+    if not path.exists():
+        path = HERE / script
+    if str(HERE) not in sys.path:
+        sys.path.insert(0, str(HERE))
+    name = path.stem.replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module.PATCHES
+
+
+def main():
+    # scripts import us as `patchengine`; make that the same module object so
+    # their PatchError is the one apply_file() catches
+    sys.modules.setdefault("patchengine", sys.modules[__name__])
+    ap = argparse.ArgumentParser(description="Apply vpatches scripts in one pass per file.")
+    ap.add_argument("scripts", nargs="+", metavar="SCRIPT")
+    ap.add_argument("-j", "--jobs", type=int, default=None)
+    ap.add_argument("--base", dest="bases", type=Path, action="append", default=[])
+    ap.add_argument("--no-cache", action="store_true", help="ignore and do not update patchcache")
+    dry_run = dry_run_mode()
+    args = ap.parse_args([a for a in sys.argv[1:]
+                          if not a.startswith("--dry-run") and not patchtrace.is_trace_arg(a)])
+    out = sys.stderr if dry_run else sys.stdout
+
+    patches: List[Patch] = []
+    for s in args.scripts:
+        patches.extend(load_patches(s))
+
+    try:
+        results = run(patches, jobs=args.jobs, bases=args.bases,
+                      cache=not args.no_cache, dry_run=dry_run)
+    except PatchError as e:
+        print(f"\n❌ {e}", file=out)
+        sys.exit(1)
+
+    written = sum(r.changed for r in results)
+    failed = [pid for r in results for pid in r.failed]
+    cached = sum(r.cached for r in results)
+    print(f"\n{len(patches)} patches over {len(results)} files, "
+          f"{written} {'would change' if dry_run else 'written'}, {cached} from cache", file=out)
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}", file=out)
+        sys.exit(1)
+    print("✅ Done.", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Timing and counter instrumentation for patchengine.
+
+Off unless asked for; then every file, every patch on it and every index
+build (KotlinIndex, token stream, XML tree) becomes a span recording
+
+  wall time, bytes read / written, regex evaluations and regex matches,
+  structural anchor lookups (and how many were approximate), bracket
+  extensions
+
+Counters roll up from a patch into its file and from there into the total.
+They are kept by the engine's own helpers: Document.search / Document.sub
+count regex evaluations, Document.find and Document.balanced the
+structmatch calls; the `re` module itself is left alone, so regexes a patch
+runs on its own are not counted. Worker processes send their spans back
+with their FileResult.
+
+Output, written when the process exits:
+  --trace[=FILE]        JSON summary per file and per patch plus the raw
+                        spans (default FILE: vpatches-trace.json)
+  --chrome-trace=FILE   Chrome trace-event file, for chrome://tracing or
+                        https://ui.perfetto.dev (one lane per process)
+
+$VPATCHES_TRACE and $VPATCHES_CHROME_TRACE set the same paths. All scripts
+accept the flags since they go through patchengine.
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Sequence
+
+COUNTERS = ("bytes_read", "bytes_written", "regex_evals", "regex_matches",
+            "anchor_finds", "anchor_approx", "anchor_balanced")
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start", "counters")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name, self.cat, self.args = name, cat, args
+        self.start = time.perf_counter_ns()
+        self.counters: Dict[str, int] = {}
+
+
+class Tracer:
+    def __init__(self, json_path: Optional[str], chrome_path: Optional[str]):
+        self.json_path = json_path
+        self.chrome_path = chrome_path
+        self.events: List[dict] = []
+        self.stack: List[_Span] = []
+        self.t0 = time.perf_counter_ns()
+
+    @contextmanager
+    def span(self, name: str, cat: str, **args):
+        s = _Span(name, cat, args)
+        self.stack.append(s)
+        try:
+            yield s
+        finally:
+            self.stack.pop()
+            end = time.perf_counter_ns()
+            if self.stack:
+                parent = self.stack[-1].counters
+                for k, v in s.counters.items():
+                    parent[k] = parent.get(k, 0) + v
+            self.events.append({
+                "name": name, "cat": cat, "pid": os.getpid(),
+                "ts": (s.start - self.t0) / 1000, "dur": (end - s.start) / 1000,
+                "depth": len(self.stack), "args": {**args, **s.counters},
+            })
+
+    def count(self, key: str, n: int = 1):
+        if self.stack:
+            c = self.stack[-1].counters
+            c[key] = c.get(key, 0) + n
+
+    def drain(self) -> List[dict]:
+        """Events recorded so far, removed from this tracer (worker -> parent)."""
+        events, self.events = self.events, []
+        return events
+
+    def summary(self) -> dict:
+        events = sorted(self.events, key=lambda e: e["ts"])
+        files = []
+        spans = []                      # (pid, start, end, entry) of file spans
+        for e in events:
+            if e["cat"] == "file":
+                entry = {"path": e["name"], "wall_ms": round(e["dur"] / 1000, 3),
+                         **{k: e["args"].get(k, 0) for k in COUNTERS},
+                         "cached": e["args"].get("cached", False), "patches": []}
+                files.append(entry)
+                spans.append((e["pid"], e["ts"], e["ts"] + e["dur"], entry))
+        for e in events:
+            if e["cat"] != "patch":
+                continue
+            for pid, start, end, entry in spans:
+                if pid == e["pid"] and start <= e["ts"] <= end:
+                    entry["patches"].append({
+                        "id": e["name"], "wall_ms": round(e["dur"] / 1000, 3),
+                        **{k: e["args"].get(k, 0) for k in COUNTERS}})
+                    break
+        total = {k: sum(f[k] for f in files) for k in COUNTERS}
+        total["wall_ms"] = round(sum(f["wall_ms"] for f in files), 3)
+        total["files"] = len(files)
+        return {"total": total, "files": files, "events": self.events}
+
+    def write(self):
+        if self.json_path:
+            with open(self.json_path, "w", encoding="utf-8") as f:
+                json.dump(self.summary(), f, indent=2)
+            print(f"trace: {self.json_path}", file=sys.stderr)
+        if self.chrome_path:
+            trace = [{"name": e["name"], "cat": e["cat"], "ph": "X", "ts": e["ts"],
+                      "dur": e["dur"], "pid": e["pid"], "tid": e["pid"], "args": e["args"]}
+                     for e in self.events]
+            with open(self.chrome_path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+            print(f"chrome trace: {self.chrome_path}", file=sys.stderr)
+
+
+TRACER: Optional[Tracer] = None
+
+
+def span(name: str, cat: str, **args):
+    """Context manager timing a block; a no-op unless tracing is enabled."""
+    if TRACER is None:
+        return nullcontext()
+    return TRACER.span(name, cat, **args)
+
+
+def count(key: str, n: int = 1):
+    if TRACER is not None:
+        TRACER.count(key, n)
+
+
+# ----------------------------------------------------------------------
+# setup
+# ----------------------------------------------------------------------
+def trace_paths(argv: Optional[Sequence[str]] = None):
+    """(json path, chrome path) from --trace[=FILE] / --chrome-trace=FILE or the env."""
+    json_path = os.environ.get("VPATCHES_TRACE") or None
+    chrome_path = os.environ.get("VPATCHES_CHROME_TRACE") or None
+    for arg in sys.argv[1:] if argv is None else argv:
+        if arg == "--trace":
+            json_path = "vpatches-trace.json"
+        elif arg.startswith("--trace="):
+            json_path = arg.split("=", 1)[1]
+        elif arg.startswith("--chrome-trace="):
+            chrome_path = arg.split("=", 1)[1]
+    return json_path, chrome_path
+
+
+def is_trace_arg(arg: str) -> bool:
+    return arg == "--trace" or arg.startswith(("--trace=", "--chrome-trace="))
+
+
+def enable(argv: Optional[Sequence[str]] = None) -> Optional[Tracer]:
+    """Turn tracing on if requested; idempotent. Output is written at exit."""
+    global TRACER
+    if TRACER is not None:
+        return TRACER
+    json_path, chrome_path = trace_paths(argv)
+    if not (json_path or chrome_path):
+        return None
+    TRACER = Tracer(json_path, chrome_path)
+    pid = os.getpid()
+    # forked workers inherit the handler; only the parent writes
+    atexit.register(lambda: TRACER.write() if os.getpid() == pid else None)
+    return TRACER
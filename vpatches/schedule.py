@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Dependency-ordered runner for the vpatches scripts.
+
+manifest.json lists every patch set (one script each) with the sets it
+requires, the files it touches and `done` markers: {"file", "contains"} or
+{"file", "lacks"} checks that together mean "this set is already applied".
+The scheduler
+
+  orders    the sets topologically; a level holds the sets whose
+            prerequisites all sit in earlier levels
+  runs      each level as one patchengine.run(), so independent sets are
+            patched together (files in parallel with -j) and every file is
+            read and written once per level
+  skips     sets whose done markers all hold, and everything depending on
+            a set that failed
+
+A script whose patches target a file not listed under `touches` is refused,
+so the manifest cannot silently drift from the code.
+
+With --dry-run the levels are merged into a single in-memory run (in
+topological order), since nothing is written for the next level to read.
+
+Usage:
+  python3 vpatches/schedule.py [-j N] [--base DIR] [--plan] [--dry-run[=diff|json]]
+                               [--trace[=FILE]] [--chrome-trace=FILE] [SET...]
+    SET     run only these sets and their prerequisites (default: all)
+    --plan  print the levels and which sets are already applied, then exit
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import patchtrace
+from patchengine import BASE, HERE, Patch, PatchError, dry_run_mode, load_patches, read, run
+
+MANIFEST = HERE / "manifest.json"
+
+
+def load_manifest(path: Path = MANIFEST) -> Dict[str, dict]:
+    sets = json.loads(path.read_text(encoding="utf-8"))["sets"]
+    for name, spec in sets.items():
+        for dep in spec.get("requires", []):
+            if dep not in sets:
+                raise PatchError(f"{name}: unknown prerequisite {dep}")
+    return sets
+
+
+def with_prerequisites(sets: Dict[str, dict], wanted: Iterable[str]) -> Set[str]:
+    out: Set[str] = set()
+    stack = list(wanted)
+    while stack:
+        name = stack.pop()
+        if name not in sets:
+            raise PatchError(f"unknown patch set: {name}")
+        if name not in out:
+            out.add(name)
+            stack.extend(sets[name].get("requires", []))
+    return out
+
+
+def levels(sets: Dict[str, dict], names: Set[str]) -> List[List[str]]:
+    """Kahn's algorithm; within a level, manifest order is kept."""
+    pending = {n: set(sets[n].get("requires", [])) & names for n in sets if n in names}
+    out: List[List[str]] = []
+    while pending:
+        level = [n for n, deps in pending.items() if not deps]
+        if not level:
+            raise PatchError(f"dependency cycle among: {', '.join(pending)}")
+        for n in level:
+            del pending[n]
+        for deps in pending.values():
+            deps.difference_update(level)
+        out.append(level)
+    return out
+
+
+def satisfied(spec: dict, base: Path, texts: Dict[Path, Optional[str]]) -> bool:
+    markers = spec.get("done", [])
+    if not markers:
+        return False
+    for m in markers:
+        path = base / m["file"]
+        if path not in texts:
+            texts[path] = read(path) if path.exists() else None
+        text = texts[path]
+        if text is None:
+            return False
+        if "contains" in m and m["contains"] not in text:
+            return False
+        if "lacks" in m and m["lacks"] in text:
+            return False
+    return True
+
+
+def load_sets(sets: Dict[str, dict], names: Iterable[str]) -> Dict[str, List[Patch]]:
+    """Import each set's script and check its targets against `touches`."""
+    out = {}
+    for name in names:
+        spec = sets[name]
+        patches = list(load_patches(spec["script"]))
+        undeclared = sorted({p.target for p in patches} - set(spec.get("touches", [])))
+        if undeclared:
+            raise PatchError(f"{name}: touches files missing from manifest: {', '.join(undeclared)}")
+        out[name] = patches
+    return out
+
+
+def schedule(sets: Dict[str, dict], wanted: Iterable[str] = (), base: Path = BASE,
+             jobs: Optional[int] = None, cache: bool = True,
+             dry_run: Optional[str] = None) -> Dict[str, str]:
+    """
+    Run the wanted sets (default: all) and their prerequisites. Returns
+    set -> "applied" | "done" (already applied) | "failed" | "blocked".
+    """
+    names = with_prerequisites(sets, wanted or sets)
+    plan = levels(sets, names)
+    patchsets = load_sets(sets, names)
+    log = sys.stderr if dry_run else sys.stdout
+    status: Dict[str, str] = {}
+    texts: Dict[Path, Optional[str]] = {}
+
+    batches: List[List[str]] = []
+    for i, level in enumerate(plan, 1):
+        todo = []
+        for name in level:
+            blocked = [d for d in sets[name].get("requires", [])
+                       if status.get(d) in ("failed", "blocked")]
+            missing = [p.target for p in patchsets[name]
+                       if p.required and not (base / p.target).exists()]
+            if blocked:
+                status[name] = "blocked"
+                print(f"⏭ {name}: blocked by {', '.join(blocked)}", file=log)
+            elif satisfied(sets[name], base, texts):
+                status[name] = "done"
+                print(f"• {name}: already applied", file=log)
+            elif missing:
+                status[name] = "failed"
+                print(f"❌ {name}: file not found: {missing[0]}", file=log)
+            else:
+                todo.append(name)
+        if not todo:
+            continue
+        if dry_run:
+            # nothing is written, so later levels must see earlier edits in memory
+            for name in todo:
+                status[name] = "applied"
+            if batches:
+                batches[0].extend(todo)
+            else:
+                batches.append(todo)
+            continue
+        _run_batch(todo, f"level {i}", patchsets, status, base, jobs, cache, dry_run)
+        batches.append(todo)
+        texts.clear()
+
+    if dry_run and batches:
+        _run_batch(batches[0], "all levels, in memory", patchsets, status, base, jobs, cache, dry_run)
+    return status
+
+
+def _run_batch(names: List[str], label: str, patchsets: Dict[str, List[Patch]],
+               status: Dict[str, str], base: Path,
+               jobs: Optional[int], cache: bool, dry_run: Optional[str]):
+    print(f"\n── {label}: {', '.join(names)}", file=sys.stderr if dry_run else sys.stdout)
+    patches = [p for name in names for p in patchsets[name]]
+    owner = {p.id: name for name in names for p in patchsets[name]}
+    results = run(patches, base=base, jobs=jobs, cache=cache, dry_run=dry_run)
+    for name in names:
+        status[name] = "applied"
+    for r in results:
+        for pid in r.failed:
+            status[owner[pid]] = "failed"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run vpatches scripts in dependency order.")
+    ap.add_argument("sets", nargs="*", metavar="SET")
+    ap.add_argument("-j", "--jobs", type=int, default=None)
+    ap.add_argument("--base", type=Path, default=BASE)
+    ap.add_argument("--manifest", type=Path, default=MANIFEST)
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--plan", action="store_true", help="show the order and exit")
+    dry_run = dry_run_mode()
+    args = ap.parse_args([a for a in sys.argv[1:]
+                          if not a.startswith("--dry-run") and not patchtrace.is_trace_arg(a)])
+    out = sys.stderr if dry_run else sys.stdout
+
+    try:
+        sets = load_manifest(args.manifest)
+        if args.plan:
+            texts: Dict[Path, Optional[str]] = {}
+            for i, level in enumerate(levels(sets, with_prerequisites(sets, args.sets or sets)), 1):
+                print(f"level {i}:")
+                for name in level:
+                    mark = "done" if satisfied(sets[name], args.base, texts) else "pending"
+                    print(f"  {name:<14} {mark:<8} {sets[name].get('description', '')}")
+            return
+        status = schedule(sets, args.sets, base=args.base, jobs=args.jobs,
+                          cache=not args.no_cache, dry_run=dry_run)
+    except PatchError as e:
+        print(f"\n❌ {e}", file=out)
+        sys.exit(1)
+
+    print("", file=out)
+    for name in sets:
+        if name in status:
+            print(f"  {name:<14} {status[name]}", file=out)
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+    print("✅ Done.", file=out)
+
+
+if __name__ == "__main__":
+    main()
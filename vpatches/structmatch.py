@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Structural anchor matching for patches.
+
+Patches used to look for 20-30 line literal strings and, when those missed
+by a single space, fall back to hand-written re.DOTALL regexes. Here both the
+file and the anchor are tokenized (whitespace and comments dropped, string
+literals kept whole, a trailing comma before a closing bracket ignored) and
+compared as token sequences:
+
+  find()     exact token match via KMP, linear in the file size; when that
+             fails, an approximate match around occurrences of the anchor's
+             rarest token, reported with a confidence in [0, 1]
+  balanced() extend a match to the bracket that closes the first one it
+             opens, e.g. `data class DnsBean (` ... `)`
+
+XML elements are addressed by id or name instead; see xmlres.py.
+
+Usage:
+  python3 vpatches/structmatch.py FILE ANCHOR_FILE
+    report where (and how confidently) ANCHOR_FILE's text occurs in FILE
+"""
+
+import bisect
+import re
+import sys
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import List, Optional
+
+_KOTLIN = re.compile(r'''
+    (?P<skip>//[^\n]*|/\*.*?\*/)
+  | (?P<str>"""(?:.|\n)*?"""+|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<tok>[A-Za-z_]\w*|\d[\w.]*|\S)
+''', re.S | re.X)
+
+_XML = re.compile(r'''
+    (?P<skip><!--.*?-->)
+  | (?P<str>"[^"]*"|'[^']*')
+  | (?P<tok>[A-Za-z_][\w-]*|\d[\w.]*|\S)
+''', re.S | re.X)
+
+_CLOSERS = {")": "(", "]": "[", "}": "{"}
+_OPENERS = {v: k for k, v in _CLOSERS.items()}
+
+
+@dataclass
+class Match:
+    start: int          # char offset of the first matched token
+    end: int            # char offset just past the last matched token
+    first: int          # token index range [first, last)
+    last: int
+    confidence: float
+
+    @property
+    def exact(self) -> bool:
+        return self.confidence == 1.0
+
+
+class Tokens:
+    """Token values with their char spans; built once per text."""
+
+    def __init__(self, text: str, lang: str = "kotlin"):
+        self.text = text
+        regex = _XML if lang == "xml" else _KOTLIN
+        raw = [(m.group(), m.start(), m.end())
+               for m in regex.finditer(text) if m.lastgroup != "skip"]
+        # normalize: drop trailing commas, `a,)` == `a)`
+        keep = [t for i, t in enumerate(raw)
+                if not (t[0] == "," and i + 1 < len(raw) and raw[i + 1][0] in _CLOSERS)]
+        self.values = [t[0] for t in keep]
+        self.starts = [t[1] for t in keep]
+        self.ends = [t[2] for t in keep]
+
+    def __len__(self):
+        return len(self.values)
+
+    def span(self, first: int, last: int) -> Match:
+        return Match(self.starts[first], self.ends[last - 1], first, last, 1.0)
+
+
+def _kmp(hay: List[str], needle: List[str], lo: int = 0, hi: Optional[int] = None) -> int:
+    hi = len(hay) if hi is None else hi
+    m = len(needle)
+    fail = [0] * m
+    k = 0
+    for i in range(1, m):
+        while k and needle[i] != needle[k]:
+            k = fail[k - 1]
+        if needle[i] == needle[k]:
+            k += 1
+        fail[i] = k
+    k = 0
+    for i in range(lo, hi):
+        while k and hay[i] != needle[k]:
+            k = fail[k - 1]
+        if hay[i] == needle[k]:
+            k += 1
+            if k == m:
+                return i - m + 1
+    return -1
+
+
+def find(tokens: Tokens, anchor: str, min_confidence: float = 0.9,
+         lo: int = 0, hi: Optional[int] = None, lang: str = "kotlin") -> Optional[Match]:
+    """
+    Locate `anchor` in tokens[lo:hi] (char offsets). Exact token matches
+    have confidence 1.0; below that the best approximate match is returned
+    if it reaches min_confidence.
+    """
+    needle = Tokens(anchor, lang).values
+    if not needle:
+        return None
+    tlo = _token_at(tokens, lo)
+    thi = len(tokens) if hi is None else _token_at(tokens, hi)
+    i = _kmp(tokens.values, needle, tlo, thi)
+    if i != -1:
+        return tokens.span(i, i + len(needle))
+    if min_confidence >= 1.0:
+        return None
+    return _approximate(tokens, needle, tlo, thi, min_confidence)
+
+
+def _token_at(tokens: Tokens, pos: int) -> int:
+    """Index of the first token starting at or after char offset pos."""
+    return bisect.bisect_left(tokens.starts, pos)
+
+
+def _approximate(tokens: Tokens, needle: List[str], tlo: int, thi: int,
+                 min_confidence: float) -> Optional[Match]:
+    hay = tokens.values
+    counts = {}
+    for v in hay[tlo:thi]:
+        counts[v] = counts.get(v, 0) + 1
+    # anchor on the rarest needle token that occurs at all
+    present = [(counts[v], k) for k, v in enumerate(needle) if v in counts]
+    if not present:
+        return None
+    _, k = min(present)
+    m = len(needle)
+    slack = max(2, m // 5)
+    best: Optional[Match] = None
+    for pos in range(tlo, thi):
+        if hay[pos] != needle[k]:
+            continue
+        w0 = max(tlo, pos - k - slack)
+        w1 = min(thi, pos - k + m + slack)
+        sm = SequenceMatcher(None, needle, hay[w0:w1], autojunk=False)
+        blocks = [b for b in sm.get_matching_blocks() if b.size]
+        if not blocks:
+            continue
+        first = w0 + blocks[0].b
+        last = w0 + blocks[-1].b + blocks[-1].size
+        matched = sum(b.size for b in blocks)
+        confidence = 2.0 * matched / (m + (last - first))
+        if best is None or confidence > best.confidence:
+            best = Match(tokens.starts[first], tokens.ends[last - 1], first, last, confidence)
+    if best is None or best.confidence < min_confidence:
+        return None
+    return best
+
+
+def balanced(tokens: Tokens, match: Match) -> Optional[Match]:
+    """
+    Extend match to the bracket closing the first bracket opened inside it,
+    e.g. a match of `data class DnsBean (` grows to cover the whole `( ... )`.
+    """
+    opener = next((j for j in range(match.first, match.last)
+                   if tokens.values[j] in _OPENERS), None)
+    if opener is None:
+        return None
+    stack = []
+    for j in range(opener, len(tokens)):
+        v = tokens.values[j]
+        if v in _OPENERS:
+            stack.append(v)
+        elif v in _CLOSERS:
+            if not stack or stack[-1] != _CLOSERS[v]:
+                return None
+            stack.pop()
+            if not stack:
+                return Match(match.start, tokens.ends[j], match.first, j + 1, match.confidence)
+    return None
+
+
+def line_start(text: str, pos: int) -> int:
+    return text.rfind("\n", 0, pos) + 1
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__.strip())
+        sys.exit(2)
+    path = Path(sys.argv[1])
+    lang = "xml" if path.suffix == ".xml" else "kotlin"
+    text = path.read_text(encoding="utf-8")
+    anchor = Path(sys.argv[2]).read_text(encoding="utf-8")
+    m = find(Tokens(text, lang), anchor, min_confidence=0.0, lang=lang)
+    if m is None:
+        print("no match")
+        sys.exit(1)
+    line = text.count("\n", 0, m.start) + 1
+    print(f"lines {line}-{text.count(chr(10), 0, m.end) + 1}, confidence {m.confidence:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,10 @@
 Mini-patch: mirrors DHR60/v2rayNG@4ce36c0 ("Revert 'Improve DNS, try fix'")
 https://github.com/DHR60/v2rayNG/commit/4ce36c076237c6e08be03c5a652f320559a2ebe6
 
-Run this AFTER patch_fixed.py, against the same V2rayNG/ checkout it already
-patched. Do not run it on its own.
+Run this AFTER the DNS-toggle patch (patch_fixed.py, or unified1.py here),
+against the same V2rayNG/ checkout it already patched. Do not run it on its
+own; `python3 vpatches/schedule.py unified` runs its prerequisites first
+(see manifest.json).
 
 What the upstream commit does: it removes the configContext/routingDomainRules
 based DNS path that "Improve DNS, try fix" had introduced -
@@ -25,24 +27,9 @@ patch_fixed.py already used, just re-anchored.
 Idempotent: safe to run twice.
 """
 
-import shutil
-from pathlib import Path
-from datetime import datetime
+from patchengine import Document, PatchSet, run
 
-BASE = Path("V2rayNG")
-
-def backup_kotlin(p: Path):
-    if p.suffix == ".kt":
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        bak = p.with_suffix(f".kt.bak.{ts}")
-        shutil.copy2(p, bak)
-        print(f"  backup: {bak.name}")
-
-def read(p):
-    return p.read_text(encoding="utf-8")
-
-def write(p, s):
-    p.write_text(s, encoding="utf-8")
+PATCHES = PatchSet("unified")
 
 
 # ----------------------------------------------------------------------
@@ -50,35 +37,30 @@ def write(p, s):
 #    configContext-based one + its 3 helpers, carry the DNS-toggle wiring
 #    over, and switch configureLocalDns back to the non-configContext form.
 # ----------------------------------------------------------------------
-def revert_coreconfigmanager():
-    p = BASE / "app/src/main/java/com/v2ray/ang/core/CoreConfigManager.kt"
-    if not p.exists():
-        print("✗ CoreConfigManager.kt not found — skipping")
-        return
-    c = read(p)
+@PATCHES.patch("coreconfigmanager-dns-revert", "app/src/main/java/com/v2ray/ang/core/CoreConfigManager.kt")
+def revert_coreconfigmanager(doc: Document):
+    c = doc.text
 
     if "private fun configureDns(\n        v2rayConfig: V2rayConfig," in c and \
        "private fun configureDns(\n        configContext: CoreConfigContext," not in c:
-        print("• CoreConfigManager: DNS revert already applied, skipping")
+        doc.log("• CoreConfigManager: DNS revert already applied, skipping")
         return
 
-    backup_kotlin(p)
-
     # --- call site: drop configContext from both calls ---
     old_call = "configureDns(configContext, v2rayConfig, policyGroupBalancerTags)\n        configureLocalDns(configContext, v2rayConfig)"
     new_call = "configureDns(v2rayConfig, policyGroupBalancerTags)\n        configureLocalDns(v2rayConfig)"
     if old_call in c:
         c = c.replace(old_call, new_call, 1)
-        print("✓ CoreConfigManager: updated buildUnifiedConfig call site")
+        doc.log("✓ CoreConfigManager: updated buildUnifiedConfig call site")
     else:
-        print("⚠ CoreConfigManager: configureDns/configureLocalDns call site not found as expected")
+        doc.log("⚠ CoreConfigManager: configureDns/configureLocalDns call site not found as expected")
 
     # --- configureLocalDns: signature + domain collection ---
     old_sig = "private fun configureLocalDns(configContext: CoreConfigContext, v2rayConfig: V2rayConfig) {"
     new_sig = "private fun configureLocalDns(v2rayConfig: V2rayConfig) {"
     if old_sig in c:
         c = c.replace(old_sig, new_sig, 1)
-        print("✓ CoreConfigManager: updated configureLocalDns signature")
+        doc.log("✓ CoreConfigManager: updated configureLocalDns signature")
 
     old_domains = '''val geositeCn = arrayListOf(AppConfig.GEOSITE_CN)
             val routingDomains = configContext.routingDomainRules
@@ -94,9 +76,9 @@ def revert_coreconfigmanager():
             val finalDomain = geositeCn.plus(proxyDomain).plus(directDomain).distinct()'''
     if old_domains in c:
         c = c.replace(old_domains, new_domains, 1)
-        print("✓ CoreConfigManager: configureLocalDns now collects domains via collectUserRuleDomainsByTag")
+        doc.log("✓ CoreConfigManager: configureLocalDns now collects domains via collectUserRuleDomainsByTag")
     else:
-        print("⚠ CoreConfigManager: configureLocalDns domain-collection block not found as expected")
+        doc.log("⚠ CoreConfigManager: configureLocalDns domain-collection block not found as expected")
 
     # --- revive the old configureDns, delete the configContext-based one + its 3 helpers ---
     dead_open_anchor = (
@@ -110,12 +92,12 @@ def revert_coreconfigmanager():
     )
     dead_open_idx = c.find(dead_open_anchor)
     if dead_open_idx == -1:
-        print("⚠ CoreConfigManager: commented-out configureDns(v2rayConfig, ...) not found — already reverted, or source has drifted")
+        doc.log("⚠ CoreConfigManager: commented-out configureDns(v2rayConfig, ...) not found — already reverted, or source has drifted")
     else:
         transition_idx = c.find(transition_anchor, dead_open_idx)
         end_idx = c.find("\n\n    //endregion", transition_idx) if transition_idx != -1 else -1
         if transition_idx == -1 or end_idx == -1:
-            print("⚠ CoreConfigManager: could not locate the end of the configContext-based DNS block — source has drifted, check manually")
+            doc.log("⚠ CoreConfigManager: could not locate the end of the configContext-based DNS block — source has drifted, check manually")
         else:
             dead_body = c[dead_open_idx + len(dead_open_anchor): transition_idx]
 
@@ -138,9 +120,9 @@ def revert_coreconfigmanager():
         )'''
             if old_dns_construction in dead_body:
                 dead_body = dead_body.replace(old_dns_construction, new_dns_construction, 1)
-                print("✓ CoreConfigManager: carried DNS parallel-query/serve-stale wiring into the revived configureDns")
+                doc.log("✓ CoreConfigManager: carried DNS parallel-query/serve-stale wiring into the revived configureDns")
             else:
-                print("⚠ CoreConfigManager: DnsBean construction not found in the revived body — DNS toggle wiring NOT carried over, check manually")
+                doc.log("⚠ CoreConfigManager: DnsBean construction not found in the revived body — DNS toggle wiring NOT carried over, check manually")
 
             revived_function = (
                 "\n    /**\n     * Configure DNS servers, hosts, and DNS routing rules.\n     */\n"
@@ -148,83 +130,69 @@ def revert_coreconfigmanager():
                 "        policyGroupBalancerTags: Map<String, String>,\n    ) {" + dead_body
             )
             c = c[:dead_open_idx] + revived_function + c[end_idx:]
-            print("✓ CoreConfigManager: revived configureDns(v2rayConfig, policyGroupBalancerTags) and removed the configContext-based DNS block (+3 helpers)")
+            doc.log("✓ CoreConfigManager: revived configureDns(v2rayConfig, policyGroupBalancerTags) and removed the configContext-based DNS block (+3 helpers)")
 
-    write(p, c)
+    doc.text = c
 
 
 # ----------------------------------------------------------------------
 # 2. CoreConfigContextBuilder.kt - stop collecting/passing routingDomainRules
 # ----------------------------------------------------------------------
-def revert_coreconfigcontextbuilder():
-    p = BASE / "app/src/main/java/com/v2ray/ang/core/CoreConfigContextBuilder.kt"
-    if not p.exists():
-        print("✗ CoreConfigContextBuilder.kt not found — skipping")
-        return
-    c = read(p)
+@PATCHES.patch("coreconfigcontextbuilder-dns-revert", "app/src/main/java/com/v2ray/ang/core/CoreConfigContextBuilder.kt")
+def revert_coreconfigcontextbuilder(doc: Document):
+    c = doc.text
 
     if "collectRoutingDomainRulesForDns" not in c:
-        print("• CoreConfigContextBuilder: DNS revert already applied, skipping")
+        doc.log("• CoreConfigContextBuilder: DNS revert already applied, skipping")
         return
 
     old_build_lines = "        val routingDomainRules = collectRoutingDomainRulesForDns()\n\n        return CoreConfigContext("
     new_build_lines = "        return CoreConfigContext("
     if old_build_lines in c:
         c = c.replace(old_build_lines, new_build_lines, 1)
-        print("✓ CoreConfigContextBuilder: stopped collecting routingDomainRules in build()")
+        doc.log("✓ CoreConfigContextBuilder: stopped collecting routingDomainRules in build()")
     else:
-        print("⚠ CoreConfigContextBuilder: routingDomainRules collection line not found as expected")
+        doc.log("⚠ CoreConfigContextBuilder: routingDomainRules collection line not found as expected")
 
     old_arg = "            routingDomainRules = routingDomainRules,\n"
     if old_arg in c:
         c = c.replace(old_arg, "", 1)
-        print("✓ CoreConfigContextBuilder: stopped passing routingDomainRules into CoreConfigContext(...)")
+        doc.log("✓ CoreConfigContextBuilder: stopped passing routingDomainRules into CoreConfigContext(...)")
     else:
-        print("⚠ CoreConfigContextBuilder: routingDomainRules argument not found as expected")
+        doc.log("⚠ CoreConfigContextBuilder: routingDomainRules argument not found as expected")
 
     method_start = c.find("    /**\n     * Collect enabled routing domain rules in original order for DNS segmentation.")
     if method_start != -1:
-        open_brace = c.find("private fun collectRoutingDomainRulesForDns", method_start)
-        open_brace = c.find('{', open_brace)
-        brace_count = 1
-        i = open_brace + 1
-        while i < len(c) and brace_count > 0:
-            if c[i] == '{':
-                brace_count += 1
-            elif c[i] == '}':
-                brace_count -= 1
-            i += 1
-        if brace_count == 0:
-            c = c[:method_start] + c[i:]
-            print("✓ CoreConfigContextBuilder: removed collectRoutingDomainRulesForDns()")
+        doc.text = c
+        fn = doc.kotlin.function("collectRoutingDomainRulesForDns")
+        if fn is not None and fn.start > method_start:
+            c = c[:method_start] + c[fn.end:]
+            doc.log("✓ CoreConfigContextBuilder: removed collectRoutingDomainRulesForDns()")
         else:
-            print("⚠ CoreConfigContextBuilder: brace mismatch removing collectRoutingDomainRulesForDns — check manually")
+            doc.log("⚠ CoreConfigContextBuilder: could not delimit collectRoutingDomainRulesForDns — check manually")
     else:
-        print("⚠ CoreConfigContextBuilder: collectRoutingDomainRulesForDns() not found as expected")
+        doc.log("⚠ CoreConfigContextBuilder: collectRoutingDomainRulesForDns() not found as expected")
 
-    write(p, c)
+    doc.text = c
 
 
 # ----------------------------------------------------------------------
 # 3. CoreConfigContext.kt - drop the routingDomainRules field + nested type
 # ----------------------------------------------------------------------
-def revert_coreconfigcontext():
-    p = BASE / "app/src/main/java/com/v2ray/ang/dto/CoreConfigContext.kt"
-    if not p.exists():
-        print("✗ CoreConfigContext.kt not found — skipping")
-        return
-    c = read(p)
+@PATCHES.patch("coreconfigcontext-dns-revert", "app/src/main/java/com/v2ray/ang/dto/CoreConfigContext.kt")
+def revert_coreconfigcontext(doc: Document):
+    c = doc.text
 
     if "routingDomainRules" not in c:
-        print("• CoreConfigContext: DNS revert already applied, skipping")
+        doc.log("• CoreConfigContext: DNS revert already applied, skipping")
         return
 
     old_field = "    val routingDomainRules: List<RoutingDomainRule> = emptyList(),\n"
     if old_field in c:
         c = c.replace(old_field, "", 1)
-        print("✓ CoreConfigContext: removed routingDomainRules field")
+        doc.log("✓ CoreConfigContext: removed routingDomainRules field")
     else:
-        print("⚠ CoreConfigContext: routingDomainRules field not found as expected")
+        doc.log("⚠ CoreConfigContext: routingDomainRules field not found as expected")
 
     old_nested_type = '''
     data class RoutingDomainRule(
@@ -234,11 +202,11 @@ def revert_coreconfigcontext():
 '''
     if old_nested_type in c:
         c = c.replace(old_nested_type, "", 1)
-        print("✓ CoreConfigContext: removed RoutingDomainRule data class")
+        doc.log("✓ CoreConfigContext: removed RoutingDomainRule data class")
     else:
-        print("⚠ CoreConfigContext: RoutingDomainRule data class not found as expected")
+        doc.log("⚠ CoreConfigContext: RoutingDomainRule data class not found as expected")
 
-    write(p, c)
+    doc.text = c
 
 
 def main():
@@ -246,9 +214,7 @@ def main():
     print("Mini-patch: revert configContext-based DNS (mirrors DHR60@4ce36c0)")
     print("Run after patch_fixed.py, on the same checkout")
     print("=" * 70)
-    revert_coreconfigmanager()
-    revert_coreconfigcontextbuilder()
-    revert_coreconfigcontext()
+    run(PATCHES)
     print("\n✅ Done.")
     print("👉 Rebuild and test.")
 
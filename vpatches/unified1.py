@@ -8,43 +8,29 @@ Minimal v2rayNG patcher – only:
 Skips: CURRENT_SERVER / chain helpers, custom outbound injection,
        DHR60 configContext DNS revert, etc.
 
-Idempotent.
+Idempotent. Patches are declared on PATCHES and applied by patchengine,
+one read/write per file.
 """
 
 import re
 import sys
-import shutil
-from pathlib import Path
-from datetime import datetime
 
-BASE = Path("V2rayNG")
+from patchengine import Document, PatchError, PatchSet, run
+from structmatch import Tokens, line_start
+from xmlres import add_resources
 
-def backup_kotlin(p: Path):
-    if p.suffix == ".kt":
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        bak = p.with_suffix(f".kt.bak.{ts}")
-        shutil.copy2(p, bak)
-        print(f"  backup: {bak.name}")
-
-def read(p):
-    return p.read_text(encoding="utf-8")
-
-def write(p, s):
-    p.write_text(s, encoding="utf-8")
+PATCHES = PatchSet("unified1")
 
 
 # ----------------------------------------------------------------------
 # 1. AppConfig.kt – DNS prefs only
 # ----------------------------------------------------------------------
-def patch_appconfig():
-    p = BASE / "app/src/main/java/com/v2ray/ang/AppConfig.kt"
-    if not p.exists():
-        print("✗ AppConfig.kt not found")
-        return
-    c = read(p)
+@PATCHES.patch("appconfig-dns-prefs", "app/src/main/java/com/v2ray/ang/AppConfig.kt")
+def patch_appconfig(doc: Document):
+    c = doc.text
 
     if "PREF_DNS_PARALLEL_QUERY" in c and "PREF_DNS_SERVE_STALE" in c:
-        print("• AppConfig: DNS prefs already present")
+        doc.log("• AppConfig: DNS prefs already present")
         return
 
     old = '    const val PREF_DNS_HOSTS = "pref_dns_hosts"'
@@ -53,155 +39,91 @@ def patch_appconfig():
     const val PREF_DNS_SERVE_STALE = "pref_dns_serve_stale"'''
     if old in c:
         c = c.replace(old, new, 1)
-        print("✓ AppConfig: added PREF_DNS_PARALLEL_QUERY + PREF_DNS_SERVE_STALE")
+        doc.log("✓ AppConfig: added PREF_DNS_PARALLEL_QUERY + PREF_DNS_SERVE_STALE")
     else:
-        print("⚠ AppConfig: PREF_DNS_HOSTS not found, skipping DNS prefs")
+        doc.log("⚠ AppConfig: PREF_DNS_HOSTS not found, skipping DNS prefs")
         return
-    write(p, c)
+    doc.text = c
 
 
 # ----------------------------------------------------------------------
 # 2. V2rayConfig.kt – add serveStale to DnsBean
 # ----------------------------------------------------------------------
-def patch_v2rayconfig():
-    p = BASE / "app/src/main/java/com/v2ray/ang/dto/V2rayConfig.kt"
-    if not p.exists():
-        print("✗ V2rayConfig.kt not found")
-        return
-    c = read(p)
+@PATCHES.patch("v2rayconfig-serve-stale", "app/src/main/java/com/v2ray/ang/dto/V2rayConfig.kt")
+def patch_v2rayconfig(doc: Document):
+    c = doc.text
     if "var serveStale" in c or "val serveStale" in c:
-        print("• V2rayConfig: serveStale already present")
+        doc.log("• V2rayConfig: serveStale already present")
         return
 
-    old_dns = '''data class DnsBean(
-        var servers: ArrayList<Any>? = null,
-        var hosts: Map<String, Any>? = null,
-        val clientIp: String? = null,
-        val disableCache: Boolean? = null,
-        val queryStrategy: String? = null,
-        val enableParallelQuery: Boolean? = null,
-        val tag: String? = null
-    )'''
-    new_dns = '''data class DnsBean(
-        var servers: ArrayList<Any>? = null,
-        var hosts: Map<String, Any>? = null,
-        val clientIp: String? = null,
-        val disableCache: Boolean? = null,
-        val queryStrategy: String? = null,
-        val enableParallelQuery: Boolean? = null,
-        val tag: String? = null,
-        var serveStale: Boolean? = null
-    )'''
-    if old_dns in c:
-        c = c.replace(old_dns, new_dns, 1)
-        print("✓ V2rayConfig: added serveStale to DnsBean")
+    m = doc.find("data class DnsBean(", min_confidence=1.0)
+    decl = doc.balanced(m) if m else None
+    if decl is None:
+        doc.log("⚠ V2rayConfig: DnsBean not found, skipping")
+        return
+    # append after the last parameter, keeping its indentation and any
+    # trailing comma style
+    last = doc.tokens.ends[decl.last - 2]
+    indent = re.match(r"[ \t]*", c[line_start(c, last):]).group()
+    rest = c[last:decl.end - 1]
+    if rest.lstrip().startswith(","):
+        last = c.index(",", last) + 1
+        field = f"\n{indent}var serveStale: Boolean? = null,"
     else:
-        # more tolerant match
-        m = re.search(
-            r'data class DnsBean\s*\(\s*'
-            r'var servers:.*?'
-            r'val enableParallelQuery: Boolean\? = null,\s*'
-            r'val tag: String\? = null\s*'
-            r'\)',
-            c, re.DOTALL
-        )
-        if m:
-            replacement = m.group(0).rstrip()[:-1] + ',\n        var serveStale: Boolean? = null\n    )'
-            c = c[:m.start()] + replacement + c[m.end():]
-            print("✓ V2rayConfig: added serveStale (regex)")
-        else:
-            print("⚠ V2rayConfig: DnsBean not found, skipping")
-            return
-    write(p, c)
+        field = f",\n{indent}var serveStale: Boolean? = null"
+    c = c[:last] + field + c[last:]
+    doc.log("✓ V2rayConfig: added serveStale to DnsBean")
+    doc.text = c
 
 
 # ----------------------------------------------------------------------
 # 3. strings.xml – only the two DNS strings
 # ----------------------------------------------------------------------
-def patch_strings():
-    p = BASE / "app/src/main/res/values/strings.xml"
-    if not p.exists():
-        print("✗ strings.xml not found")
-        return
-    c = read(p)
-
+@PATCHES.patch("strings-dns", "app/src/main/res/values/strings.xml")
+def patch_strings(doc: Document):
     needed = {
         "title_pref_dns_parallel_query": "DNS Parallel Query",
         "summary_pref_dns_parallel_query": "Enable parallel queries to all DNS servers for faster resolution",
         "title_pref_dns_serve_stale": "DNS Serve Stale",
         "summary_pref_dns_serve_stale": "Serve stale DNS records while refreshing in background",
     }
-    new_strings = []
-    for k, v in needed.items():
-        if f'name="{k}"' in c:
-            continue
-        new_strings.append(f'    <string name="{k}">{v}</string>')
-
-    if not new_strings:
-        print("• strings.xml: DNS strings already present")
+    try:
+        added = add_resources(doc, needed)
+    except ValueError:
+        doc.log("⚠ strings.xml: </resources> not found")
         return
-
-    m = re.search(r'(\s*)</resources>', c, re.IGNORECASE)
-    if m:
-        indent, pos = m.group(1), m.start()
-        insertion = "\n" + "\n".join(new_strings) + "\n" + indent
-        c = c[:pos] + insertion + c[pos:]
-        write(p, c)
-        print(f"✓ strings.xml: added {len(new_strings)} DNS strings")
+    if added:
+        doc.log(f"✓ strings.xml: added {len(added)} DNS strings")
     else:
-        print("⚠ strings.xml: </resources> not found")
+        doc.log("• strings.xml: DNS strings already present")
 
 
 # ----------------------------------------------------------------------
 # 4. CoreConfigManager.kt – wire prefs into whichever configureDns is live
 # ----------------------------------------------------------------------
-def patch_coreconfigmanager_dns():
-    p = BASE / "app/src/main/java/com/v2ray/ang/core/CoreConfigManager.kt"
-    if not p.exists():
-        print("✗ CoreConfigManager.kt not found")
-        return
-    c = read(p)
+@PATCHES.patch("coreconfigmanager-dns-prefs", "app/src/main/java/com/v2ray/ang/core/CoreConfigManager.kt")
+def patch_coreconfigmanager_dns(doc: Document):
+    c = doc.text
 
     # Prefer the live configContext-based one; fall back to the plain one
-    live_sig = "private fun configureDns(\n        configContext: CoreConfigContext,"
-    plain_sig = "private fun configureDns(\n        v2rayConfig: V2rayConfig,"
-
-    method_start = c.find(live_sig)
-    if method_start == -1:
-        method_start = c.find(plain_sig)
-        if method_start == -1:
-            print("⚠ CoreConfigManager: no configureDns found")
+    index = doc.kotlin
+    fn = index.function("configureDns", "configContext: CoreConfigContext,")
+    if fn is None:
+        fn = index.function("configureDns", "v2rayConfig: V2rayConfig,")
+        if fn is None:
+            doc.log("⚠ CoreConfigManager: no configureDns found")
             return
-        print("• CoreConfigManager: using plain configureDns(v2rayConfig, …)")
+        doc.log("• CoreConfigManager: using plain configureDns(v2rayConfig, …)")
     else:
-        print("• CoreConfigManager: using live configureDns(configContext, …)")
+        doc.log("• CoreConfigManager: using live configureDns(configContext, …)")
 
-    open_brace = c.find('{', method_start)
-    if open_brace == -1:
-        print("⚠ CoreConfigManager: no opening brace for configureDns")
-        return
-
-    brace_count = 1
-    i = open_brace + 1
-    while i < len(c) and brace_count > 0:
-        if c[i] == '{':
-            brace_count += 1
-        elif c[i] == '}':
-            brace_count -= 1
-        i += 1
-    if brace_count != 0:
-        print("⚠ CoreConfigManager: brace mismatch in configureDns")
-        return
-
-    method_end = i
+    method_start, method_end = fn.start, fn.end
     method_body = c[method_start:method_end]
 
     if "PREF_DNS_PARALLEL_QUERY" in method_body and "PREF_DNS_SERVE_STALE" in method_body:
-        print("• CoreConfigManager: DNS prefs already wired")
+        doc.log("• CoreConfigManager: DNS prefs already wired")
         return
 
-    backup_kotlin(p)
-
     old_dns_construction = '''v2rayConfig.dns = V2rayConfig.DnsBean(
             servers = servers,
             hosts = hosts,
@@ -219,41 +141,20 @@ def patch_coreconfigmanager_dns():
             serveStale = if (dnsServeStaleEnabled) true else null
         )'''
 
-    if old_dns_construction in method_body:
-        new_method_body = method_body.replace(old_dns_construction, new_dns_construction, 1)
-        c = c[:method_start] + new_method_body + c[method_end:]
-        print("✓ CoreConfigManager: wired PREF_DNS_PARALLEL_QUERY + PREF_DNS_SERVE_STALE")
-    else:
-        # looser regex
-        pat = re.compile(
-            r'v2rayConfig\.dns\s*=\s*V2rayConfig\.DnsBean\s*\(\s*'
-            r'servers\s*=\s*servers\s*,\s*'
-            r'hosts\s*=\s*hosts\s*,\s*'
-            r'tag\s*=\s*AppConfig\.TAG_DNS\s*,\s*'
-            r'enableParallelQuery\s*=\s*if\s*\(\(domesticDns\.size\s*\+\s*remoteDns\.size\)\s*>\s*2\)\s*true\s*else\s*null\s*'
-            r'\)',
-            re.DOTALL
-        )
-        if pat.search(method_body):
-            new_method_body = pat.sub(new_dns_construction.strip(), method_body, count=1)
-            c = c[:method_start] + new_method_body + c[method_end:]
-            print("✓ CoreConfigManager: wired via regex")
-        else:
-            print("⚠ CoreConfigManager: DnsBean construction not found inside configureDns")
-            return
-
-    write(p, c)
+    m = doc.find(old_dns_construction, min_confidence=1.0, lo=method_start, hi=method_end)
+    if m is None:
+        doc.log("⚠ CoreConfigManager: DnsBean construction not found inside configureDns")
+        return
+    doc.replace_span(m.start, m.end, new_dns_construction)
+    doc.log("✓ CoreConfigManager: wired PREF_DNS_PARALLEL_QUERY + PREF_DNS_SERVE_STALE")
 
 
 # ----------------------------------------------------------------------
 # 5. SettingsActivity.kt – the two switches
 # ----------------------------------------------------------------------
-def patch_settings():
-    p = BASE / "app/src/main/java/com/v2ray/ang/ui/settings/SettingsActivity.kt"
-    if not p.exists():
-        print("✗ SettingsActivity.kt not found")
-        return
-    c = read(p)
+@PATCHES.patch("settings-dns-switches", "app/src/main/java/com/v2ray/ang/ui/settings/SettingsActivity.kt")
+def patch_settings(doc: Document):
+    c = doc.text
 
     # state declarations
     old_decls = 'var dnsHosts by rememberMmkvString(AppConfig.PREF_DNS_HOSTS, "")'
@@ -261,16 +162,16 @@ def patch_settings():
     var dnsParallelQuery by rememberMmkvBool(AppConfig.PREF_DNS_PARALLEL_QUERY, false)
     var dnsServeStale by rememberMmkvBool(AppConfig.PREF_DNS_SERVE_STALE, false)"""
     if "dnsParallelQuery" in c:
-        print("• SettingsActivity: DNS states already present")
+        doc.log("• SettingsActivity: DNS states already present")
     elif old_decls in c:
         c = c.replace(old_decls, new_decls, 1)
-        print("✓ SettingsActivity: added DNS parallel/stale state")
+        doc.log("✓ SettingsActivity: added DNS parallel/stale state")
     else:
-        print("⚠ SettingsActivity: dnsHosts declaration not found")
+        doc.log("⚠ SettingsActivity: dnsHosts declaration not found")
 
     # UI switches
     if "title_pref_dns_parallel_query" in c:
-        print("• SettingsActivity: switches already present")
+        doc.log("• SettingsActivity: switches already present")
     else:
         pattern = r'(SettingsEditItem\(\s*title = stringResource\(R\.string\.title_pref_dns_hosts\),\s*value = dnsHosts,\s*onValueChanged = \{ dnsHosts = it \}\s*\))'
         replacement = r'''\1
@@ -286,30 +187,27 @@ def patch_settings():
                     checked = dnsServeStale,
                     onCheckedChange = { dnsServeStale = it }
                 )'''
-        new_c, n = re.subn(pattern, replacement, c, flags=re.DOTALL)
-        if n:
-            c = new_c
-            print("✓ SettingsActivity: inserted DNS parallel/stale switches")
+        doc.text = c
+        if doc.sub(pattern, replacement, flags=re.DOTALL):
+            c = doc.text
+            doc.log("✓ SettingsActivity: inserted DNS parallel/stale switches")
         else:
-            print("⚠ SettingsActivity: dnsHosts SettingsEditItem block not found")
+            doc.log("⚠ SettingsActivity: dnsHosts SettingsEditItem block not found")
 
-    write(p, c)
+    doc.text = c
 
 
 # ----------------------------------------------------------------------
 # 6. FormFields.kt – typed filter + 50-item hard cap (no LazyColumn)
 # ----------------------------------------------------------------------
-def patch_formfields():
+@PATCHES.patch("formfields-dropdown-filter", "app/src/main/java/com/v2ray/ang/ui/compose/FormFields.kt")
+def patch_formfields(doc: Document):
     """
     Keep the plain Column that ExposedDropdownMenu requires (LazyColumn
     crashes on intrinsic measurement). Bound what it renders by filtering
     on typed text + a hard cap of 50.
     """
-    p = BASE / "app/src/main/java/com/v2ray/ang/ui/compose/FormFields.kt"
-    if not p.exists():
-        print("✗ FormFields.kt not found")
-        return
-    c = read(p)
+    c = doc.text
 
     # drop any leftover lazy imports from a previous attempt
     for stale in (
@@ -323,23 +221,23 @@ def patch_formfields():
         "import androidx.compose.foundation.layout.heightIn",
         "import androidx.compose.runtime.remember",
     ]
-    last_import = re.search(r'^import .*$', c, re.MULTILINE)
+    doc.text = c
+    last_import = doc.search(r'^import .*$', re.MULTILINE)
     if last_import:
         pos = last_import.end()
         missing = [imp for imp in needed_imports if imp not in c]
         if missing:
             c = c[:pos] + "\n" + "\n".join(missing) + c[pos:]
-            print(f"✓ FormFields: added {len(missing)} import(s)")
+            doc.log(f"✓ FormFields: added {len(missing)} import(s)")
+
+    doc.text = c
 
-    # state: filtered + capped list
-    old_state = '''    var expanded by rememberSaveable { mutableStateOf(false) }
+    # state: filtered + capped list, added after the dropdown's local state
+    state_anchor = '''var expanded by rememberSaveable { mutableStateOf(false) }
     val menuScrollState = rememberScrollState()
     val focusManager = LocalFocusManager.current
     val keyboardController = LocalSoftwareKeyboardController.current'''
-    new_state = '''    var expanded by rememberSaveable { mutableStateOf(false) }
-    val menuScrollState = rememberScrollState()
-    val focusManager = LocalFocusManager.current
-    val keyboardController = LocalSoftwareKeyboardController.current
+    new_state = '''
 
     // ExposedDropdownMenu can't host a LazyColumn (intrinsic measurement).
     // Keep the plain Column, filter by typed text, hard-cap at 50.
@@ -351,15 +249,18 @@ def patch_formfields():
         }
         if (base.size > 50) base.take(50) else base
     }'''
-    if "val visibleOptions = remember" in c:
-        print("• FormFields: filtered/capped options already present")
-    elif old_state in c:
-        c = c.replace(old_state, new_state, 1)
-        print("✓ FormFields: added typed-text filtering + 50-item cap")
+    if "val visibleOptions = remember" in doc.text:
+        doc.log("• FormFields: filtered/capped options already present")
     else:
-        print("⚠ FormFields: state block not found")
+        m = doc.find(state_anchor, min_confidence=1.0)
+        if m is None:
+            doc.log("⚠ FormFields: state block not found")
+        else:
+            doc.replace_span(m.end, m.end, new_state)
+            doc.log("✓ FormFields: added typed-text filtering + 50-item cap")
 
-    # menu content
+    # menu content: the whole `ExposedDropdownMenu(...) { ... }` call, but
+    # only when it is one of the two versions this patch knows
     pristine_menu = '''        ExposedDropdownMenu(
             expanded = expanded,
             onDismissRequest = { expanded = false },
@@ -427,18 +328,38 @@ def patch_formfields():
             }
         }'''
 
-    if "visibleOptions.forEach" in c:
-        print("• FormFields: dropdown menu already updated")
-    elif pristine_menu in c:
-        c = c.replace(pristine_menu, new_menu, 1)
-        print("✓ FormFields: dropdown now uses filtered/capped list")
-    elif lazy_menu_from_v1 in c:
-        c = c.replace(lazy_menu_from_v1, new_menu, 1)
-        print("↺ FormFields: reverted LazyColumn attempt → filtering")
-    else:
-        print("⚠ FormFields: ExposedDropdownMenu block not found")
-
-    write(p, c)
+    if "visibleOptions.forEach" in doc.text:
+        doc.log("• FormFields: dropdown menu already updated")
+        return
+    known = {
+        tuple(Tokens(pristine_menu).values): "✓ FormFields: dropdown now uses filtered/capped list",
+        tuple(Tokens(lazy_menu_from_v1).values): "↺ FormFields: reverted LazyColumn attempt → filtering",
+    }
+    tokens = doc.tokens
+    calls = 0
+    pos = 0
+    while True:
+        m = doc.find("ExposedDropdownMenu(", min_confidence=1.0, lo=pos)
+        if m is None:
+            break
+        pos = m.end
+        args = doc.balanced(m)
+        if args is None or args.last >= len(tokens) or tokens.values[args.last] != "{":
+            continue
+        lam = doc.balanced(tokens.span(args.last, args.last + 1))
+        if lam is None:
+            continue
+        calls += 1
+        ok = known.get(tuple(tokens.values[m.first:lam.last]))
+        if ok is not None:
+            doc.replace_span(m.start, lam.end, new_menu)
+            doc.log(ok)
+            return
+    if not calls:
+        doc.log("⚠ FormFields: ExposedDropdownMenu block not found")
+        return
+    raise PatchError(f"FormFields: {calls} ExposedDropdownMenu call(s), none matches "
+                     "the pristine or the LazyColumn menu; not replacing")
 
 
 # ----------------------------------------------------------------------
@@ -449,12 +370,7 @@ def main():
     print("Minimal patcher: DNS Parallel/Serve-Stale + FormFields dropdowns")
     print("=" * 70)
     try:
-        patch_appconfig()
-        patch_v2rayconfig()
-        patch_strings()
-        patch_coreconfigmanager_dns()
-        patch_settings()
-        patch_formfields()
+        run(PATCHES)
         print("\n✅ Done.")
         print("👉 Rebuild and test.")
     except Exception as e:
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Android XML resource and layout patching.
+
+XmlTree reads a values/ or layout/ file in one pass over its tags (comments,
+CDATA and the <?xml ?> prolog skipped) and records, alongside the element
+spans:
+
+  names   the `name=` of every resource, so "is key k present" is a set
+          lookup instead of a scan of the file per key
+  ids     android:id -> element, for "replace the LinearLayout around
+          @+id/et_pre_profile"
+
+Edits are splices into the original text at recorded offsets, so comments,
+attribute order and indentation elsewhere in the file stay as they were.
+
+  add_resources(doc, {...})    insert every missing <string> in one splice
+  replace_element(doc, el, s)  swap an element (start tag to end tag) for s
+
+Usage:
+  python3 vpatches/xmlres.py FILE.xml
+    print the resource names and view ids found in a file
+"""
+
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_TAG = re.compile(
+    r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[?!][^>]*>'
+    r'|<(/?)([\w:.-]+)((?:"[^"]*"|\'[^\']*\'|[^>"\'])*?)(/?)>',
+    re.S)
+_ATTR = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+@dataclass(eq=False)
+class Element:
+    tag: str
+    start: int                      # offset of `<`
+    end: int = -1                   # offset just past the closing `>`
+    parent: Optional["Element"] = None
+    attrs: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def id(self) -> str:
+        """android:id without its @+id/ or @id/ prefix."""
+        return self.attrs.get("android:id", "").split("/", 1)[-1]
+
+    def __repr__(self):
+        return f"Element(<{self.tag}> {self.start}:{self.end})"
+
+
+class XmlTree:
+    """Element spans, resource names and view ids of an XML document."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.elements: List[Element] = []
+        self.root: Optional[Element] = None
+        self.names: Dict[str, Element] = {}
+        self.ids: Dict[str, Element] = {}
+        stack: List[Element] = []
+        for m in _TAG.finditer(text):
+            if m.group(2) is None:
+                continue                                    # comment, CDATA, prolog
+            closing, tag, attrs, empty = m.group(1), m.group(2), m.group(3), m.group(4)
+            if closing:
+                while stack:
+                    el = stack.pop()
+                    el.end = m.end()
+                    if el.tag == tag:
+                        break
+                continue
+            el = Element(tag, m.start(), parent=stack[-1] if stack else None,
+                         attrs={a.group(1): a.group(2) if a.group(2) is not None else a.group(3)
+                                for a in _ATTR.finditer(attrs)})
+            self.elements.append(el)
+            if el.parent is None and self.root is None:
+                self.root = el
+            if "name" in el.attrs and el.parent is self.root:
+                self.names.setdefault(el.attrs["name"], el)
+            if el.id:
+                self.ids.setdefault(el.id, el)
+            if empty:
+                el.end = m.end()
+            else:
+                stack.append(el)
+
+    def enclosing(self, pos: int, tag: Optional[str] = None) -> Optional[Element]:
+        """Innermost element (with that tag, if given) containing pos."""
+        inner = None
+        for el in self.elements:
+            if el.start > pos:
+                break
+            if pos < el.end:
+                inner = el
+        while inner is not None and tag is not None and inner.tag != tag:
+            inner = inner.parent
+        return inner
+
+    def containing(self, tag: str, marker: str) -> Optional[Element]:
+        """Innermost <tag> element whose content includes marker."""
+        pos = self.text.find(marker)
+        if pos == -1:
+            return None
+        return self.enclosing(pos, tag)
+
+    def by_id(self, view_id: str, tag: Optional[str] = None) -> Optional[Element]:
+        """
+        Element with android:id view_id or, given a tag, its nearest
+        ancestor with that tag (e.g. the LinearLayout wrapping an EditText).
+        """
+        el = self.ids.get(view_id)
+        while el is not None and tag is not None and el.tag != tag:
+            el = el.parent
+        return el
+
+    def indent(self, pos: int) -> str:
+        line = self.text.rfind("\n", 0, pos) + 1
+        return re.match(r"[ \t]*", self.text[line:]).group()
+
+    def child_indent(self, el: Element) -> str:
+        """Indentation used by el's children (el's own plus four spaces if none)."""
+        for child in self.elements:
+            if child.parent is el:
+                return self.indent(child.start)
+        return self.indent(el.start) + "    "
+
+
+def add_resources(doc, entries: Dict[str, str], tag: str = "string") -> List[str]:
+    """
+    Append <tag name="k">v</tag> for every key not yet defined, in one splice
+    before the closing tag of <resources>. Values are inserted verbatim
+    (already escaped). Returns the keys added.
+    """
+    tree = doc.xml
+    missing = [k for k in entries if k not in tree.names]
+    if not missing:
+        return []
+    root = tree.root
+    if root is None or root.end == -1 or root.tag != "resources":
+        raise ValueError("no <resources> element")
+    indent = tree.child_indent(root)
+    close = tree.text.rfind("</", root.start, root.end)
+    # insert after the last non-blank character, before the closing tag's line
+    pos = len(tree.text[:close].rstrip())
+    block = "".join(f'\n{indent}<{tag} name="{k}">{entries[k]}</{tag}>' for k in missing)
+    doc.text = tree.text[:pos] + block + tree.text[pos:]
+    return missing
+
+
+def replace_element(doc, el: Element, new: str):
+    """Replace el (start tag through end tag) by new, keeping what surrounds it."""
+    doc.replace_span(el.start, el.end, new)
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__.strip())
+        sys.exit(2)
+    tree = XmlTree(Path(sys.argv[1]).read_text(encoding="utf-8"))
+    if tree.names:
+        print(f"{len(tree.names)} resources")
+        for name, el in tree.names.items():
+            print(f"  {el.tag} {name}")
+    if tree.ids:
+        print(f"{len(tree.ids)} ids")
+        for view_id, el in tree.ids.items():
+            print(f"  {view_id}  <{el.tag}>")
+
+
+if __name__ == "__main__":
+    main()